@@ -0,0 +1,53 @@
+"""
+Measures end-to-end flush latency: from the call that completes a batch until
+ContractConsumer has settled it against a SimulatedSmartContract with no
+simulated network or block delay.
+
+    python benchmarks/bench_flush_latency.py
+"""
+import asyncio
+import contextlib
+import json
+import statistics
+import sys
+import time
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.simulated_smart_contract import SimulatedSmartContract
+
+FLUSHES = 2000
+BATCH_CALLS = 10
+
+async def measure(flushes: int) -> list:
+    funding = 10 ** 18
+    contract = SimulatedSmartContract()
+    contract.fund(funding)
+    processor = AsyncBatchProcessor(CallCountBatchPolicy(BATCH_CALLS))
+    processor.add_observer(ContractConsumer(contract))
+
+    latencies = []
+    for i in range(flushes):
+        for j in range(BATCH_CALLS - 1):
+            await processor.register_call_async(1)
+        started_at = time.perf_counter()
+        await processor.register_call_async(1)
+        latencies.append(time.perf_counter() - started_at)
+    assert contract.client_funding(contract.client_address) == funding - flushes * BATCH_CALLS
+    return latencies
+
+def run(flushes: int = FLUSHES) -> dict:
+    latencies = sorted(asyncio.run(measure(flushes)))
+    return {
+        'flushes': flushes,
+        'mean_us': round(statistics.mean(latencies) * 1e6, 1),
+        'p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+        'p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        'max_us': round(latencies[-1] * 1e6, 1),
+    }
+
+if __name__ == "__main__":
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run()
+    json.dump(results, sys.stdout, indent=2)
+    print()
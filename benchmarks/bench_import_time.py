@@ -0,0 +1,43 @@
+"""
+Measures how long importing beaglegaze for pay_per_call takes in a fresh
+interpreter, on top of the interpreter's own start-up, and checks that web3
+is not loaded on that path.
+
+    python benchmarks/bench_import_time.py
+
+Exits with status 1 if the import exceeds the budget or pulls in web3.
+"""
+import subprocess
+import sys
+import time
+
+IMPORT_BUDGET_MS = 150
+RUNS = 5
+
+IMPORT_CODE = "import sys; from beaglegaze import pay_per_call, AsyncBatchProcessor; sys.exit('web3' in sys.modules)"
+
+def best_ms(code: str) -> float:
+    timings = []
+    for i in range(RUNS):
+        started_at = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code])
+        timings.append((time.perf_counter() - started_at) * 1000)
+        if result.returncode != 0:
+            raise SystemExit("web3 was imported on the pay_per_call path")
+    return min(timings)
+
+def run() -> dict:
+    baseline = best_ms("pass")
+    return {
+        'interpreter_start_ms': round(baseline, 1),
+        'import_ms': round(best_ms(IMPORT_CODE) - baseline, 1),
+    }
+
+def main() -> int:
+    results = run()
+    print(f"interpreter start-up: {results['interpreter_start_ms']:.0f} ms")
+    print(f"import beaglegaze: {results['import_ms']:.0f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    return 0 if results['import_ms'] <= IMPORT_BUDGET_MS else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Measures the per-call overhead pay_per_call adds to synchronous and coroutine
+functions on the common path, where no flush is due and no observer is in
+error state.
+
+    python benchmarks/bench_pay_per_call.py
+
+Exits with status 1 if the synchronous overhead exceeds the budget.
+"""
+import asyncio
+import sys
+import time
+import timeit
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.pay_per_call import pay_per_call, set_processor
+
+OVERHEAD_BUDGET_NS = 1000
+CALLS = 200000
+REPEAT = 5
+
+def undecorated():
+    return None
+
+@pay_per_call(price=1)
+def decorated():
+    return None
+
+async def undecorated_async():
+    return None
+
+@pay_per_call(price=1)
+async def decorated_async():
+    return None
+
+def best_ns_per_call(func, calls: int) -> float:
+    return min(timeit.repeat(func, number=calls, repeat=REPEAT)) / calls * 1e9
+
+def best_ns_per_await(func, calls: int) -> float:
+    async def await_calls():
+        started_at = time.perf_counter()
+        for i in range(calls):
+            await func()
+        return time.perf_counter() - started_at
+
+    return min(asyncio.run(await_calls()) for i in range(REPEAT)) / calls * 1e9
+
+def run(calls: int = CALLS) -> dict:
+    set_processor(AsyncBatchProcessor(CallCountBatchPolicy(10 ** 12)))
+    try:
+        results = {}
+        for name, baseline, metered in (
+            ('sync', best_ns_per_call(undecorated, calls), best_ns_per_call(decorated, calls)),
+            ('async', best_ns_per_await(undecorated_async, calls), best_ns_per_await(decorated_async, calls)),
+        ):
+            results[name] = {
+                'undecorated_ns': round(baseline, 1),
+                'decorated_ns': round(metered, 1),
+                'overhead_ns': round(metered - baseline, 1),
+            }
+        return results
+    finally:
+        set_processor(None)
+
+def main() -> int:
+    results = run()
+    for name, result in results.items():
+        print(f"{name}: undecorated {result['undecorated_ns']:.0f} ns/call, "
+              f"pay_per_call {result['decorated_ns']:.0f} ns/call, overhead {result['overhead_ns']:.0f} ns/call")
+    print(f"budget: {OVERHEAD_BUDGET_NS} ns/call (sync)")
+    return 0 if results['sync']['overhead_ns'] <= OVERHEAD_BUDGET_NS else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
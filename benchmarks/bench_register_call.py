@@ -0,0 +1,83 @@
+"""
+Measures AsyncBatchProcessor.register_call_async throughput with 1 to 64
+concurrent asyncio tasks on one loop and with 1 to 64 threads, each running
+its own loop. Flushes settle against a no-op observer, so the numbers cover
+accumulation, batch policy and dispatch only.
+
+    python benchmarks/bench_register_call.py
+"""
+import asyncio
+import contextlib
+import json
+import sys
+import threading
+import time
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.metering_event_observer import MeteringEventObserver
+
+CONCURRENCY = (1, 2, 4, 8, 16, 32, 64)
+TOTAL_CALLS = 200000
+BATCH_CALLS = 1000
+
+class NoOpObserver(MeteringEventObserver):
+    # Stands in for ContractConsumer, so flushes are awaited like real settlements.
+    settles_batches = True
+
+    async def handle(self, event):
+        pass
+
+    def is_in_error_state(self) -> bool:
+        return False
+
+def new_processor() -> AsyncBatchProcessor:
+    processor = AsyncBatchProcessor(CallCountBatchPolicy(BATCH_CALLS))
+    processor.add_observer(NoOpObserver())
+    return processor
+
+async def register_calls(processor: AsyncBatchProcessor, calls: int):
+    for i in range(calls):
+        await processor.register_call_async(1)
+
+def measure_tasks(concurrency: int, total_calls: int) -> float:
+    processor = new_processor()
+
+    async def run_tasks():
+        started_at = time.perf_counter()
+        await asyncio.gather(*(register_calls(processor, total_calls // concurrency) for i in range(concurrency)))
+        return time.perf_counter() - started_at
+
+    return asyncio.run(run_tasks())
+
+def measure_threads(concurrency: int, total_calls: int) -> float:
+    processor = new_processor()
+    threads = [
+        threading.Thread(target=asyncio.run, args=(register_calls(processor, total_calls // concurrency),))
+        for i in range(concurrency)
+    ]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started_at
+
+def run(total_calls: int = TOTAL_CALLS) -> list:
+    results = []
+    for mode, measure in (('tasks', measure_tasks), ('threads', measure_threads)):
+        for concurrency in CONCURRENCY:
+            calls = total_calls // concurrency * concurrency
+            elapsed = measure(concurrency, calls)
+            results.append({
+                'mode': mode,
+                'concurrency': concurrency,
+                'calls': calls,
+                'calls_per_second': round(calls / elapsed),
+            })
+    return results
+
+if __name__ == "__main__":
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run()
+    json.dump(results, sys.stdout, indent=2)
+    print()
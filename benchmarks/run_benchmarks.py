@@ -0,0 +1,59 @@
+"""
+Runs the benchmark suite and writes the results as JSON, for comparing
+releases.
+
+    python benchmarks/run_benchmarks.py [--output results.json] [--quick]
+
+--quick uses a tenth of the calls, for a smoke run.
+"""
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import time
+from importlib.metadata import PackageNotFoundError, version
+import bench_flush_latency
+import bench_import_time
+import bench_pay_per_call
+import bench_register_call
+
+def package_version() -> str:
+    try:
+        return version('beaglegaze')
+    except PackageNotFoundError:
+        return 'unknown'
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="file to write the JSON report to, defaults to stdout")
+    parser.add_argument('--quick', action='store_true', help="run with a tenth of the calls")
+    args = parser.parse_args()
+    scale = 10 if args.quick else 1
+
+    # The processor prints every flush, keep stdout for the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            'import_time': bench_import_time.run(),
+            'pay_per_call_overhead': bench_pay_per_call.run(bench_pay_per_call.CALLS // scale),
+            'register_call_throughput': bench_register_call.run(bench_register_call.TOTAL_CALLS // scale),
+            'flush_latency': bench_flush_latency.run(bench_flush_latency.FLUSHES // scale),
+        }
+    report = {
+        'beaglegaze_version': package_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
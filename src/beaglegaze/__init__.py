@@ -1,6 +1,29 @@
-from .smart_contract import SmartContract
-from .contract_consumer import ContractConsumer
-from .batch_ready_event import BatchReadyEvent
-from .async_batch_processor import AsyncBatchProcessor
-from .demo import Demo
-from .pay_per_call import pay_per_call
+"""
+Public API. Names are imported on first access (PEP 562), so `import beaglegaze`
+and pay_per_call stay cheap and web3 is only loaded once a contract class is used.
+"""
+import importlib
+
+_EXPORTS = {
+    'SmartContract': '.smart_contract',
+    'SimulatedSmartContract': '.simulated_smart_contract',
+    'ContractConsumer': '.contract_consumer',
+    'BatchReadyEvent': '.batch_ready_event',
+    'AsyncBatchProcessor': '.async_batch_processor',
+    'SettlementPipeline': '.settlement_pipeline',
+    'Demo': '.demo',
+    'pay_per_call': '.pay_per_call',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from .batch_policy import BatchPolicy
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FlushDecision:
+    """
+    Explains why the adaptive policy flushed a batch.
+    """
+    reason: str
+    batch_sum: int
+    gas_price: Optional[int]
+    estimated_fee: Optional[int]
+    projected_exposure: int
+    call_rate: float
+    settlement_latency: float
+
+class AdaptiveBatchPolicy(BatchPolicy):
+    """
+    Flushes once the batch is worth more than the transaction fee needed to
+    settle it, or when the unsettled exposure is about to reach max_unsettled.
+
+    The exposure is the processor's whole unsettled value, the current batch
+    plus batches queued or in flight, and the projection adds the value
+    expected to arrive while a settlement is still in flight (call rate *
+    average price * observed consume latency), so the ceiling holds even when
+    the chain is slow.
+    """
+    def __init__(
+        self,
+        gas_price_source: Callable[[], int],
+        max_unsettled: int,
+        gas_per_settlement: int = 60000,
+        min_value_to_fee_ratio: float = 1.0,
+        gas_price_ttl: float = 15.0,
+        smoothing: float = 0.2,
+        on_decision: Callable[[FlushDecision], None] = None,
+    ):
+        if max_unsettled < 1:
+            raise ValueError("max_unsettled must be at least 1 wei")
+        self.gas_price_source = gas_price_source
+        self.max_unsettled = max_unsettled
+        self.gas_per_settlement = gas_per_settlement
+        self.min_value_to_fee_ratio = min_value_to_fee_ratio
+        self.gas_price_ttl = gas_price_ttl
+        self.smoothing = smoothing
+        self.on_decision = on_decision
+
+        self.gas_price = None
+        self.call_rate = 0.0
+        self.average_price = 0.0
+        self.settlement_latency = 0.0
+        self._gas_price_fetched_at = None
+        self._gas_price_refreshing = False
+        self._last_call_at = None
+        self._last_batch_sum = 0
+        self._lock = threading.Lock()
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        self._observe_call(batch_sum)
+        self._refresh_gas_price_if_stale()
+
+        exposure = batch_sum if unsettled_value is None else unsettled_value
+        projected_exposure = exposure + int(self.call_rate * self.average_price * self.settlement_latency)
+        if projected_exposure >= self.max_unsettled:
+            self._report("exposure_ceiling", batch_sum, projected_exposure)
+            return True
+
+        estimated_fee = self.estimated_fee()
+        if estimated_fee is not None and batch_sum >= estimated_fee * self.min_value_to_fee_ratio:
+            self._report("fee_covered", batch_sum, projected_exposure)
+            return True
+
+        return False
+
+    def reset(self) -> None:
+        self._last_batch_sum = 0
+
+    def record_settlement(self, latency: float) -> None:
+        self.settlement_latency = self._smooth(self.settlement_latency, latency)
+
+    def estimated_fee(self) -> Optional[int]:
+        if self.gas_price is None:
+            return None
+        return self.gas_price * self.gas_per_settlement
+
+    def _observe_call(self, batch_sum: int):
+        now = time.monotonic()
+        price = batch_sum - self._last_batch_sum
+        self._last_batch_sum = batch_sum
+        self.average_price = self._smooth(self.average_price, price)
+
+        if self._last_call_at is not None:
+            elapsed = now - self._last_call_at
+            if elapsed > 0:
+                self.call_rate = self._smooth(self.call_rate, 1.0 / elapsed)
+        self._last_call_at = now
+
+    def _smooth(self, current: float, sample: float) -> float:
+        if current == 0.0:
+            return float(sample)
+        return current + self.smoothing * (sample - current)
+
+    def _refresh_gas_price_if_stale(self):
+        now = time.monotonic()
+        if self._gas_price_fetched_at is not None and now - self._gas_price_fetched_at < self.gas_price_ttl:
+            return
+        with self._lock:
+            if self._gas_price_refreshing:
+                return
+            self._gas_price_refreshing = True
+        # The gas price lookup is an RPC round-trip, keep it off the calling thread.
+        threading.Thread(target=self._refresh_gas_price, name="beaglegaze-gas-price", daemon=True).start()
+
+    def _refresh_gas_price(self):
+        try:
+            self.gas_price = self.gas_price_source()
+        except Exception:
+            logger.warning("Failed to fetch gas price, keeping last known value.", exc_info=True)
+        finally:
+            self._gas_price_fetched_at = time.monotonic()
+            with self._lock:
+                self._gas_price_refreshing = False
+
+    def _report(self, reason: str, batch_sum: int, projected_exposure: int):
+        logger.debug(f"Adaptive policy flushing batch of {batch_sum} wei: {reason}")
+        if not self.on_decision:
+            return
+        decision = FlushDecision(
+            reason=reason,
+            batch_sum=batch_sum,
+            gas_price=self.gas_price,
+            estimated_fee=self.estimated_fee(),
+            projected_exposure=projected_exposure,
+            call_rate=self.call_rate,
+            settlement_latency=self.settlement_latency,
+        )
+        try:
+            self.on_decision(decision)
+        except Exception:
+            logger.warning("Flush decision hook failed.", exc_info=True)
@@ -1,49 +1,435 @@
 import asyncio
+import logging
 import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
 from .batch_mode import BatchMode
+from .batch_policy import BatchPolicy, BatchModePolicy
 from .metering_event_observer import MeteringEventObserver
+from .observer_notifier import DEFAULT_OBSERVER_TIMEOUT, notify_observers
 from .batch_ready_event import BatchReadyEvent
+from .settlement_pipeline import OverflowPolicy, SettlementPipeline, SettlementQueueFullError
+from .shadow_ledger import ShadowLedger, LedgerExhaustedAction, InsufficientFundingException
+from .usage_accumulator import UsageAccumulator
+from .usage_journal import UsageJournal
+from .urgency import Urgency
+from .method_registry import UNATTRIBUTED_METHOD_ID, method_name
+from . import tracing
+from .metrics import BATCH_CALLS, BATCH_VALUE, CALLS, FLUSHES, UNSETTLED_VALUE
+
+logger = logging.getLogger(__name__)
+
+# Flush reasons reported in beaglegaze_flushes_total.
+FLUSH_POLICY = 'policy'
+FLUSH_INTERVAL = 'interval'
+FLUSH_LEDGER = 'ledger'
+FLUSH_RECOVERED = 'recovered'
+FLUSH_CLOSE = 'close'
+
+# Every processor registers itself, so beaglegaze_unsettled_value covers all of them.
+_live_processors = weakref.WeakSet()
+_live_processors_lock = threading.Lock()
+
+def _total_unsettled_value() -> int:
+    with _live_processors_lock:
+        processors = list(_live_processors)
+    return sum(processor.unsettled_value() for processor in processors)
+
+UNSETTLED_VALUE.set_function(_total_unsettled_value)
+
+def _no_op():
+    pass
+
+def _log_background_settlement_failure(future):
+    if future.exception() is not None:
+        logger.error("Failed to settle batch in the background.", exc_info=future.exception())
 
 class AsyncBatchProcessor:
-    def __init__(self, batch_mode: BatchMode):
+    def __init__(
+        self,
+        batch_mode: Union[BatchMode, BatchPolicy],
+        settlement_pipeline: SettlementPipeline = None,
+        ledger: ShadowLedger = None,
+        journal: UsageJournal = None,
+        observer_timeout: float = DEFAULT_OBSERVER_TIMEOUT,
+    ):
         self.observers = []
+        # Deadline for observers that do not settle batches, None waits as long as it takes.
+        self.observer_timeout = observer_timeout
+        self._observer_timeouts = {}
         self.batch_mode = batch_mode
-        self.batch_sum = 0
+        if isinstance(batch_mode, BatchPolicy):
+            self.batch_policy = batch_mode
+        else:
+            self.batch_policy = BatchModePolicy(batch_mode)
+        self.accumulator = UsageAccumulator()
         self.lock = threading.Lock()
+        self.ledger = ledger
+        if journal and settlement_pipeline and settlement_pipeline.overflow_policy == OverflowPolicy.SPILL:
+            # Spilled batches are journaled already, recovering both would bill them twice.
+            raise ValueError("A UsageJournal already keeps unsettled usage, use another overflow policy than SPILL")
+        self.settlement_pipeline = settlement_pipeline
+        self.journal = journal
+        self._journal_append = journal.record_usage if journal else None
+        self._forced_flush_reason = None
+        # Value of batches taken but not settled yet.
+        self._in_flight_value = 0
+        # Usage a previous process journaled or spilled but never settled. The flush timer
+        # settles it as soon as an observer that settles batches is added, unless a call
+        # flushes it first.
+        self._recovered_usage = journal.recovered if journal else 0
+        # Recovered spilled usage still in the accumulator. It stays in the spill journal
+        # until the batch that carries it has settled.
+        self._recovered_spill = 0
+        if settlement_pipeline:
+            settlement_pipeline.start(self._settle_async)
+            self._recovered_spill = settlement_pipeline.take_recovered()
+            self._recovered_usage += self._recovered_spill
+        if self._recovered_usage:
+            self.accumulator.add(self._recovered_usage)
+            if ledger:
+                # Its flush goes through begin_settlement like any other batch.
+                ledger.add_unsettled(self._recovered_usage)
+        self._flush_timer = None
+        # Settles batches flushed synchronously on an event loop's thread, see _settle.
+        self._background_settler = None
+        self._background_loop = None
+        self._startup_pending = self.batch_policy.flush_interval is not None or self._recovered_usage > 0
+        self._call_hooks_active = self._startup_pending or ledger is not None or journal is not None
+        self._flush_timer_stopped = threading.Event()
+        # Cached any(observer.is_in_error_state()), kept current by observer callbacks
+        # so that pay_per_call only has to read an attribute.
+        self.error_state = False
+        with _live_processors_lock:
+            _live_processors.add(self)
 
-    def add_observer(self, observer: MeteringEventObserver):
+    def add_observer(self, observer: MeteringEventObserver, timeout: float = None):
+        """
+        Adds an observer for batch events. timeout overrides the processor's observer_timeout
+        for it; observers that settle batches are always awaited to the end.
+        """
         self.observers.append(observer)
+        if timeout is not None:
+            self._observer_timeouts[id(observer)] = timeout
+        observer.add_error_state_listener(self._refresh_error_state)
+        self._refresh_error_state()
+        if observer.settles_batches and self._recovered_usage:
+            self._ensure_flush_timer()
+
+    async def register_call_async(self, price_per_invocation: int, method_id: int = UNATTRIBUTED_METHOD_ID):
+        """
+        Records a call and flushes the batch when due. If the settlement pipeline fails fast,
+        the batch is kept for the next flush and SettlementQueueFullError is raised without
+        the call being billed, so the caller must not run it.
+        """
+        if self._record_call(price_per_invocation, method_id):
+            try:
+                await self._process_batch_async()
+            except SettlementQueueFullError:
+                self._unregister_call(price_per_invocation, method_id)
+                raise
 
-    async def register_call_async(self, price_per_invocation: int):
-        self._add_to_current_batch(price_per_invocation)
+    def register_call(self, price_per_invocation: int, method_id: int = UNATTRIBUTED_METHOD_ID):
+        """
+        Synchronous counterpart of register_call_async. A due flush is handed to the
+        settlement pipeline or, without one, settled before returning. Called on an
+        event loop's thread, the flush is settled on a background thread instead, so
+        the loop is not held up until the transaction is mined.
+        """
+        if self._record_call(price_per_invocation, method_id):
+            try:
+                self._process_batch()
+            except SettlementQueueFullError:
+                self._unregister_call(price_per_invocation, method_id)
+                raise
 
-        if self._should_process_batch():
-            await self._process_batch_async()
+    def _record_call(self, price_per_invocation: int, method_id: int) -> bool:
+        """
+        Adds the call to the current batch and returns True if the batch should be flushed.
+        This is the per-call hot path, keep it free of avoidable method calls.
+        """
+        if self._call_hooks_active:
+            return self._record_call_with_hooks(price_per_invocation, method_id)
+        accumulator = self.accumulator
+        accumulator.add(price_per_invocation, method_id)
+        batch_sum = accumulator.pending_estimate()
+        return self.batch_policy.should_flush(batch_sum, batch_sum + self._in_flight_value)
 
-    def _add_to_current_batch(self, price_per_invocation: int):
+    def _record_call_with_hooks(self, price_per_invocation: int, method_id: int) -> bool:
+        """
+        _record_call for processors with start-up work pending, a shadow ledger or a journal.
+        """
+        force_flush = self._startup_pending and self._on_first_call()
+        if force_flush:
+            self._forced_flush_reason = FLUSH_RECOVERED
+        if self.ledger is not None and not self._admit_call(price_per_invocation):
+            force_flush = True
+            self._forced_flush_reason = FLUSH_LEDGER
+        if self._journal_append is not None:
+            self._journal_append(price_per_invocation)
+        accumulator = self.accumulator
+        accumulator.add(price_per_invocation, method_id)
+        batch_sum = accumulator.pending_estimate()
+        return self.batch_policy.should_flush(batch_sum, batch_sum + self._in_flight_value) or force_flush
+
+    def _unregister_call(self, price_per_invocation: int, method_id: int):
+        """
+        Takes back a call that was recorded but refused, see register_call_async.
+        """
+        self.accumulator.remove(price_per_invocation, method_id)
+        if self.ledger is not None:
+            self.ledger.release(price_per_invocation)
+        if self._journal_append is not None:
+            self.journal.record_settlement(price_per_invocation)
+
+    def _on_first_call(self) -> bool:
+        """
+        Starts the flush timer if the policy has an interval. Returns True if
+        usage recovered from the journal is waiting to be settled.
+        """
+        with self.lock:
+            self._startup_pending = False
+            self._call_hooks_active = self.ledger is not None or self._journal_append is not None
+        if self.batch_policy.flush_interval is not None:
+            self._ensure_flush_timer()
+        return self._take_recovered_usage() > 0
+
+    def _take_recovered_usage(self) -> int:
+        # Recovered usage waits for an observer that can settle it.
+        if not any(observer.settles_batches for observer in self.observers):
+            return 0
         with self.lock:
-            self.batch_sum += price_per_invocation
+            recovered_usage, self._recovered_usage = self._recovered_usage, 0
+            return recovered_usage
 
-    def _should_process_batch(self) -> bool:
-        return self.batch_mode.hit()
+    def _admit_call(self, price_per_invocation: int) -> bool:
+        """
+        Checks the call against the shadow ledger. Returns False if the estimated
+        balance is exhausted and the batch should be flushed right away.
+        """
+        if self.ledger.reserve(price_per_invocation):
+            return True
+        if self.ledger.on_exhausted == LedgerExhaustedAction.REFUSE:
+            raise InsufficientFundingException(
+                f"Estimated client funding {self.ledger.estimate()} does not cover the call, refund the smart contract."
+            )
+        return False
+
+    @property
+    def batch_sum(self) -> int:
+        return self.accumulator.pending()
+
+    def unsettled_value(self) -> int:
+        """
+        Value of the current batch plus batches that are still being settled.
+        """
+        return self.accumulator.pending() + self._in_flight_value
 
     async def _process_batch_async(self):
-        print(f"Processing batch with sum {self.batch_sum}...")
-        current_batch_sum = self._get_current_batch_sum()
-        self._reset_batch()
-        await self._notify_observers_async(BatchReadyEvent(current_batch_sum))
+        batch = self._take_batch()
+        if batch is None:
+            return
+        event, journaled = batch
+        with tracing.span('beaglegaze.flush', batch_sum=event.batch_sum):
+            if not self.settlement_pipeline:
+                await self._settle_async(event)
+                return
+            try:
+                accepted = await self.settlement_pipeline.submit_async(event, journaled=journaled)
+            except SettlementQueueFullError:
+                self._return_batch(event, journaled)
+                raise
+            if not accepted:
+                self._return_batch(event, journaled)
+
+    def _process_batch(self, urgency: Urgency = None, reason: str = FLUSH_POLICY):
+        """
+        Synchronous counterpart of _process_batch_async for callers without a usable event loop.
+        """
+        batch = self._take_batch(urgency, reason)
+        if batch is None:
+            return
+        event, journaled = batch
+        with tracing.span('beaglegaze.flush', batch_sum=event.batch_sum):
+            self._settle(event, journaled)
 
-    def _get_current_batch_sum(self) -> int:
+    def _settle(self, event: BatchReadyEvent, journaled: int = 0):
+        if self.settlement_pipeline:
+            try:
+                accepted = self.settlement_pipeline.submit(event, journaled=journaled)
+            except SettlementQueueFullError:
+                self._return_batch(event, journaled)
+                raise
+            if not accepted:
+                self._return_batch(event, journaled)
+            return
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._settle_async(event))
+            return
+
+        # asyncio.run refuses to nest inside a running loop and waiting for a helper
+        # thread would block it, so the batch is settled in the background.
+        with self.lock:
+            if self._background_settler is None:
+                self._background_settler = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="beaglegaze-background-settler"
+                )
+            settler = self._background_settler
+        settler.submit(tracing.bind_context(self._settle_in_background), event).add_done_callback(
+            _log_background_settlement_failure
+        )
+
+    def _settle_in_background(self, event: BatchReadyEvent):
+        # Only ever runs on the single settler thread, which keeps one event loop.
+        if self._background_loop is None:
+            self._background_loop = asyncio.new_event_loop()
+        self._background_loop.run_until_complete(self._settle_async(event))
+
+    def _take_batch(self, urgency: Urgency = None, reason: str = FLUSH_POLICY) -> Optional[Tuple[BatchReadyEvent, int]]:
+        """
+        Atomically drains the accumulated usage. Returns the batch event and the part of it
+        that is recovered spilled usage, or None if a concurrent flush already took it.
+        """
         with self.lock:
-            return self.batch_sum
+            current_batch_sum, method_usage = self.accumulator.drain()
+            journaled = 0
+            if current_batch_sum:
+                journaled, self._recovered_spill = self._recovered_spill, 0
+                self._in_flight_value += current_batch_sum
+        self.batch_policy.reset()
+        forced_reason, self._forced_flush_reason = self._forced_flush_reason, None
+        if current_batch_sum == 0:
+            return None
+        print(f"Processing batch with sum {current_batch_sum}...")
+        self._record_batch_metrics(current_batch_sum, method_usage, forced_reason or reason)
+        if self.ledger:
+            self.ledger.begin_settlement(current_batch_sum)
+        return BatchReadyEvent(current_batch_sum, method_usage, urgency), journaled
 
-    def _reset_batch(self):
+    def _return_batch(self, event: BatchReadyEvent, journaled: int = 0):
+        """
+        Puts a batch the settlement pipeline did not take back into the current one,
+        so it is settled with a later flush instead of being lost.
+        """
+        logger.warning(f"Settlement queue is full, batch with sum {event.batch_sum} goes back into the next one.")
+        self.accumulator.add_usage(event.method_usage)
         with self.lock:
-            self.batch_sum = 0
+            self._in_flight_value -= event.batch_sum
+            self._recovered_spill += journaled
+        if self.ledger:
+            self.ledger.cancel_settlement(event.batch_sum)
+
+    def _record_batch_metrics(self, batch_sum: int, method_usage, reason: str):
+        batch_calls = 0
+        for usage in method_usage:
+            batch_calls += usage.calls
+            CALLS.inc(usage.calls, (method_name(usage.method_id),))
+        BATCH_CALLS.observe(batch_calls)
+        BATCH_VALUE.observe(batch_sum)
+        FLUSHES.inc(labels=(reason,))
+
+    async def _settle_async(self, event: BatchReadyEvent) -> bool:
+        """
+        Settles a batch through the observers and returns whether it was settled.
+        """
+        started_at = time.monotonic()
+        succeeded = False
+        try:
+            with tracing.span('beaglegaze.settle', batch_sum=event.batch_sum):
+                await self._notify_observers_async(event)
+            # Only the settling observers' outcome counts, a failing metrics observer
+            # must not leave a settled batch unrecorded in the ledger and journal.
+            # Without any settling observer nothing was settled.
+            settling_observers = [observer for observer in self.observers if observer.settles_batches]
+            succeeded = bool(settling_observers) and not any(
+                observer.is_in_error_state() for observer in settling_observers
+            )
+        finally:
+            self._refresh_error_state()
+            self.batch_policy.record_settlement(time.monotonic() - started_at)
+            with self.lock:
+                self._in_flight_value -= event.batch_sum
+            if self.ledger:
+                self.ledger.complete_settlement(event.batch_sum, succeeded)
+            if self.journal and succeeded:
+                self.journal.record_settlement(event.batch_sum)
+        return succeeded
 
     async def _notify_observers_async(self, event: BatchReadyEvent):
-        for observer in self.observers:
-            await observer.handle(event)
+        await notify_observers(self.observers, event, self.observer_timeout, self._observer_timeouts)
+
+    def _ensure_flush_timer(self):
+        with self.lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Thread(
+                    target=self._run_flush_timer, name="beaglegaze-flush-timer", daemon=True
+                )
+                self._flush_timer.start()
+
+    def _run_flush_timer(self):
+        if self._take_recovered_usage():
+            try:
+                self._process_batch(reason=FLUSH_RECOVERED)
+            except Exception:
+                logger.error("Failed to process recovered usage.", exc_info=True)
+        if self.batch_policy.flush_interval is None:
+            return
+        while not self._flush_timer_stopped.wait(self.batch_policy.flush_interval):
+            if self.batch_sum == 0:
+                continue
+            try:
+                # Nobody waits on a timed flush, so it may settle at a lower fee.
+                # SmartContract replaces it with a higher fee if it is not mined in time.
+                self._process_batch(Urgency.LOW, FLUSH_INTERVAL)
+            except Exception:
+                logger.error("Failed to process batch on flush interval.", exc_info=True)
+
+    async def wait_for_settlement_async(self, timeout: float = None) -> bool:
+        """
+        Waits until every batch handed to the settlement pipeline or settled in the
+        background has been processed.
+        """
+        if self._background_settler:
+            # The settler runs batches in order, so this returns once the earlier ones are done.
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(self._background_settler.submit(_no_op)), timeout)
+            except asyncio.TimeoutError:
+                return False
+        if not self.settlement_pipeline:
+            return True
+        return await self.settlement_pipeline.join_async(timeout)
+
+    def close(self, timeout: float = None):
+        """
+        Stops the flush timer, flushes the remaining batch and shuts down the settlement
+        pipeline and the journal.
+        """
+        self._flush_timer_stopped.set()
+        if self._flush_timer and self._flush_timer is not threading.current_thread():
+            self._flush_timer.join(timeout)
+
+        if self.batch_sum > 0:
+            try:
+                self._process_batch(reason=FLUSH_CLOSE)
+            except Exception:
+                logger.error("Failed to process remaining batch on close.", exc_info=True)
+
+        if self._background_settler:
+            self._background_settler.shutdown(wait=True)
+            if self._background_loop:
+                self._background_loop.close()
+        if self.settlement_pipeline:
+            self.settlement_pipeline.close(timeout)
+        if self.journal:
+            self.journal.close()
+
+    def _refresh_error_state(self, *args):
+        self.error_state = self.is_in_error_state()
 
     def is_in_error_state(self) -> bool:
         return any(observer.is_in_error_state() for observer in self.observers)
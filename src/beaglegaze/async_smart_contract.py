@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import time
+from aiohttp import ClientSession, TCPConnector
+from web3 import AsyncWeb3
+from .metrics import CONSUME_LATENCY, GAS_USED
+from .nonce_manager import NonceManager, is_nonce_error
+from .rpc_metrics_middleware import RpcMetricsMiddleware
+
+logger = logging.getLogger(__name__)
+
+class AsyncSmartContract:
+    """
+    asyncio counterpart of SmartContract built on AsyncWeb3.
+
+    All RPC calls are awaited on the caller's event loop, so no thread waits
+    on the node. Requests go through an aiohttp session with a keep-alive
+    connection pool of pool_size connections, instead of web3's default
+    session that opens a new connection for every request. aiohttp sessions
+    belong to one event loop, so a session is created per loop on first use
+    and closed once its loop is gone. This works best with a long-lived loop
+    such as the SettlementPipeline worker's. Nonces come from a NonceManager,
+    so settlements on different loops and threads never share one.
+
+    ContractConsumer awaits consume, get_client_funding and
+    has_valid_subscription directly when given an AsyncSmartContract.
+    """
+    def __init__(
+        self,
+        contract_address,
+        network_address,
+        client_private_key,
+        low_funding_threshold,
+        pool_size: int = 10,
+        keepalive_timeout: float = 30.0,
+        receipt_timeout: float = 120.0,
+        receipt_poll_interval: float = 0.5,
+    ):
+        self.provider = AsyncWeb3.AsyncHTTPProvider(network_address)
+        self.w3 = AsyncWeb3(self.provider)
+        self.w3.middleware_onion.add(RpcMetricsMiddleware)
+        self.client_account = self.w3.eth.account.from_key(client_private_key)
+        self.contract_address = contract_address
+        self.low_funding_threshold = low_funding_threshold
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.receipt_timeout = receipt_timeout
+        self.receipt_poll_interval = receipt_poll_interval
+        self._sessions = {}
+        self.nonce_manager = NonceManager(self.w3, self.client_account.address)
+
+        with open('contracts/UsageContract_sol_UsageContract.abi', 'r') as f:
+            abi = json.load(f)
+
+        self.contract = self.w3.eth.contract(address=contract_address, abi=abi)
+
+    async def consume(self, value, urgency=None):
+        """
+        Settles value and waits for the receipt. Fees are left to web3 here,
+        urgency is accepted so ContractConsumer can treat both contracts alike.
+        """
+        try:
+            started_at = time.monotonic()
+            tx_hash = await self.submit_consume(value)
+            try:
+                receipt = await self.w3.eth.wait_for_transaction_receipt(
+                    tx_hash, timeout=self.receipt_timeout, poll_latency=self.receipt_poll_interval
+                )
+            except Exception:
+                # A transaction that was never mined may have been dropped, leaving its nonce as a gap.
+                self.nonce_manager.resync()
+                raise
+            CONSUME_LATENCY.observe(time.monotonic() - started_at)
+            GAS_USED.observe(receipt.gasUsed)
+            if receipt.status != 1:
+                raise RuntimeError(f"Consume transaction {AsyncWeb3.to_hex(receipt.transactionHash)} reverted")
+            await self._log_client_funding_if_low()
+            return True
+        except Exception as e:
+            print(f"Failed to consume from contract: {e}")
+            raise RuntimeError("Failed to consume from contract") from e
+
+    async def submit_consume(self, value):
+        """
+        Signs and sends a consume transaction without waiting for its receipt.
+        """
+        await self._ensure_session()
+        for attempt in range(2):
+            try:
+                return await self._send_consume_transaction(value)
+            except Exception as e:
+                # The nonce was not used, resync so it does not become a gap for later transactions.
+                self.nonce_manager.resync()
+                if attempt > 0 or not is_nonce_error(e):
+                    raise
+
+    async def _send_consume_transaction(self, value):
+        nonce = self.nonce_manager.try_next_nonce()
+        while nonce is None:
+            self.nonce_manager.sync(await self.w3.eth.get_transaction_count(self.client_account.address, 'pending'))
+            nonce = self.nonce_manager.try_next_nonce()
+        tx = await self.contract.functions.consume(value).build_transaction({
+            'from': self.client_account.address,
+            'nonce': nonce,
+        })
+        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.client_account.key)
+        return await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+
+    async def _log_client_funding_if_low(self):
+        client_funding = await self.get_client_funding()
+        if client_funding < self.low_funding_threshold:
+            print("Client funding is low. Consider refunding to avoid interruptions.")
+
+    async def get_client_funding(self, raise_on_error=False):
+        try:
+            return await self._call(self.contract.functions.getClientFunding())
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to get client funding: {e}")
+            return 0
+
+    async def get_gas_price(self):
+        await self._ensure_session()
+        return await self.w3.eth.gas_price
+
+    async def has_valid_subscription(self, raise_on_error=False):
+        try:
+            return await self._call(self.contract.functions.hasValidSubscription())
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to check subscription status: {e}")
+            return False
+
+    async def _call(self, contract_function):
+        await self._ensure_session()
+        return await contract_function.call({'from': self.client_account.address})
+
+    async def _ensure_session(self):
+        loop = asyncio.get_running_loop()
+        if loop in self._sessions:
+            return
+        session = ClientSession(
+            raise_for_status=True,
+            connector=TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout),
+        )
+        cached_session = await self.provider.cache_async_session(session)
+        if cached_session is not session:
+            await session.close()
+        self._sessions[loop] = cached_session
+        for stale_loop in [stale for stale in self._sessions if stale.is_closed()]:
+            await self._close_session(self._sessions.pop(stale_loop))
+
+    async def _close_session(self, session):
+        try:
+            await session.close()
+        except Exception:
+            # Connections of a closed loop cannot be shut down cleanly, they are released with it.
+            logger.debug("Failed to close the session of a closed event loop.", exc_info=True)
+
+    async def close(self):
+        """
+        Closes the connection pool of the current event loop.
+        """
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
@@ -0,0 +1,124 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+from .batch_mode import BatchMode
+
+class BatchPolicy(ABC):
+    """
+    Decides when the accumulated batch is flushed to the observers.
+    """
+    @abstractmethod
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        """
+        Called once per registered call with the batch sum including that call.
+        Calls made concurrently on other threads may be counted a little late,
+        see UsageAccumulator.pending_estimate. unsettled_value adds the value of
+        flushed batches that are queued or being settled to batch_sum.
+        """
+        pass
+
+    def reset(self) -> None:
+        """
+        Called after the batch has been flushed.
+        """
+        pass
+
+    def record_settlement(self, latency: float) -> None:
+        """
+        Called with the seconds it took the observers to settle a flushed batch.
+        """
+        pass
+
+    @property
+    def flush_interval(self) -> Optional[float]:
+        """
+        Seconds between timer driven flushes, or None if the policy needs no timer.
+        """
+        return None
+
+class BatchModePolicy(BatchPolicy):
+    """
+    Adapts a legacy BatchMode to the BatchPolicy interface.
+    """
+    def __init__(self, batch_mode: BatchMode):
+        self.batch_mode = batch_mode
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        return self.batch_mode.hit()
+
+class CallCountBatchPolicy(BatchPolicy):
+    """
+    Flushes after a fixed number of calls.
+    """
+    def __init__(self, calls: int):
+        if calls < 1:
+            raise ValueError("calls must be at least 1")
+        self.calls = calls
+        self.calls_in_batch = 0
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        self.calls_in_batch += 1
+        return self.calls_in_batch >= self.calls
+
+    def reset(self) -> None:
+        self.calls_in_batch = 0
+
+class AmountBatchPolicy(BatchPolicy):
+    """
+    Flushes once the batch sum reaches a threshold in wei.
+    """
+    def __init__(self, threshold: int):
+        if threshold < 1:
+            raise ValueError("threshold must be at least 1 wei")
+        self.threshold = threshold
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        return batch_sum >= self.threshold
+
+class IntervalBatchPolicy(BatchPolicy):
+    """
+    Flushes on a fixed wall-clock interval. The processor runs a background
+    timer so the batch is settled even when no further calls arrive.
+    """
+    def __init__(self, interval: float):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.last_flush = time.monotonic()
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        return time.monotonic() - self.last_flush >= self.interval
+
+    def reset(self) -> None:
+        self.last_flush = time.monotonic()
+
+    @property
+    def flush_interval(self) -> Optional[float]:
+        return self.interval
+
+class HybridBatchPolicy(BatchPolicy):
+    """
+    Flushes as soon as any of the given policies would flush.
+    """
+    def __init__(self, *policies: BatchPolicy):
+        if not policies:
+            raise ValueError("at least one policy is required")
+        self.policies = policies
+
+    def should_flush(self, batch_sum: int, unsettled_value: int = None) -> bool:
+        # Every policy sees every call so stateful ones like the call counter stay accurate.
+        results = [policy.should_flush(batch_sum, unsettled_value) for policy in self.policies]
+        return any(results)
+
+    def reset(self) -> None:
+        for policy in self.policies:
+            policy.reset()
+
+    def record_settlement(self, latency: float) -> None:
+        for policy in self.policies:
+            policy.record_settlement(latency)
+
+    @property
+    def flush_interval(self) -> Optional[float]:
+        intervals = [policy.flush_interval for policy in self.policies if policy.flush_interval]
+        return min(intervals) if intervals else None
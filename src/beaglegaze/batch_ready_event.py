@@ -1,5 +1,16 @@
 from dataclasses import dataclass
+from typing import NamedTuple, Optional, Tuple
 from .metering_event import MeteringEvent
+from .urgency import Urgency
+
+class MethodUsage(NamedTuple):
+    """
+    Calls and amount one metered method contributed to a batch.
+    Resolve method_id with method_registry.method_name.
+    """
+    method_id: int
+    calls: int
+    amount: int
 
 @dataclass
 class BatchReadyEvent(MeteringEvent):
@@ -7,3 +18,24 @@ class BatchReadyEvent(MeteringEvent):
     Event fired when a batch is ready to be processed.
     """
     batch_sum: int
+    method_usage: Tuple[MethodUsage, ...] = ()
+    # None leaves the fee urgency to the smart contract's default.
+    urgency: Optional[Urgency] = None
+
+    def merged_with(self, other: 'BatchReadyEvent') -> 'BatchReadyEvent':
+        """
+        Returns one event settling both batches. Per-method usage is added up and
+        the more urgent of two explicit urgencies is kept.
+        """
+        usage = {}
+        for method_usage in self.method_usage + other.method_usage:
+            calls, amount = usage.get(method_usage.method_id, (0, 0))
+            usage[method_usage.method_id] = (calls + method_usage.calls, amount + method_usage.amount)
+        urgency = None
+        if self.urgency is not None and other.urgency is not None:
+            urgency = max(self.urgency, other.urgency, key=lambda u: u.reward_percentile)
+        return BatchReadyEvent(
+            self.batch_sum + other.batch_sum,
+            tuple(MethodUsage(method_id, calls, amount) for method_id, (calls, amount) in usage.items()),
+            urgency,
+        )
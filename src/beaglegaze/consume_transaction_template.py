@@ -0,0 +1,57 @@
+import collections
+import threading
+from typing import Optional
+from eth_utils import function_abi_to_4byte_selector
+
+class ConsumeTransactionTemplate:
+    """
+    Precomputed fields of a consume(uint256) transaction.
+
+    The function selector, contract address and chain ID are resolved once,
+    so build() only appends the 32-byte big-endian amount to the selector and
+    fills in nonce and fees. The gas limit is learned from receipts: the
+    largest gasUsed of the last gas_samples consume transactions times
+    gas_headroom. Until the first receipt, and again after a transaction
+    ran out of gas, gas_limit is None and the caller has to estimate.
+    """
+    def __init__(self, contract, chain_id: int, gas_samples: int = 5, gas_headroom: float = 1.2):
+        consume_abi = contract.get_function_by_name('consume').abi
+        self.to = contract.address
+        self.chain_id = chain_id
+        self.gas_headroom = gas_headroom
+        self._data_prefix = '0x' + function_abi_to_4byte_selector(consume_abi).hex()
+        self._gas_used = collections.deque(maxlen=gas_samples)
+        self._gas_limit = None
+        self._lock = threading.Lock()
+
+    @property
+    def gas_limit(self) -> Optional[int]:
+        return self._gas_limit
+
+    def build(self, value: int, nonce: int, fee_params: dict, gas: int = None) -> dict:
+        if value < 0 or value >= 1 << 256:
+            raise ValueError(f"{value} is not a uint256")
+        transaction = {
+            'to': self.to,
+            'data': self._data_prefix + value.to_bytes(32, 'big').hex(),
+            'value': 0,
+            'gas': gas or self._gas_limit,
+            'nonce': nonce,
+            'chainId': self.chain_id,
+        }
+        transaction.update(fee_params)
+        return transaction
+
+    def record_receipt(self, receipt):
+        """
+        Learns the gas limit from a mined consume transaction.
+        """
+        with self._lock:
+            if receipt.status != 1 and self._gas_limit is not None and receipt.gasUsed >= self._gas_limit:
+                # Ran out of gas, go back to estimating until a receipt shows the real usage.
+                self._gas_used.clear()
+                self._gas_limit = None
+                return
+            if receipt.status == 1:
+                self._gas_used.append(receipt.gasUsed)
+                self._gas_limit = int(max(self._gas_used) * self.gas_headroom)
@@ -1,16 +1,52 @@
+import asyncio
+import inspect
 import logging
-from .smart_contract import SmartContract
+import time
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Union
 from .metering_event import MeteringEvent
+from .metrics import BLOCKED_CONSUMERS, BLOCKED_SECONDS
 from .batch_ready_event import BatchReadyEvent
 from .metering_event_observer import MeteringEventObserver
+from . import tracing
+
+if TYPE_CHECKING:
+    from .async_smart_contract import AsyncSmartContract
+    from .smart_contract import SmartContract
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ContractConsumer(MeteringEventObserver):
-    def __init__(self, smart_contract: SmartContract):
+    settles_batches = True
+
+    def __init__(self, smart_contract: Union['SmartContract', 'AsyncSmartContract'], executor: Executor = None):
         self.contract = smart_contract
-        self.blocked = False
+        self._blocked = False
+        self._blocked_since = None
+        # SmartContract calls block on RPC round-trips and receipts, so they are
+        # run on this executor (or the loop's default one) instead of the event loop.
+        # AsyncSmartContract calls are awaited directly.
+        self.executor = executor
+
+    @property
+    def blocked(self) -> bool:
+        return self._blocked
+
+    @blocked.setter
+    def blocked(self, blocked: bool):
+        changed = blocked != self._blocked
+        self._blocked = blocked
+        if changed:
+            self._record_blocked_time(blocked)
+            self._error_state_changed(blocked)
+
+    def _record_blocked_time(self, blocked: bool):
+        if blocked:
+            self._blocked_since = time.monotonic()
+            BLOCKED_CONSUMERS.inc()
+        else:
+            BLOCKED_SECONDS.inc(time.monotonic() - self._blocked_since)
+            BLOCKED_CONSUMERS.dec()
 
     async def handle(self, event: MeteringEvent) -> None:
         if self.blocked and isinstance(event, BatchReadyEvent):
@@ -21,7 +57,7 @@ class ContractConsumer(MeteringEventObserver):
             raise IllegalStateException("Refund the smart contract to continue using this library.")
 
         if isinstance(event, BatchReadyEvent):
-            self._consume_from_contract(event)
+            await self._consume_from_contract(event)
 
     async def _handle_blocked_state(self, batch_event: BatchReadyEvent):
         await self._attempt_unblocking(batch_event.batch_sum)
@@ -29,17 +65,22 @@ class ContractConsumer(MeteringEventObserver):
             raise IllegalStateException("Refund the smart contract to continue using this library.")
 
         try:
-            self._consume_from_contract(batch_event)
+            await self._consume_from_contract(batch_event)
         except Exception as e:
             logger.error("Failed to consume from contract.", exc_info=True)
             raise
 
-    def _consume_from_contract(self, batch_event: BatchReadyEvent):
+    async def _consume_from_contract(self, batch_event: BatchReadyEvent):
+        with tracing.span('beaglegaze.consume_batch', batch_sum=batch_event.batch_sum):
+            await self._consume_unless_subscribed(batch_event)
+
+    async def _consume_unless_subscribed(self, batch_event: BatchReadyEvent):
         try:
             # Check if client has valid subscription first
             has_subscription = False
             try:
-                has_subscription = self.contract.has_valid_subscription()
+                with tracing.span('beaglegaze.check_subscription'):
+                    has_subscription = await self._call_contract(self.contract.has_valid_subscription)
             except Exception as e:
                 logger.warning(f"Failed to check subscription status, falling back to consumption: {e}")
                 has_subscription = False
@@ -48,7 +89,7 @@ class ContractConsumer(MeteringEventObserver):
                 logger.debug("Client has valid NFT subscription, skipping consumption")
                 return
             else:
-                self.contract.consume(batch_event.batch_sum)
+                await self._consume(batch_event)
         except Exception as e:
             self.blocked = True
             logger.error(
@@ -58,10 +99,16 @@ class ContractConsumer(MeteringEventObserver):
             )
             raise RuntimeError("Failed to consume from contract") from e
 
+    async def _consume(self, batch_event: BatchReadyEvent):
+        if batch_event.urgency is None:
+            return await self._call_contract(self.contract.consume, batch_event.batch_sum)
+        return await self._call_contract(self.contract.consume, batch_event.batch_sum, batch_event.urgency)
+
     async def _attempt_unblocking(self, required_amount: int):
         logger.debug("Attempting to unblock contract consumer...")
         try:
-            available_funds = self.contract.get_client_funding()
+            with tracing.span('beaglegaze.check_funding', batch_sum=required_amount):
+                available_funds = await self._call_contract(self.contract.get_client_funding)
             logger.debug(f"Available funds: {available_funds}, Required amount: {required_amount}")
 
             if available_funds >= required_amount:
@@ -75,6 +122,16 @@ class ContractConsumer(MeteringEventObserver):
         except Exception:
             logger.warning("Failed to check client funding while attempting to unblock.", exc_info=True)
 
+    async def _call_contract(self, func, *args):
+        # An AsyncSmartContract is awaited on the loop, a SmartContract runs on the executor.
+        if inspect.iscoroutinefunction(func):
+            return await func(*args)
+        return await self._run_blocking(func, *args)
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, tracing.bind_context(func), *args)
+
     def is_in_error_state(self) -> bool:
         return self.blocked
 
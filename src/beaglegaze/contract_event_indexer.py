@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+from web3 import Web3
+from .contract_event_watcher import ContractEventWatcher
+from .rpc_batch import RpcBatch
+
+logger = logging.getLogger(__name__)
+
+INDEXED_EVENTS = ['Funded', 'Consumed', 'SubscriptionPurchased', 'ClientRegistered', 'DeveloperRegistered']
+
+@dataclass
+class ClientState:
+    funding: int = 0
+    subscribed: bool = False
+    registered: bool = False
+
+class ContractEventIndexer(ContractEventWatcher):
+    """
+    Follows all UsageContract events and keeps an in-memory view of per-client
+    funding and subscription state plus the registered developers.
+
+    Logs are fetched in chunks of chunk_size blocks. After every chunk the view
+    and the next block to process are written to checkpoint_path, so a restart
+    resumes from there instead of rescanning from start_block. Only blocks with
+    at least `confirmations` confirmations are indexed.
+
+    Consumed carries the funding before the deduction, and the deducted amount
+    is taken from the consume calldata of the client's last Consumed in the
+    chunk, fetched in one batch. No state is read at historical blocks, so
+    pruned nodes work. A client whose consume was called through another
+    contract cannot be followed that way; it is left out of the view, so
+    SmartContract reads its live state instead. requestPayout emits no event,
+    so funding withdrawn that way is still shown until the client consumes again.
+
+    synced is set once a poll has caught up with the head and cleared when a
+    poll fails or is still catching up.
+    """
+    def __init__(
+        self,
+        w3,
+        contract,
+        checkpoint_path: str = None,
+        start_block: int = 0,
+        chunk_size: int = 2000,
+        confirmations: int = 0,
+        poll_interval: float = 2.0,
+    ):
+        super().__init__(w3, contract, INDEXED_EVENTS, poll_interval=poll_interval, chunk_size=chunk_size)
+        self.checkpoint_path = checkpoint_path
+        self.confirmations = confirmations
+        self.clients: Dict[str, ClientState] = {}
+        self.developers = set()
+        # Clients whose funding cannot be derived from events and calldata.
+        self.untracked_clients = set()
+        self.synced = False
+        self._head = None
+        self._view_lock = threading.Lock()
+        self.next_block = start_block
+        self._load_checkpoint()
+
+    def client_state(self, address: str) -> Optional[ClientState]:
+        with self._view_lock:
+            state = self.clients.get(address)
+            return ClientState(**asdict(state)) if state else None
+
+    def poll(self):
+        try:
+            super().poll()
+        except Exception:
+            self.synced = False
+            raise
+
+    def _latest_block(self) -> int:
+        self._head = max(self.w3.eth.block_number - self.confirmations, 0)
+        return self._head
+
+    def _commit_range(self, events, to_block: int):
+        # Changes are built on copies first, so nothing is applied twice when a range is retried.
+        with self._view_lock:
+            clients = {}
+            developers = set(self.developers)
+            untracked_clients = set(self.untracked_clients)
+            last_consumes = {}
+            for event in events:
+                args = event['args']
+                if event['event'] == 'DeveloperRegistered':
+                    developers.add(args['developer'])
+                    continue
+                client = args['client']
+                if client in untracked_clients:
+                    continue
+                if client not in clients:
+                    state = self.clients.get(client)
+                    clients[client] = ClientState(**asdict(state)) if state else ClientState()
+                state = clients[client]
+                state.registered = True
+                if event['event'] == 'Funded':
+                    state.funding += args['amount']
+                elif event['event'] == 'Consumed':
+                    # Funding before this consume, Funded events after it are added on top.
+                    state.funding = args['amount']
+                    last_consumes[client] = event['transactionHash']
+                elif event['event'] == 'SubscriptionPurchased':
+                    state.subscribed = True
+
+        for client, consumed in self._read_consumed_amounts(last_consumes).items():
+            if consumed is None:
+                logger.warning(f"Cannot follow the funding of {client} from its calldata, leaving it to live reads.")
+                del clients[client]
+                untracked_clients.add(client)
+            else:
+                clients[client].funding -= consumed
+
+        with self._view_lock:
+            for client in untracked_clients - self.untracked_clients:
+                self.clients.pop(client, None)
+            self.clients.update(clients)
+            self.developers = developers
+            self.untracked_clients = untracked_clients
+            self.next_block = to_block + 1
+            self.synced = self._head is not None and to_block >= self._head
+        if self.checkpoint_path:
+            self._save_checkpoint()
+
+    def _read_consumed_amounts(self, transaction_hashes: Dict[str, bytes]) -> Dict[str, Optional[int]]:
+        """
+        Fetches the given consume transactions in one batch and returns the amount each
+        consumed, or None where it was not a direct call of the contract's consume.
+        """
+        if not transaction_hashes:
+            return {}
+        batch = RpcBatch(self.w3)
+        indexes = {}
+        for client, transaction_hash in transaction_hashes.items():
+            indexes[client] = batch.add('eth_getTransactionByHash', [Web3.to_hex(transaction_hash)])
+        batch.execute()
+        return {client: self._consumed_amount(batch.result(index)) for client, index in indexes.items()}
+
+    def _consumed_amount(self, transaction) -> Optional[int]:
+        if not transaction or (transaction.get('to') or '').lower() != self.contract.address.lower():
+            return None
+        try:
+            function, args = self.contract.decode_function_input(transaction['input'])
+        except ValueError:
+            return None
+        return args['amount'] if function.fn_name == 'consume' else None
+
+    def _save_checkpoint(self):
+        with self._view_lock:
+            checkpoint = {
+                'contract_address': self.contract.address,
+                'next_block': self.next_block,
+                'clients': {address: asdict(state) for address, state in self.clients.items()},
+                'developers': sorted(self.developers),
+                'untracked_clients': sorted(self.untracked_clients),
+            }
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('contract_address') != self.contract.address:
+            logger.warning(f"Ignoring checkpoint {self.checkpoint_path}, it belongs to another contract.")
+            return
+        self.next_block = checkpoint['next_block']
+        self.clients = {address: ClientState(**state) for address, state in checkpoint['clients'].items()}
+        self.developers = set(checkpoint['developers'])
+        self.untracked_clients = set(checkpoint.get('untracked_clients', []))
+        logger.info(f"Resuming contract event index from block {self.next_block}")
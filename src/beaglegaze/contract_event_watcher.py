@@ -0,0 +1,115 @@
+import logging
+import threading
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+class ContractEventWatcher:
+    """
+    Polls eth_getLogs for selected UsageContract events and passes the decoded
+    events to its listeners. With a client address only events whose first
+    indexed argument is that client are fetched.
+    """
+    def __init__(
+        self,
+        w3,
+        contract,
+        event_names,
+        client_address=None,
+        poll_interval: float = 2.0,
+        chunk_size: int = None,
+    ):
+        self.w3 = w3
+        self.contract = contract
+        self.client_address = client_address
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.next_block = None
+        self._events_by_topic = {}
+        for event_name in event_names:
+            event = getattr(contract.events, event_name)()
+            self._events_by_topic[Web3.to_bytes(hexstr=event.topic)] = event
+        self._listeners = []
+        self._stopped = threading.Event()
+        self._worker = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        if self.next_block is None:
+            self.next_block = self._latest_block() + 1
+        self._stopped.clear()
+        self._worker = threading.Thread(target=self._run, name="beaglegaze-events", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def poll(self):
+        """
+        Fetches and dispatches all matching events mined since the last poll,
+        in block ranges of at most chunk_size blocks. Each range is committed
+        as a whole before its events reach the listeners, so a failure part
+        way through leaves nothing applied and the range is simply retried.
+        """
+        latest_block = self._latest_block()
+        if self.next_block is None:
+            self.next_block = latest_block + 1
+            return
+
+        while self.next_block <= latest_block:
+            to_block = latest_block
+            if self.chunk_size:
+                to_block = min(latest_block, self.next_block + self.chunk_size - 1)
+            logs = self.w3.eth.get_logs(self._log_filter(self.next_block, to_block))
+            events = [event for event in map(self._decode, logs) if event is not None]
+            self._commit_range(events, to_block)
+            for event in events:
+                self._notify_listeners(event)
+
+    def _latest_block(self) -> int:
+        return self.w3.eth.block_number
+
+    def _commit_range(self, events, to_block: int):
+        """
+        Applies the events of a block range and moves past it. Subclasses that keep
+        state must update it and next_block together.
+        """
+        self.next_block = to_block + 1
+
+    def _log_filter(self, from_block, to_block):
+        topics = [[Web3.to_hex(topic) for topic in self._events_by_topic]]
+        if self.client_address:
+            topics.append(Web3.to_hex(Web3.to_bytes(hexstr=self.client_address).rjust(32, b'\0')))
+        return {
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': topics,
+        }
+
+    def _decode(self, log):
+        event_type = self._events_by_topic.get(bytes(log['topics'][0]))
+        if event_type is None:
+            return None
+        return event_type.process_log(log)
+
+    def _notify_listeners(self, event):
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.warning(f"Event listener failed for {event['event']}.", exc_info=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.warning("Failed to poll contract events.", exc_info=True)
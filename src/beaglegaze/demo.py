@@ -5,6 +5,6 @@ logger = logging.getLogger(__name__)
 
 class Demo:
     @pay_per_call(price=1)
-    def greet(self, name):
+    async def greet(self, name):
         logger.info(f"Demo.greet called with: {name}")
         return f"Hello, {name}!"
@@ -0,0 +1,99 @@
+import logging
+import statistics
+import threading
+from .urgency import Urgency
+
+logger = logging.getLogger(__name__)
+
+REWARD_PERCENTILES = sorted({urgency.reward_percentile for urgency in Urgency})
+
+class FeeOracle:
+    """
+    Hands out EIP-1559 fee fields from a cache refreshed in the background.
+
+    A thread samples eth_feeHistory over the last block_count blocks every
+    poll_interval seconds and keeps the next block's base fee and the median
+    priority fee at each urgency's reward percentile. fee_params() only reads
+    that cache. The first call samples synchronously and starts the thread.
+
+    maxFeePerGas is the tip plus the base fee times the urgency's multiplier,
+    so LOW urgency settlements may wait a few blocks when fees rise instead of
+    overpaying. Nodes without eth_feeHistory get legacy gasPrice fields.
+    """
+    def __init__(
+        self,
+        w3,
+        poll_interval: float = 12.0,
+        block_count: int = 10,
+        default_urgency: Urgency = Urgency.MEDIUM,
+        min_priority_fee: int = 0,
+    ):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.block_count = block_count
+        self.default_urgency = default_urgency
+        self.min_priority_fee = min_priority_fee
+        self.base_fee = None
+        self.priority_fees = {}
+        self.gas_price = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = None
+
+    def fee_params(self, urgency: Urgency = None) -> dict:
+        if self._worker is None:
+            self.start()
+        urgency = urgency or self.default_urgency
+        with self._lock:
+            if self.gas_price is not None:
+                return {'gasPrice': self.gas_price}
+            tip = self.priority_fees[urgency.reward_percentile]
+            return {
+                'maxPriorityFeePerGas': tip,
+                'maxFeePerGas': tip + int(self.base_fee * urgency.base_fee_multiplier),
+            }
+
+    def refresh(self):
+        try:
+            history = self.w3.eth.fee_history(self.block_count, 'latest', REWARD_PERCENTILES)
+            base_fee = history['baseFeePerGas'][-1]
+            rewards = history.get('reward') or []
+        except Exception:
+            logger.debug("eth_feeHistory unavailable, using legacy gas price.", exc_info=True)
+            gas_price = self.w3.eth.gas_price
+            with self._lock:
+                self.gas_price = gas_price
+            return
+
+        priority_fees = {}
+        for column, percentile in enumerate(REWARD_PERCENTILES):
+            samples = [block_rewards[column] for block_rewards in rewards if block_rewards]
+            tip = int(statistics.median(samples)) if samples else 0
+            priority_fees[percentile] = max(tip, self.min_priority_fee)
+        with self._lock:
+            self.base_fee = base_fee
+            self.priority_fees = priority_fees
+            self.gas_price = None
+
+    def start(self):
+        with self._start_lock:
+            if self._worker is not None:
+                return
+            self.refresh()
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="beaglegaze-fee-oracle", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._worker is not None and self._worker.is_alive():
+            self._worker.join()
+        self._worker = None
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.warning("Failed to refresh fee data, keeping the previous values.", exc_info=True)
@@ -5,6 +5,10 @@ class MeteringEventObserver(ABC):
     """
     Observer interface for handling metering events.
     """
+    # True for observers that settle batches, such as ContractConsumer. Only their
+    # outcome decides whether a batch counts as settled, and they are never cancelled.
+    settles_batches = False
+
     @abstractmethod
     async def handle(self, event: MeteringEvent) -> None:
         pass
@@ -12,3 +16,13 @@ class MeteringEventObserver(ABC):
     @abstractmethod
     def is_in_error_state(self) -> bool:
         pass
+
+    def add_error_state_listener(self, listener) -> None:
+        """
+        Registers a callable that is invoked with the new error state whenever it changes.
+        """
+        self.__dict__.setdefault('_error_state_listeners', []).append(listener)
+
+    def _error_state_changed(self, in_error_state: bool) -> None:
+        for listener in self.__dict__.get('_error_state_listeners', ()):
+            listener(in_error_state)
@@ -0,0 +1,21 @@
+import threading
+
+UNATTRIBUTED_METHOD_ID = 0
+
+_method_names = ['<unattributed>']
+_lock = threading.Lock()
+
+def register_method(name: str) -> int:
+    """
+    Assigns the next small integer ID to a metered method. Called once per
+    decorated function, at decoration time.
+    """
+    with _lock:
+        _method_names.append(name)
+        return len(_method_names) - 1
+
+def method_name(method_id: int) -> str:
+    return _method_names[method_id]
+
+def method_count() -> int:
+    return len(_method_names)
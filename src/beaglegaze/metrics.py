@@ -0,0 +1,197 @@
+"""
+Built-in metrics for metering and settlement.
+
+The metrics below are always recorded into REGISTRY. Per-call work is kept
+off the hot path: calls per method are counted from each batch when it is
+taken, and the decorator overhead is only timed for one call in
+CALL_OVERHEAD_SAMPLE_INTERVAL. Use PrometheusExporter or render_text from
+prometheus_exporter to expose them.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+class _Metric:
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. set_function makes it read a callback at collection time instead.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = None
+
+    def set(self, value: float, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, labels: LabelValues = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: LabelValues = ()):
+        self.inc(-amount, labels)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self, labels: LabelValues = ()) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, (), self._function())]
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, labels: LabelValues = ()) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def sum(self, labels: LabelValues = ()) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total) in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    samples.append((self.name + '_bucket', labels + (_format_bound(bound),), cumulative))
+                samples.append((self.name + '_sum', labels, total))
+                samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, label_names=label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, label_names=label_names)
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float], label_names: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram, name, documentation, buckets=buckets, label_names=label_names)
+
+    def metrics(self) -> Iterable[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def _register(self, metric_class, name, documentation, **kwargs):
+        # Registering an existing name returns the existing metric.
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+REGISTRY = MetricsRegistry()
+
+# Timing every call would cost more than the call itself, so only one in this many is timed.
+# Must be a power of two.
+CALL_OVERHEAD_SAMPLE_INTERVAL = 1024
+
+CALLS = REGISTRY.counter(
+    'beaglegaze_calls_total', 'Metered calls, counted when their batch is taken.', ['method'])
+CALL_OVERHEAD = REGISTRY.histogram(
+    'beaglegaze_call_overhead_seconds', 'Time pay_per_call adds to a call, sampled.',
+    [250e-9, 500e-9, 1e-6, 2.5e-6, 5e-6, 10e-6, 100e-6, 1e-3, 10e-3, 0.1, 1.0])
+BATCH_CALLS = REGISTRY.histogram(
+    'beaglegaze_batch_calls', 'Calls per flushed batch.',
+    [1, 10, 100, 1000, 10000, 100000, 1000000])
+BATCH_VALUE = REGISTRY.histogram(
+    'beaglegaze_batch_value', 'Value of each flushed batch.',
+    [10, 100, 1000, 10 ** 4, 10 ** 6, 10 ** 9, 10 ** 12, 10 ** 15, 10 ** 18])
+FLUSHES = REGISTRY.counter(
+    'beaglegaze_flushes_total', 'Flushed batches by what triggered the flush.', ['reason'])
+CONSUME_LATENCY = REGISTRY.histogram(
+    'beaglegaze_consume_latency_seconds', 'Time from submitting a consume transaction to its receipt.',
+    [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120])
+GAS_USED = REGISTRY.histogram(
+    'beaglegaze_consume_gas_used', 'Gas used by consume transactions.',
+    [25000, 50000, 75000, 100000, 150000, 200000, 300000, 500000])
+FEE_BUMPS = REGISTRY.counter(
+    'beaglegaze_fee_bumps_total', 'Replacement transactions sent with higher fees for stuck consume transactions.')
+RPC_CALLS = REGISTRY.counter(
+    'beaglegaze_rpc_calls_total', 'JSON-RPC requests sent to the node.', ['method'])
+UNSETTLED_VALUE = REGISTRY.gauge(
+    'beaglegaze_unsettled_value', 'Value of calls that are not settled yet, including batches being settled.')
+BLOCKED_CONSUMERS = REGISTRY.gauge(
+    'beaglegaze_blocked_consumers', 'ContractConsumers currently in the blocked state.')
+BLOCKED_SECONDS = REGISTRY.counter(
+    'beaglegaze_blocked_seconds_total', 'Time ContractConsumers spent in the blocked state, counted when they unblock.')
+SETTLEMENT_QUEUE_DEPTH = REGISTRY.gauge(
+    'beaglegaze_settlement_queue_depth', 'Batches queued or being settled by SettlementPipelines.')
+SETTLEMENT_QUEUE_WAIT = REGISTRY.histogram(
+    'beaglegaze_settlement_queue_wait_seconds', 'Time a batch waited in the settlement queue before settling started.',
+    [0.001, 0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 300])
+SETTLEMENT_SUBMIT_WAIT = REGISTRY.histogram(
+    'beaglegaze_settlement_submit_wait_seconds', 'Time callers were blocked waiting for room in a full settlement queue.',
+    [0.001, 0.01, 0.1, 0.5, 1, 5, 15, 30, 60])
+SETTLEMENT_OVERFLOWS = REGISTRY.counter(
+    'beaglegaze_settlement_overflows_total', 'Batches submitted to a full settlement queue, by overflow policy.', ['policy'])
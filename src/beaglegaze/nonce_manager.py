@@ -0,0 +1,82 @@
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Lowercased messages nodes reject a transaction with when its nonce is already used or out of
+# order: geth, erigon, reth and anvil, besu, nethermind, openethereum and hardhat.
+NONCE_ERROR_MESSAGES = (
+    'nonce too low',
+    'nonce too high',
+    'nonce_too_low',
+    'nonce_too_high',
+    'oldnonce',
+    'nonce is too low',
+    'replacement transaction underpriced',
+    'incorrect nonce',
+)
+
+def is_nonce_error(error: Exception) -> bool:
+    """
+    Returns True if a node rejected a transaction because of its nonce, so a
+    resync and a single retry can fix it.
+    """
+    rpc_response = getattr(error, 'rpc_response', None)
+    rpc_error = rpc_response.get('error') if isinstance(rpc_response, dict) else None
+    message = rpc_error.get('message', '') if isinstance(rpc_error, dict) else str(error)
+    message = message.lower()
+    return any(nonce_message in message for nonce_message in NONCE_ERROR_MESSAGES)
+
+class NonceManager:
+    """
+    Hands out transaction nonces for one account from a local counter.
+
+    The node is only asked for the account's pending transaction count on
+    first use and after resync(), which callers trigger whenever a send fails
+    or a sent transaction is not mined in time, so that an unused or dropped
+    nonce never leaves a gap in front of later transactions.
+    """
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next_nonce = None
+        self._lock = threading.Lock()
+
+    def next_nonce(self) -> int:
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def try_next_nonce(self) -> Optional[int]:
+        """
+        Like next_nonce, but returns None instead of asking the node while the counter
+        is not synced. For asyncio callers that await the count themselves and sync() it.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                return None
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    @property
+    def synced(self) -> bool:
+        return self._next_nonce is not None
+
+    def sync(self, pending_count: int):
+        """
+        Seeds the counter from a pending transaction count the caller fetched itself,
+        e.g. as part of a batch. Ignored if the counter is already in use.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = pending_count
+
+    def resync(self):
+        with self._lock:
+            logger.debug(f"Resyncing nonce for {self.address}, local value was {self._next_nonce}")
+            self._next_nonce = None
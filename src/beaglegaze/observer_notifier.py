@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, List, Sequence, Tuple
+from .metering_event import MeteringEvent
+from .metering_event_observer import MeteringEventObserver
+
+logger = logging.getLogger(__name__)
+
+# Deadline for observers that do not settle batches, such as metrics or audit observers.
+DEFAULT_OBSERVER_TIMEOUT = 5.0
+
+# Event loop that runs observers which do not settle batches, detached from settlement.
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+class ObserverTimeoutError(Exception):
+    pass
+
+class ObserverNotificationError(Exception):
+    """
+    Raised when more than one settling observer failed to handle an event.
+    errors holds (observer, exception) pairs in observer order.
+    """
+    def __init__(self, errors: List[Tuple[MeteringEventObserver, Exception]]):
+        details = '; '.join(f"{type(observer).__name__}: {error!r}" for observer, error in errors)
+        super().__init__(f"{len(errors)} observers failed: {details}")
+        self.errors = errors
+
+async def notify_observers(
+    observers: Sequence[MeteringEventObserver],
+    event: MeteringEvent,
+    default_timeout: float = DEFAULT_OBSERVER_TIMEOUT,
+    timeouts: Dict[int, float] = None,
+):
+    """
+    Hands event to all observers and waits until the observers that settle
+    batches (settles_batches) are done.
+
+    Settling observers run concurrently and are always awaited to the end:
+    cancelling one could leave a sent transaction behind a batch that looks
+    unsettled. Their own RPC and receipt timeouts bound them. Their failures
+    are raised once all of them are done, a single one as it is and several
+    as an ObserverNotificationError, since they mean the batch was not settled.
+
+    Every other observer is detached onto a shared background event loop, so
+    a slow metrics or audit observer never holds up settlement. Each gets
+    timeouts[id(observer)] or default_timeout seconds (None for no deadline)
+    and is cancelled when it runs over. Their failures and timeouts are only logged.
+    """
+    timeouts = timeouts or {}
+    settling_observers = []
+    for observer in observers:
+        if observer.settles_batches:
+            settling_observers.append(observer)
+        else:
+            timeout = timeouts.get(id(observer), default_timeout)
+            asyncio.run_coroutine_threadsafe(_notify_auxiliary(observer, event, timeout), _auxiliary_loop())
+    if not settling_observers:
+        return
+    results = await asyncio.gather(
+        *(observer.handle(event) for observer in settling_observers), return_exceptions=True
+    )
+
+    errors = []
+    for observer, result in zip(settling_observers, results):
+        if isinstance(result, Exception):
+            errors.append((observer, result))
+        elif isinstance(result, BaseException):
+            raise result
+    if len(errors) == 1:
+        raise errors[0][1]
+    if errors:
+        raise ObserverNotificationError(errors)
+
+async def _notify_auxiliary(observer: MeteringEventObserver, event: MeteringEvent, timeout: float):
+    try:
+        if timeout is None:
+            await observer.handle(event)
+        else:
+            await asyncio.wait_for(observer.handle(event), timeout)
+    except asyncio.TimeoutError:
+        error = ObserverTimeoutError(f"{type(observer).__name__} did not handle the event within {timeout} seconds")
+        logger.error(f"Observer {type(observer).__name__} failed to handle {event}: {error!r}")
+    except Exception as error:
+        logger.error(f"Observer {type(observer).__name__} failed to handle {event}: {error!r}")
+
+def _auxiliary_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid
+    with _loop_lock:
+        # Threads do not survive a fork, so every worker starts its own loop on first use.
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="beaglegaze-observers", daemon=True).start()
+        return _loop
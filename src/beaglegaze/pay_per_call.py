@@ -1,7 +1,12 @@
 import functools
 import asyncio
+from time import perf_counter
 from .async_batch_processor import AsyncBatchProcessor
 from .metering_event_observer import MeteringEventObserver
+from .method_registry import register_method
+from .metrics import CALL_OVERHEAD, CALL_OVERHEAD_SAMPLE_INTERVAL
+
+_SAMPLE_MASK = CALL_OVERHEAD_SAMPLE_INTERVAL - 1
 
 _async_batch_processor = None
 
@@ -16,20 +21,55 @@ def add_event_observer(observer: MeteringEventObserver):
 def pay_per_call(price: int = 0, contract_address: str = None, network_url: str = None):
     """
     Decorator to mark methods that require a micro-payment for each call.
+
+    Coroutine functions get an async wrapper, plain functions a synchronous one,
+    so the choice is made once at decoration time instead of on every call.
+    Each decorated function is also given a method ID for per-method usage attribution.
+    One call in CALL_OVERHEAD_SAMPLE_INTERVAL is timed for the call overhead histogram.
     """
     def decorator(func):
+        method_id = register_method(f"{func.__module__}.{func.__qualname__}")
+        # Unsynchronized on purpose, a lost increment only shifts which call gets sampled.
+        calls = 0
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                nonlocal calls
+                processor = _async_batch_processor
+                if processor is None:
+                    raise Exception("AsyncBatchProcessor not set")
+
+                calls += 1
+                if calls & _SAMPLE_MASK:
+                    await processor.register_call_async(price, method_id)
+                else:
+                    started_at = perf_counter()
+                    await processor.register_call_async(price, method_id)
+                    CALL_OVERHEAD.observe(perf_counter() - started_at)
+                if processor.error_state:
+                    raise Exception("Micro-payment processing is in error state, method execution blocked.")
+
+                return await func(*args, **kwargs)
+            return async_wrapper
+
         @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
-            if not _async_batch_processor:
+        def wrapper(*args, **kwargs):
+            nonlocal calls
+            processor = _async_batch_processor
+            if processor is None:
                 raise Exception("AsyncBatchProcessor not set")
 
-            await _async_batch_processor.register_call_async(price)
-            if _async_batch_processor.is_in_error_state():
+            calls += 1
+            if calls & _SAMPLE_MASK:
+                processor.register_call(price, method_id)
+            else:
+                started_at = perf_counter()
+                processor.register_call(price, method_id)
+                CALL_OVERHEAD.observe(perf_counter() - started_at)
+            if processor.error_state:
                 raise Exception("Micro-payment processing is in error state, method execution blocked.")
 
-            if asyncio.iscoroutinefunction(func):
-                return await func(*args, **kwargs)
-            else:
-                return func(*args, **kwargs)
+            return func(*args, **kwargs)
         return wrapper
     return decorator
@@ -0,0 +1,88 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def render_text(registry: MetricsRegistry = REGISTRY) -> str:
+    """
+    Renders the registry in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in registry.metrics():
+        lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        for name, label_values, value in metric.samples():
+            # Histogram buckets carry the le label after the metric's own labels.
+            label_names = metric.label_names + ('le',) * (len(label_values) - len(metric.label_names))
+            lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+class PrometheusExporter:
+    """
+    Serves the registry on http://address:port/metrics from a background thread.
+    """
+    def __init__(self, port: int = 8000, address: str = '', registry: MetricsRegistry = REGISTRY):
+        self.port = port
+        self.address = address
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        if self._server is not None:
+            return
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = render_text(registry).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((self.address, self.port), Handler)
+        self._server.daemon_threads = True
+        # Port 0 picks a free port.
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="beaglegaze-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+def _format_labels(label_names, label_values) -> str:
+    if not label_names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(str(value))}"' for name, value in zip(label_names, label_values))
+    return '{' + pairs + '}'
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _escape_help(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n')
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from .rpc_batch import RpcBatch, RpcBatchError
+
+logger = logging.getLogger(__name__)
+
+# Receipt and log fields converted like web3's eth_getTransactionReceipt result.
+_INTEGER_FIELDS = {
+    'blobGasPrice', 'blobGasUsed', 'blockNumber', 'cumulativeGasUsed', 'effectiveGasPrice',
+    'gasUsed', 'logIndex', 'status', 'transactionIndex', 'type',
+}
+_BYTES_FIELDS = {'blockHash', 'data', 'logsBloom', 'root', 'transactionHash'}
+_ADDRESS_FIELDS = {'address', 'contractAddress', 'from', 'to'}
+
+class ReceiptTracker:
+    """
+    Confirms submitted transactions from a single polling thread.
+
+    Whenever a new block shows up, the receipts of all pending transactions
+    are fetched with one JSON-RPC batch request and the matching futures are
+    resolved with the receipt. Reverted transactions resolve normally, callers
+    check receipt.status. The thread only runs while something is pending.
+
+    A transaction tracked with a replace function that is still not mined
+    after replace_after seconds is handed to it, and the replacement it
+    returns is tracked for the same future, so whichever of them is mined
+    resolves it. The timeout counts from the first transaction.
+    """
+    def __init__(self, w3, poll_interval: float = 0.5, timeout: float = 120.0):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def track(self, tx_hash, callback=None, replace=None, replace_after: float = None) -> Future:
+        """
+        Returns a future for the receipt of tx_hash. replace is called with the hash
+        of the newest transaction once it has waited replace_after seconds, and
+        returns the hash of a replacement with the same nonce or None.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        now = time.monotonic()
+        tracked = _TrackedTransaction(future, now + self.timeout, bytes(tx_hash), replace, replace_after)
+        with self._lock:
+            self._pending[tracked.tx_hashes[-1]] = tracked
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="beaglegaze-receipts", daemon=True)
+                self._worker.start()
+        return future
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len({id(tracked) for tracked in self._pending.values()})
+
+    def _run(self):
+        last_block = None
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+            try:
+                block_number = self.w3.eth.block_number
+                if block_number != last_block:
+                    last_block = block_number
+                    self._confirm_pending()
+            except Exception:
+                logger.warning("Failed to poll transaction receipts.", exc_info=True)
+            self._expire_overdue()
+            self._replace_stuck()
+            time.sleep(self.poll_interval)
+
+    def _confirm_pending(self):
+        with self._lock:
+            tx_hashes = list(self._pending)
+
+        for tx_hash, receipt in zip(tx_hashes, self._fetch_receipts(tx_hashes)):
+            if receipt is None:
+                continue
+            with self._lock:
+                tracked = self._untrack(tx_hash)
+            if tracked and not tracked.future.done():
+                tracked.future.set_result(receipt)
+
+    def _fetch_receipts(self, tx_hashes):
+        batch = RpcBatch(self.w3)
+        for tx_hash in tx_hashes:
+            batch.add('eth_getTransactionReceipt', ['0x' + tx_hash.hex()], _format_receipt)
+        batch.execute()
+
+        receipts = []
+        for index in range(len(batch)):
+            try:
+                receipts.append(batch.result(index))
+            except RpcBatchError:
+                receipts.append(None)
+        return receipts
+
+    def _expire_overdue(self):
+        now = time.monotonic()
+        with self._lock:
+            overdue = [tx_hash for tx_hash, tracked in self._pending.items() if tracked.deadline <= now]
+            expired = [tracked for tracked in map(self._untrack, overdue) if tracked]
+        for tracked in expired:
+            if not tracked.future.done():
+                tracked.future.set_exception(TimeExhausted(f"Transaction not mined within {self.timeout} seconds"))
+
+    def _replace_stuck(self):
+        now = time.monotonic()
+        with self._lock:
+            stuck = {id(tracked): tracked for tracked in self._pending.values() if tracked.replace_at <= now}
+        for tracked in stuck.values():
+            tracked.replace_at = now + tracked.replace_after
+            try:
+                replacement = tracked.replace(tracked.tx_hashes[-1])
+            except Exception:
+                logger.warning("Failed to replace stuck transaction.", exc_info=True)
+                continue
+            if replacement is None:
+                continue
+            with self._lock:
+                if tracked.tx_hashes[-1] in self._pending:
+                    tracked.tx_hashes.append(bytes(replacement))
+                    self._pending[tracked.tx_hashes[-1]] = tracked
+
+    def _untrack(self, tx_hash):
+        # Drops every transaction tracked for the same future as tx_hash.
+        tracked = self._pending.pop(tx_hash, None)
+        if tracked:
+            for other_hash in tracked.tx_hashes:
+                self._pending.pop(other_hash, None)
+        return tracked
+
+class _TrackedTransaction:
+    __slots__ = ('future', 'deadline', 'tx_hashes', 'replace', 'replace_after', 'replace_at')
+
+    def __init__(self, future, deadline, tx_hash, replace, replace_after):
+        self.future = future
+        self.deadline = deadline
+        self.tx_hashes = [tx_hash]
+        self.replace = replace
+        self.replace_after = replace_after
+        self.replace_at = time.monotonic() + replace_after if replace else float('inf')
+
+def _format_receipt(result):
+    return AttributeDict.recursive(_format_fields(result)) if result else None
+
+def _format_fields(raw: dict) -> dict:
+    formatted = {}
+    for key, value in raw.items():
+        if value is None:
+            formatted[key] = None
+        elif key in _INTEGER_FIELDS:
+            formatted[key] = int(value, 16)
+        elif key in _BYTES_FIELDS:
+            formatted[key] = HexBytes(value)
+        elif key in _ADDRESS_FIELDS:
+            formatted[key] = Web3.to_checksum_address(value)
+        elif key == 'topics':
+            formatted[key] = [HexBytes(topic) for topic in value]
+        elif key == 'logs':
+            formatted[key] = [_format_fields(log) for log in value]
+        else:
+            formatted[key] = value
+    return formatted
@@ -0,0 +1,63 @@
+from typing import Any, Callable, List
+from .metrics import RPC_CALLS
+
+class RpcBatchError(Exception):
+    """
+    JSON-RPC error returned for one request of a batch.
+    """
+    def __init__(self, method: str, error):
+        super().__init__(f"{method} failed: {error}")
+        self.method = method
+        self.error = error
+
+class RpcBatch:
+    """
+    Collects independent JSON-RPC requests and sends them to the node as one
+    batch, so they cost a single round-trip. Providers without batch support
+    get the requests one by one.
+
+    Results are raw JSON-RPC values passed through the formatter given to
+    add(). A request that failed raises its RpcBatchError from result().
+    """
+    def __init__(self, w3):
+        self.w3 = w3
+        self._requests = []
+        self._formatters = []
+        self._results: List[Any] = []
+
+    def add(self, method: str, params: list, formatter: Callable = None) -> int:
+        self._requests.append((method, params))
+        self._formatters.append(formatter)
+        return len(self._requests) - 1
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def execute(self) -> 'RpcBatch':
+        if not self._requests:
+            return self
+        for method, _ in self._requests:
+            RPC_CALLS.inc(labels=(method,))
+        provider = self.w3.provider
+        try:
+            responses = provider.make_batch_request(self._requests)
+        except NotImplementedError:
+            responses = [provider.make_request(method, params) for method, params in self._requests]
+
+        if not isinstance(responses, list):
+            raise RpcBatchError('batch', responses.get('error'))
+
+        self._results = []
+        for (method, _), formatter, response in zip(self._requests, self._formatters, responses):
+            if 'error' in response:
+                self._results.append(RpcBatchError(method, response['error']))
+            else:
+                result = response.get('result')
+                self._results.append(formatter(result) if formatter else result)
+        return self
+
+    def result(self, index: int):
+        result = self._results[index]
+        if isinstance(result, RpcBatchError):
+            raise result
+        return result
@@ -0,0 +1,15 @@
+from web3.middleware.base import Web3Middleware
+from .metrics import RPC_CALLS
+
+class RpcMetricsMiddleware(Web3Middleware):
+    """
+    Counts every JSON-RPC request made through web3 in RPC_CALLS, by method.
+    RpcBatch talks to the provider directly and counts its requests itself.
+    """
+    def request_processor(self, method, params):
+        RPC_CALLS.inc(labels=(method,))
+        return method, params
+
+    async def async_request_processor(self, method, params):
+        RPC_CALLS.inc(labels=(method,))
+        return method, params
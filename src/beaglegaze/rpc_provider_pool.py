@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Sequence, Tuple
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_METHODS = {'eth_sendRawTransaction'}
+
+class _Endpoint:
+    def __init__(self, uri: str, provider):
+        self.uri = uri
+        self.provider = provider
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def score(self) -> float:
+        # Unmeasured endpoints sort first so every node gets probed once.
+        latency = self.latency if self.latency is not None else 0.0
+        return latency * (1.0 + 4.0 * self.error_rate)
+
+class RpcProviderPool(JSONBaseProvider):
+    """
+    web3 provider that spreads JSON-RPC traffic over several HTTP endpoints.
+
+    Every request updates the endpoint's rolling latency and error rate
+    (exponentially weighted with `smoothing`). Reads go to the healthy
+    endpoint with the lowest latency, weighted by its error rate, and fail
+    over to the next one on transport errors. An endpoint that fails
+    max_failures times in a row is skipped for `cooldown` seconds. JSON-RPC
+    error responses such as reverts come from the node itself and are
+    returned as they are.
+
+    eth_sendRawTransaction is sent to the broadcast_count best endpoints at
+    once and the first successful response is returned, so one stalled node
+    does not hold up a settlement. A JSON-RPC error response, such as
+    "already known" from a node the transaction reached through gossip, is
+    only returned if no endpoint accepted the transaction.
+
+    Use shared() to get the pool for a set of URLs, so every SmartContract on
+    the same network reuses the same connections.
+    """
+    _shared_pools: Dict[Tuple[str, ...], 'RpcProviderPool'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        broadcast_count: int = 2,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+        smoothing: float = 0.2,
+        request_kwargs: dict = None,
+    ):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("At least one endpoint URI is required")
+        self.endpoints = [
+            # web3 retries failed requests itself, failing over is faster.
+            _Endpoint(uri, Web3.HTTPProvider(uri, request_kwargs=request_kwargs, exception_retry_configuration=None))
+            for uri in endpoint_uris
+        ]
+        self.broadcast_count = broadcast_count
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._broadcast_executor = ThreadPoolExecutor(
+            max_workers=max(len(self.endpoints), 1), thread_name_prefix="beaglegaze-rpc-broadcast"
+        )
+
+    @classmethod
+    def shared(cls, endpoint_uris: Sequence[str], **kwargs) -> 'RpcProviderPool':
+        """
+        Returns the pool for these URLs, creating it on first use. kwargs only apply then.
+        """
+        key = tuple(endpoint_uris)
+        with cls._shared_lock:
+            pool = cls._shared_pools.get(key)
+            if pool is None:
+                pool = cls._shared_pools[key] = cls(endpoint_uris, **kwargs)
+            return pool
+
+    def make_request(self, method, params):
+        if method in BROADCAST_METHODS:
+            return self._broadcast(lambda provider: provider.make_request(method, params))
+        return self._route(lambda provider: provider.make_request(method, params))
+
+    def make_batch_request(self, requests):
+        return self._route(lambda provider: provider.make_batch_request(requests))
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(endpoint.provider.is_connected(show_traceback) for endpoint in self.endpoints)
+
+    def ranked_endpoints(self) -> List[_Endpoint]:
+        """
+        Healthy endpoints from fastest to slowest, followed by those cooling down.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = sorted((e for e in self.endpoints if e.healthy(now)), key=_Endpoint.score)
+            cooling = sorted((e for e in self.endpoints if not e.healthy(now)), key=lambda e: e.down_until)
+        return healthy + cooling
+
+    def _route(self, request):
+        last_error = None
+        for endpoint in self.ranked_endpoints():
+            try:
+                return self._timed(endpoint, request)
+            except Exception as e:
+                logger.warning(f"RPC endpoint {endpoint.uri} failed, trying the next one: {e}")
+                last_error = e
+        raise last_error
+
+    def _broadcast(self, request):
+        targets = self.ranked_endpoints()[:self.broadcast_count]
+        futures = [self._broadcast_executor.submit(self._timed, endpoint, request) for endpoint in targets]
+        error_response = None
+        last_error = None
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if 'error' not in response:
+                return response
+            error_response = error_response or response
+        if error_response is not None:
+            return error_response
+        raise last_error
+
+    def _timed(self, endpoint: _Endpoint, request):
+        started_at = time.monotonic()
+        try:
+            response = request(endpoint.provider)
+        except Exception:
+            self._record(endpoint, None)
+            raise
+        self._record(endpoint, time.monotonic() - started_at)
+        return response
+
+    def _record(self, endpoint: _Endpoint, latency):
+        with self._lock:
+            failed = latency is None
+            endpoint.error_rate += self.smoothing * (float(failed) - endpoint.error_rate)
+            if failed:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.max_failures:
+                    endpoint.down_until = time.monotonic() + self.cooldown
+                    endpoint.consecutive_failures = 0
+                    logger.warning(f"RPC endpoint {endpoint.uri} marked down for {self.cooldown} seconds")
+                return
+            endpoint.consecutive_failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
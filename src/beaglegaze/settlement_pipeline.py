@@ -0,0 +1,309 @@
+import asyncio
+import collections
+import enum
+import logging
+import threading
+import time
+from typing import NamedTuple
+from .batch_ready_event import BatchReadyEvent
+from .metrics import SETTLEMENT_OVERFLOWS, SETTLEMENT_QUEUE_DEPTH, SETTLEMENT_QUEUE_WAIT, SETTLEMENT_SUBMIT_WAIT
+from .usage_journal import UsageJournal
+
+logger = logging.getLogger(__name__)
+
+class OverflowPolicy(enum.Enum):
+    # Wait for room, up to block_timeout.
+    BLOCK = "BLOCK"
+    # Merge the batch into the newest queued one.
+    COALESCE = "COALESCE"
+    # Record the batch in the spill journal and settle it once there is room.
+    SPILL = "SPILL"
+    # Raise SettlementQueueFullError. AsyncBatchProcessor keeps the batch for the
+    # next flush but takes back the call that triggered it, which is refused.
+    FAIL_FAST = "FAIL_FAST"
+
+class SettlementQueueFullError(Exception):
+    pass
+
+class SettlementQueueStats(NamedTuple):
+    depth: int
+    spilled_value: int
+    overflows: int
+    max_queue_wait: float
+    mean_queue_wait: float
+    submit_wait: float
+
+class SettlementPipeline:
+    """
+    Bounded queue of batches waiting for settlement, drained by a dedicated
+    worker thread that runs its own event loop.
+
+    Submitting a batch only enqueues it, so the caller's event loop is never
+    held up by transaction signing, sending or receipt polling. Failures are
+    logged here; observers such as ContractConsumer record them in their own
+    error state. A handler signals a batch that was not settled by raising or
+    returning False.
+
+    overflow_policy decides what happens to a batch submitted while
+    max_pending batches are queued, so a slow node costs throughput instead
+    of memory and threads. SPILL needs a spill_journal; spilled batches only
+    keep their value and are settled together once the queue has room.
+    Spilled value only leaves the journal once the batch carrying it has
+    settled, so value of a failed settlement is settled again after a restart.
+    Spilled value a previous process left behind is handed out once by
+    take_recovered(); the caller settles it with a batch submitted with
+    journaled set to that value, which leaves the journal when it settles.
+    stats() reports the queue depth and how long batches and callers waited.
+    """
+    def __init__(
+        self,
+        max_pending: int = 16,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        block_timeout: float = None,
+        spill_journal: UsageJournal = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        if overflow_policy == OverflowPolicy.SPILL and spill_journal is None:
+            raise ValueError("OverflowPolicy.SPILL needs a spill_journal")
+        self.max_pending = max_pending
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.spill_journal = spill_journal
+        self.recovered = spill_journal.recovered if spill_journal else 0
+        self._handler = None
+        # (event, enqueued at, part of its value that is in the spill journal)
+        self._queue = collections.deque()
+        self._in_progress = 0
+        self._spilled_value = 0
+        self._async_waiters = []
+        self._condition = threading.Condition()
+        self._worker = None
+        self._closed = False
+        self._overflows = 0
+        self._queue_waits = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._submit_wait = 0.0
+
+    def start(self, handler):
+        """
+        Sets the coroutine function that settles a single batch event.
+        The worker thread itself is started lazily on the first submit.
+        """
+        self._handler = handler
+
+    def take_recovered(self) -> int:
+        """
+        Returns the spilled value a previous process left behind, once. It stays in the
+        spill journal until a batch submitted with it as journaled value has settled.
+        """
+        with self._condition:
+            recovered, self.recovered = self.recovered, 0
+            return recovered
+
+    @property
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._queue) + self._in_progress
+
+    def stats(self) -> SettlementQueueStats:
+        with self._condition:
+            return SettlementQueueStats(
+                depth=len(self._queue) + self._in_progress,
+                spilled_value=self._spilled_value,
+                overflows=self._overflows,
+                max_queue_wait=self._max_queue_wait,
+                mean_queue_wait=self._total_queue_wait / self._queue_waits if self._queue_waits else 0.0,
+                submit_wait=self._submit_wait,
+            )
+
+    def submit(self, event, timeout: float = None, journaled: int = 0) -> bool:
+        """
+        Enqueues an event, applying the overflow policy while the queue is full.
+        With BLOCK, waits up to timeout (block_timeout if not given) and returns
+        False if there was still no room. journaled is the part of the event's
+        value that is already in the spill journal.
+        """
+        if self._handler is None:
+            raise RuntimeError("SettlementPipeline has no handler, call start() first")
+        timeout = self.block_timeout if timeout is None else timeout
+
+        with self._condition:
+            accepted = self._offer(event, journaled)
+            if accepted is not None:
+                return accepted
+            started_at = time.monotonic()
+            self._condition.wait_for(lambda: len(self._queue) < self.max_pending or self._closed, timeout)
+            self._record_submit_wait(time.monotonic() - started_at)
+            if self._closed or len(self._queue) >= self.max_pending:
+                return False
+            return self._enqueue(event, journaled)
+
+    async def submit_async(self, event, timeout: float = None, journaled: int = 0) -> bool:
+        """
+        Enqueues an event without blocking the running event loop. With BLOCK the
+        caller awaits room in the queue instead of holding a thread.
+        """
+        if self._handler is None:
+            raise RuntimeError("SettlementPipeline has no handler, call start() first")
+        timeout = self.block_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        waited = False
+        while True:
+            with self._condition:
+                if waited and not self._closed and len(self._queue) < self.max_pending:
+                    self._record_submit_wait(time.monotonic() - started_at)
+                    return self._enqueue(event, journaled)
+                if not waited:
+                    accepted = self._offer(event, journaled)
+                    if accepted is not None:
+                        return accepted
+                if self._closed:
+                    return False
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            waited = True
+
+            remaining = None if timeout is None else timeout - (time.monotonic() - started_at)
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                with self._condition:
+                    self._record_submit_wait(time.monotonic() - started_at)
+                return False
+
+    def _offer(self, event, journaled: int):
+        """
+        Enqueues or handles an overflowing event. Returns None if the caller has to wait for room.
+        """
+        if self._closed:
+            raise RuntimeError("SettlementPipeline is closed")
+        if len(self._queue) < self.max_pending:
+            return self._enqueue(event, journaled)
+
+        self._overflows += 1
+        SETTLEMENT_OVERFLOWS.inc(labels=(self.overflow_policy.value,))
+        if self.overflow_policy == OverflowPolicy.COALESCE:
+            queued_event, enqueued_at, queued_journaled = self._queue[-1]
+            self._queue[-1] = (queued_event.merged_with(event), enqueued_at, queued_journaled + journaled)
+            return True
+        if self.overflow_policy == OverflowPolicy.SPILL:
+            self.spill_journal.record_usage(event.batch_sum - journaled)
+            self._spilled_value += event.batch_sum
+            return True
+        if self.overflow_policy == OverflowPolicy.FAIL_FAST:
+            raise SettlementQueueFullError(f"{len(self._queue)} batches are already waiting for settlement")
+        return None
+
+    def _enqueue(self, event, journaled: int = 0) -> bool:
+        self._queue.append((event, time.monotonic(), journaled))
+        SETTLEMENT_QUEUE_DEPTH.inc()
+        self._ensure_worker()
+        self._condition.notify_all()
+        return True
+
+    def _record_submit_wait(self, seconds: float):
+        self._submit_wait += seconds
+        SETTLEMENT_SUBMIT_WAIT.observe(seconds)
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Waits until every submitted event has been settled.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and self._in_progress == 0 and not self._spilled_value, timeout
+            )
+
+    async def join_async(self, timeout: float = None) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.join, timeout)
+
+    def close(self, timeout: float = None):
+        """
+        Settles what is still queued, then stops the worker thread.
+        """
+        self.join(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            self._wake_async_waiters()
+            worker = self._worker
+        if worker and worker is not threading.current_thread():
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="beaglegaze-settlement", daemon=True
+            )
+            self._worker.start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                entry = self._take()
+                if entry is None:
+                    return
+                event, enqueued_at, journaled = entry
+                settled = False
+                try:
+                    settled = loop.run_until_complete(self._handler(event)) is not False
+                except Exception:
+                    logger.error("Failed to settle batch %s.", event, exc_info=True)
+                finally:
+                    if journaled and settled:
+                        self.spill_journal.record_settlement(journaled)
+                    elif journaled:
+                        logger.warning(f"Spilled value {journaled} stays journaled until the next restart.")
+                    with self._condition:
+                        self._in_progress -= 1
+                        SETTLEMENT_QUEUE_DEPTH.dec()
+                        self._condition.notify_all()
+        finally:
+            loop.close()
+
+    def _take(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._spilled_value or self._closed)
+            if not self._queue and self._spilled_value:
+                self._unspill()
+            if not self._queue:
+                return None
+            self._in_progress += 1
+            entry = self._queue.popleft()
+            # Spilled batches go back into the queue as soon as there is room, ahead of newer ones.
+            if self._spilled_value and len(self._queue) < self.max_pending:
+                self._unspill()
+            self._record_queue_wait(time.monotonic() - entry[1])
+            self._wake_async_waiters()
+            self._condition.notify_all()
+            return entry
+
+    def _unspill(self):
+        spilled, self._spilled_value = self._spilled_value, 0
+        self._enqueue(BatchReadyEvent(spilled), spilled)
+
+    def _record_queue_wait(self, seconds: float):
+        self._queue_waits += 1
+        self._total_queue_wait += seconds
+        self._max_queue_wait = max(self._max_queue_wait, seconds)
+        SETTLEMENT_QUEUE_WAIT.observe(seconds)
+
+    def _wake_async_waiters(self):
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # The waiting loop is closed already.
+                pass
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
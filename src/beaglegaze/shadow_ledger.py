@@ -0,0 +1,142 @@
+import enum
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class LedgerExhaustedAction(enum.Enum):
+    REFUSE = "REFUSE"
+    FLUSH = "FLUSH"
+
+class InsufficientFundingException(Exception):
+    pass
+
+class ShadowLedger:
+    """
+    Local estimate of the client's balance used to admit calls without an RPC.
+
+    The estimate is the last known clientFunding minus batches that are being
+    settled and the value accumulated since the last flush. It is reconciled
+    with the chain after every settlement and whenever reconcile_interval has
+    passed; reconciliation runs on a background thread. Clients with a valid
+    subscription are always admitted.
+    """
+    def __init__(
+        self,
+        smart_contract,
+        reconcile_interval: float = 30.0,
+        on_exhausted: LedgerExhaustedAction = LedgerExhaustedAction.REFUSE,
+    ):
+        self.contract = smart_contract
+        self.reconcile_interval = reconcile_interval
+        self.on_exhausted = on_exhausted
+        self.known_funding = None
+        self.subscribed = False
+        self.unsettled = 0
+        self.in_flight = 0
+        self._reconciled_at = None
+        self._reconciling = False
+        self._reconcile_requested = False
+        self._lock = threading.Lock()
+
+    def estimate(self) -> Optional[int]:
+        """
+        Returns the estimated remaining balance, or None before the first reconciliation.
+        """
+        with self._lock:
+            if self.known_funding is None:
+                return None
+            return self.known_funding - self.in_flight - self.unsettled
+
+    def reserve(self, amount: int) -> bool:
+        """
+        Records a call worth amount and returns False if the estimate would drop below zero.
+        Refused calls are only recorded when on_exhausted is FLUSH, since they still get billed then.
+        """
+        with self._lock:
+            funded = (
+                self.known_funding is None
+                or self.subscribed
+                or self.known_funding - self.in_flight - self.unsettled - amount >= 0
+            )
+            if funded or self.on_exhausted == LedgerExhaustedAction.FLUSH:
+                self.unsettled += amount
+
+        if self._reconcile_due():
+            self.reconcile_in_background()
+        return funded
+
+    def add_unsettled(self, amount: int):
+        """
+        Records usage that gets billed whatever the estimate, such as usage recovered after a restart.
+        """
+        with self._lock:
+            self.unsettled += amount
+
+    def release(self, amount: int):
+        """
+        Takes back a reservation for a call that did not go ahead.
+        """
+        with self._lock:
+            self.unsettled -= amount
+
+    def begin_settlement(self, amount: int):
+        with self._lock:
+            self.unsettled -= amount
+            self.in_flight += amount
+
+    def cancel_settlement(self, amount: int):
+        """
+        Reverts begin_settlement for a batch that goes back to the unsettled usage.
+        """
+        with self._lock:
+            self.in_flight -= amount
+            self.unsettled += amount
+
+    def complete_settlement(self, amount: int, succeeded: bool):
+        with self._lock:
+            self.in_flight -= amount
+            if succeeded and not self.subscribed and self.known_funding is not None:
+                self.known_funding -= amount
+        self.reconcile_in_background()
+
+    def reconcile(self):
+        """
+        Refreshes funding and subscription status from the chain. Blocks on RPC calls.
+        """
+        try:
+            funding, subscribed = self.contract.get_client_state(raise_on_error=True)
+        except Exception:
+            logger.warning("Failed to reconcile shadow ledger, keeping previous estimate.", exc_info=True)
+            return
+        finally:
+            self._reconciled_at = time.monotonic()
+
+        with self._lock:
+            self.known_funding = funding
+            self.subscribed = subscribed
+        logger.debug(f"Shadow ledger reconciled: funding {funding}, subscribed {subscribed}")
+
+    def reconcile_in_background(self):
+        with self._lock:
+            # A reconciliation already running may have read the chain before the
+            # latest settlement, so ask it to go once more instead of starting another.
+            self._reconcile_requested = True
+            if self._reconciling:
+                return
+            self._reconciling = True
+        threading.Thread(target=self._run_reconcile, name="beaglegaze-ledger", daemon=True).start()
+
+    def _run_reconcile(self):
+        while True:
+            with self._lock:
+                if not self._reconcile_requested:
+                    self._reconciling = False
+                    return
+                self._reconcile_requested = False
+            self.reconcile()
+
+    def _reconcile_due(self) -> bool:
+        return self._reconciled_at is None or time.monotonic() - self._reconciled_at >= self.reconcile_interval
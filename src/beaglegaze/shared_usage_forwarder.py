@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Callable, List
+from .batch_ready_event import BatchReadyEvent
+from .metering_event import MeteringEvent
+from .metering_event_observer import MeteringEventObserver
+from .observer_notifier import notify_observers
+from .shared_usage_region import SharedUsageRegion
+
+logger = logging.getLogger(__name__)
+
+class SharedUsageForwarder(MeteringEventObserver):
+    """
+    Observer for pre-fork servers that forwards every batch into a
+    SharedUsageRegion instead of settling it in the worker.
+
+    Each worker runs a flusher thread that tries to become the region's leader.
+    Only the leader calls observer_factory, so only one process on the host
+    creates a SmartContract and sends transactions. Every flush_interval it
+    hands the combined total of all workers to those observers as one
+    BatchReadyEvent, and only takes it out of the region once they settled
+    it, so a failed settlement or a crashed leader leaves it for the next
+    attempt. The number of transactions does not grow with the number of
+    workers.
+
+    The leader publishes its observers' error state in the region. Every
+    worker's flusher passes it on to its error state listeners, so all
+    workers block calls within flush_interval while settlement is failing. Workers should use a
+    short batch policy such as IntervalBatchPolicy, since forwarding a batch
+    only costs a shared-memory update.
+    """
+    settles_batches = True
+
+    def __init__(
+        self,
+        region: SharedUsageRegion,
+        observer_factory: Callable[[], List[MeteringEventObserver]],
+        flush_interval: float = 5.0,
+    ):
+        self.region = region
+        self.observer_factory = observer_factory
+        self.flush_interval = flush_interval
+        self.observers = None
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._published_error_state = False
+
+    async def handle(self, event: MeteringEvent) -> None:
+        self._ensure_flusher()
+        if isinstance(event, BatchReadyEvent):
+            self.region.add(event.batch_sum)
+
+    def is_in_error_state(self) -> bool:
+        return self.region.error_state
+
+    def flush(self):
+        """
+        Settles the combined usage if this process is the leader. Called by the flusher thread.
+        """
+        self._refresh_error_state()
+        if not self.region.try_lead():
+            return
+        with self._flush_lock:
+            if self.observers is None:
+                logger.info(f"Process {os.getpid()} is now settling shared usage for {self.region.name}")
+                self.observers = self.observer_factory()
+
+            batch_sum = self.region.pending()
+            if batch_sum:
+                settled = False
+                try:
+                    asyncio.run(self._notify_observers_async(BatchReadyEvent(batch_sum)))
+                    settling_observers = [observer for observer in self.observers if observer.settles_batches]
+                    settled = bool(settling_observers) and not any(
+                        observer.is_in_error_state() for observer in settling_observers
+                    )
+                finally:
+                    if settled:
+                        self.region.subtract(batch_sum)
+                    self.region.error_state = any(observer.is_in_error_state() for observer in self.observers)
+                    self._refresh_error_state()
+
+    def close(self):
+        """
+        Stops the flusher and settles what is left if this process leads.
+        """
+        self._stopped.set()
+        try:
+            self.flush()
+        finally:
+            self.region.resign()
+
+    def _refresh_error_state(self):
+        in_error_state = self.region.error_state
+        if in_error_state != self._published_error_state:
+            self._published_error_state = in_error_state
+            self._error_state_changed(in_error_state)
+
+    async def _notify_observers_async(self, event: BatchReadyEvent):
+        await notify_observers(self.observers, event)
+
+    def _ensure_flusher(self):
+        # Threads do not survive a fork, so every worker starts its own on first use.
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            self.observers = None
+            threading.Thread(target=self._run_flusher, name="beaglegaze-shared-flusher", daemon=True).start()
+
+    def _run_flusher(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.error("Failed to settle shared usage.", exc_info=True)
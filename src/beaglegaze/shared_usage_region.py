@@ -0,0 +1,153 @@
+import fcntl
+import os
+import tempfile
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+# Layout of the shared block, in 64-bit words.
+_ERROR_STATE = 0
+_PENDING_LOW = 1
+_PENDING_HIGH = 2
+_WORDS = 3
+_WORD_MASK = (1 << 64) - 1
+
+class SharedUsageRegion:
+    """
+    Usage total shared by all processes on a host that open the same name.
+
+    The total lives in a small multiprocessing.shared_memory block next to the
+    error state of whichever process settles it. Updates take an flock on
+    a lock file so they are atomic across processes and a thread lock so
+    they are atomic within one. The block outlives its processes until
+    unlink() is called, so a restarted worker picks up where the old one left.
+
+    try_lead() elects a single settling process with a second, long-held
+    flock. The kernel drops it when the leader exits, so another process
+    takes over on its next attempt. POSIX only.
+    """
+    def __init__(self, name: str, lock_directory: str = None):
+        self.name = name
+        lock_directory = lock_directory or tempfile.gettempdir()
+        self._lock_path = os.path.join(lock_directory, f"beaglegaze-{name}.lock")
+        self._leader_path = os.path.join(lock_directory, f"beaglegaze-{name}.leader")
+        self._memory = self._open_memory(name)
+        self._words = self._memory.buf.cast('Q')
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+        self._leader_file = None
+        self._pid = None
+
+    def add(self, amount: int):
+        with self._locked():
+            self._write_pending(self._read_pending() + amount)
+
+    def drain(self) -> int:
+        """
+        Returns the total added by all processes since the previous drain and resets it.
+        """
+        with self._locked():
+            pending = self._read_pending()
+            self._write_pending(0)
+            return pending
+
+    def subtract(self, amount: int):
+        """
+        Removes settled usage. Usage added in the meantime stays pending.
+        """
+        with self._locked():
+            self._write_pending(self._read_pending() - amount)
+
+    def pending(self) -> int:
+        with self._locked():
+            return self._read_pending()
+
+    @property
+    def error_state(self) -> bool:
+        return bool(self._words[_ERROR_STATE])
+
+    @error_state.setter
+    def error_state(self, in_error_state: bool):
+        self._words[_ERROR_STATE] = int(in_error_state)
+
+    def try_lead(self) -> bool:
+        """
+        Returns True if this process is, or has just become, the settling process.
+        """
+        self._check_fork()
+        if self._leader_file is not None:
+            return True
+        leader_file = open(self._leader_path, 'a')
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        return True
+
+    def resign(self):
+        if self._leader_file is not None:
+            self._leader_file.close()
+            self._leader_file = None
+
+    def close(self):
+        self.resign()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._words.release()
+        self._memory.close()
+
+    def unlink(self):
+        # SharedMemory.unlink() unregisters from the resource tracker, so register first.
+        resource_tracker.register(self._memory._name, 'shared_memory')
+        self._memory.unlink()
+
+    def _locked(self):
+        self._check_fork()
+        if self._lock_file is None:
+            self._lock_file = open(self._lock_path, 'a')
+        return _FileLock(self._thread_lock, self._lock_file)
+
+    def _check_fork(self):
+        # flocks belong to the open file, which a forked child shares with its parent.
+        # Reopen in the child so each process competes on its own.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread_lock = threading.Lock()
+            for inherited in (self._lock_file, self._leader_file):
+                if inherited is not None:
+                    inherited.close()
+            self._lock_file = None
+            self._leader_file = None
+
+    def _read_pending(self) -> int:
+        return self._words[_PENDING_LOW] | self._words[_PENDING_HIGH] << 64
+
+    def _write_pending(self, pending: int):
+        self._words[_PENDING_LOW] = pending & _WORD_MASK
+        self._words[_PENDING_HIGH] = pending >> 64
+
+    @staticmethod
+    def _open_memory(name: str) -> shared_memory.SharedMemory:
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=_WORDS * 8)
+        except FileExistsError:
+            memory = shared_memory.SharedMemory(name=name)
+        # The resource tracker would unlink the block when this process exits,
+        # taking the other workers' unsettled usage with it.
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+class _FileLock:
+    def __init__(self, thread_lock: threading.Lock, lock_file):
+        self._thread_lock = thread_lock
+        self._lock_file = lock_file
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._thread_lock.release()
@@ -0,0 +1,247 @@
+import random
+import threading
+import time
+
+DEPLOYER_ADDRESS = '0x' + '00' * 19 + '01'
+CLIENT_ADDRESS = '0x' + '00' * 19 + '02'
+
+class SimulatedRevert(Exception):
+    """
+    A require() of UsageContract.sol failed. The state is left unchanged.
+    """
+
+class SimulatedSmartContract:
+    """
+    Pure-Python model of UsageContract.sol that can stand in for SmartContract
+    in tests and benchmarks without a node.
+
+    The client-facing methods (consume, get_client_funding,
+    has_valid_subscription, get_client_state) act as client_address and
+    behave like SmartContract's, including its error handling. The contract
+    functions (fund, purchase_subscription, request_payout, the developer
+    registration vote, get_developer_balance, withdraw_balance) take the
+    sender explicitly and raise SimulatedRevert with the contract's revert
+    message when a require() fails. The account that deployed the contract,
+    deployer_address, is the first developer.
+
+    Every RPC round-trip sleeps rpc_latency seconds and fails with a
+    ConnectionError with probability failure_rate. Transactions are mined at
+    the next multiple of block_time seconds after they are sent. With the
+    defaults nothing sleeps or fails, so millions of metered calls settle in
+    seconds.
+    """
+    def __init__(
+        self,
+        client_address: str = CLIENT_ADDRESS,
+        deployer_address: str = DEPLOYER_ADDRESS,
+        low_funding_threshold: int = 0,
+        subscription_price: int = 0,
+        block_time: float = 0.0,
+        rpc_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = None,
+    ):
+        self.client_address = client_address
+        self.low_funding_threshold = low_funding_threshold
+        self.subscription_price = subscription_price
+        self.block_time = block_time
+        self.rpc_latency = rpc_latency
+        self.failure_rate = failure_rate
+        self.nonce = 0
+        self.balance = 0
+        self._random = random.Random(seed)
+        self._genesis = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.developer_list = [deployer_address]
+        self._developers = {deployer_address}
+        self._clients = set()
+        self._client_funding = {}
+        self._developer_balances = {}
+        self._subscriptions = set()
+        self._pending_registrations = set()
+        self._votes = {}
+
+    @property
+    def block_number(self) -> int:
+        if not self.block_time:
+            return 0
+        return int((time.monotonic() - self._genesis) / self.block_time)
+
+    # SmartContract interface
+
+    def consume(self, value, urgency=None):
+        """
+        Settles value as the client and waits for it to be mined.
+        """
+        try:
+            self._rpc()  # eth_sendRawTransaction
+            self.nonce += 1
+            self._wait_for_block()
+            with self._lock:
+                client_funding = self._consume(self.client_address, value)
+            self._rpc()  # eth_getTransactionReceipt
+            self._log_client_funding_if_low(client_funding)
+            return True
+        except Exception as e:
+            print(f"Failed to consume from contract: {e}")
+            raise RuntimeError("Failed to consume from contract") from e
+
+    def get_client_funding(self, raise_on_error=False):
+        try:
+            self._rpc()
+            return self.client_funding(self.client_address)
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to get client funding: {e}")
+            return 0
+
+    def has_valid_subscription(self, raise_on_error=False):
+        try:
+            self._rpc()
+            return self.client_address in self._subscriptions
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to check subscription status: {e}")
+            return False
+
+    def get_client_state(self, raise_on_error=False):
+        try:
+            self._rpc()
+            with self._lock:
+                return self.client_funding(self.client_address), self.client_address in self._subscriptions
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to read client state: {e}")
+            return 0, False
+
+    def get_gas_price(self):
+        self._rpc()
+        return 0
+
+    def close(self):
+        pass
+
+    # UsageContract.sol functions
+
+    def fund(self, value: int, sender: str = None):
+        sender = sender or self.client_address
+        _require(value > 0, "No funds sent")
+        with self._lock:
+            self._clients.add(sender)
+            self._client_funding[sender] = self._client_funding.get(sender, 0) + value
+            self.balance += value
+
+    def client_funding(self, client: str) -> int:
+        return self._client_funding.get(client, 0)
+
+    def register_client(self, sender: str = None):
+        self._clients.add(sender or self.client_address)
+
+    def is_client(self, address: str) -> bool:
+        return address in self._clients
+
+    def request_payout(self, sender: str = None) -> int:
+        sender = sender or self.client_address
+        with self._lock:
+            _require(sender in self._clients, "Only clients can request payout")
+            amount = self._client_funding.get(sender, 0)
+            _require(amount > 0, "No funds available for payout")
+            self._client_funding[sender] = 0
+            self.balance -= amount
+        return amount
+
+    def purchase_subscription(self, value: int, sender: str = None):
+        sender = sender or self.client_address
+        _require(value >= self.subscription_price, "Insufficient payment")
+        with self._lock:
+            self._clients.add(sender)
+            self._subscriptions.add(sender)
+            self._distribute_payment_to_developers(value)
+            self.balance += value
+
+    def is_developer(self, address: str) -> bool:
+        return address in self._developers
+
+    def request_developer_registration(self, sender: str):
+        with self._lock:
+            _require(sender not in self._developers, "Already registered as developer")
+            _require(sender not in self._pending_registrations, "Registration already pending")
+            self._pending_registrations.add(sender)
+
+    def has_pending_registration_request(self, developer: str) -> bool:
+        return developer in self._pending_registrations
+
+    def vote_for_developer(self, developer: str, approve: bool, sender: str):
+        with self._lock:
+            _require(sender in self._developers, "Only developers can vote")
+            _require(developer in self._pending_registrations, "No pending registration for this developer")
+            votes = self._votes.setdefault(developer, {})
+            _require(sender not in votes, "Already voted for this developer")
+            votes[sender] = approve
+            if len(votes) == len(self.developer_list):
+                self._finalize_voting(developer)
+
+    def get_developer_balance(self, sender: str) -> int:
+        _require(sender in self._developers, "Only developers can check their balance")
+        return self._developer_balances.get(sender, 0)
+
+    def withdraw_balance(self, sender: str) -> int:
+        with self._lock:
+            _require(sender in self._developers, "Only developers can withdraw")
+            amount = self._developer_balances.get(sender, 0)
+            _require(amount > 0, "No balance to withdraw")
+            self._developer_balances[sender] = 0
+            self.balance -= amount
+        return amount
+
+    def _consume(self, sender: str, amount: int) -> int:
+        if amount < 0 or amount >= 1 << 256:
+            raise ValueError(f"{amount} is not a uint256")
+        funding = self._client_funding.get(sender, 0)
+        _require(funding >= amount, "Insufficient client funding")
+        _require(len(self.developer_list) > 0, "No developers registered")
+        self._client_funding[sender] = funding - amount
+        self._distribute_payment_to_developers(amount)
+        return funding - amount
+
+    def _finalize_voting(self, developer: str):
+        votes = self._votes.pop(developer)
+        # Majority of the developers at the time of the vote.
+        if sum(votes.values()) * 2 > len(self.developer_list):
+            self._developers.add(developer)
+            self.developer_list.append(developer)
+        self._pending_registrations.discard(developer)
+
+    def _distribute_payment_to_developers(self, amount: int):
+        share, remainder = divmod(amount, len(self.developer_list))
+        balances = self._developer_balances
+        for developer in self.developer_list:
+            balances[developer] = balances.get(developer, 0) + share
+        if remainder:
+            first = self.developer_list[0]
+            balances[first] += remainder
+
+    # Network model
+
+    def _rpc(self):
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise ConnectionError("Simulated RPC failure")
+
+    def _wait_for_block(self):
+        if self.block_time:
+            elapsed = time.monotonic() - self._genesis
+            time.sleep(self.block_time - elapsed % self.block_time)
+
+    def _log_client_funding_if_low(self, client_funding):
+        if client_funding < self.low_funding_threshold:
+            print("Client funding is low. Consider refunding to avoid interruptions.")
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise SimulatedRevert(message)
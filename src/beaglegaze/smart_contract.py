@@ -1,51 +1,344 @@
+import collections
 import json
 import threading
+import time
+from hexbytes import HexBytes
 from web3 import Web3
+from web3.logs import DISCARD
+from .consume_transaction_template import ConsumeTransactionTemplate
+from .contract_event_watcher import ContractEventWatcher
+from .fee_oracle import FeeOracle
+from .metrics import CONSUME_LATENCY, FEE_BUMPS, GAS_USED
+from .nonce_manager import NonceManager, is_nonce_error
+from .receipt_tracker import ReceiptTracker
+from .rpc_batch import RpcBatch
+from .rpc_metrics_middleware import RpcMetricsMiddleware
+from .rpc_provider_pool import RpcProviderPool
+from .shadow_ledger import InsufficientFundingException
+from . import tracing
+from .ttl_cache import TtlCache
+from .urgency import Urgency
 
 class SmartContract:
-    def __init__(self, contract_address, network_address, client_private_key, low_funding_threshold):
-        self.w3 = Web3(Web3.HTTPProvider(network_address))
+    """
+    A consume transaction that is not mined within replace_after seconds is
+    replaced by one with the same nonce and fees raised by at least an eighth,
+    and at least to the current HIGH urgency fees, so a LOW urgency settlement
+    cannot stall later transactions when fees rise. None disables fee bumping.
+    """
+    def __init__(
+        self,
+        contract_address,
+        network_address,
+        client_private_key,
+        low_funding_threshold,
+        cache_ttl=None,
+        indexer=None,
+        urgency=Urgency.MEDIUM,
+        replace_after=30.0,
+    ):
+        # A list of URLs shares one RpcProviderPool with every other contract on the same network.
+        if isinstance(network_address, str):
+            self.w3 = Web3(Web3.HTTPProvider(network_address))
+        else:
+            self.w3 = Web3(RpcProviderPool.shared(network_address))
+        self.w3.middleware_onion.add(RpcMetricsMiddleware)
         self.client_account = self.w3.eth.account.from_key(client_private_key)
         self.contract_address = contract_address
         self.low_funding_threshold = low_funding_threshold
+        self.replace_after = replace_after
         self.transaction_lock = threading.Lock()
+        self.nonce_manager = NonceManager(self.w3, self.client_account.address)
+        self.receipt_tracker = ReceiptTracker(self.w3)
 
         with open('contracts/UsageContract_sol_UsageContract.abi', 'r') as f:
             abi = json.load(f)
 
         self.contract = self.w3.eth.contract(address=contract_address, abi=abi)
 
-    def consume(self, value):
-        with self.transaction_lock:
+        # Funding and subscription reads are cached for cache_ttl seconds and dropped
+        # as soon as an event for this client shows they changed.
+        # A synced ContractEventIndexer answers funding and subscription reads from its view.
+        self.indexer = indexer
+        self.read_cache = None
+        self.event_watcher = None
+        self._own_transactions = collections.deque(maxlen=256)
+        self.consume_template = None
+        self.fee_oracle = FeeOracle(self.w3, default_urgency=urgency)
+        if cache_ttl:
+            self.read_cache = TtlCache(cache_ttl)
+            self.event_watcher = ContractEventWatcher(
+                self.w3,
+                self.contract,
+                ['Funded', 'Consumed', 'SubscriptionPurchased'],
+                client_address=self.client_account.address,
+            )
+            self.event_watcher.add_listener(self._invalidate_cache_on_event)
+            self.event_watcher.start()
+
+    def consume(self, value, urgency=None):
+        """
+        Settles value and waits for the receipt. urgency overrides the contract's
+        default fee urgency for this transaction.
+        """
+        with tracing.span('beaglegaze.consume', batch_sum=value) as consume_span:
             try:
-                tx_hash = self.contract.functions.consume(value).build_transaction({
-                    'from': self.client_account.address,
-                    'nonce': self.w3.eth.get_transaction_count(self.client_account.address),
-                })
-                signed_tx = self.w3.eth.account.sign_transaction(tx_hash, private_key=self.client_account.key)
-                tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-                receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-                self._log_client_funding_if_low()
-                return receipt.status == 1
+                started_at = time.monotonic()
+                future = self.consume_future(value, urgency)
+                with tracing.span('beaglegaze.wait_for_receipt', batch_sum=value):
+                    receipt = future.result()
+                CONSUME_LATENCY.observe(time.monotonic() - started_at)
+                GAS_USED.observe(receipt.gasUsed)
+                consume_span.set_attribute(tracing.TX_HASH, tracing.attribute_value(receipt.transactionHash))
+                self.consume_template.record_receipt(receipt)
+                client_funding = self._funding_from_receipt(receipt, value)
+                self._update_cached_funding(client_funding)
+                if receipt.status != 1:
+                    # Funding is checked before sending, but consumes in flight at the
+                    # same time can still exhaust it before this one is mined.
+                    raise RuntimeError(f"Consume transaction {Web3.to_hex(receipt.transactionHash)} reverted")
+                self._log_client_funding_if_low(client_funding)
+                return True
             except Exception as e:
                 print(f"Failed to consume from contract: {e}")
                 raise RuntimeError("Failed to consume from contract") from e
 
-    def _log_client_funding_if_low(self):
-        client_funding = self.get_client_funding()
+    def consume_future(self, value, urgency=None):
+        """
+        Submits a consume transaction and returns a future that resolves with its
+        receipt once the shared ReceiptTracker sees it mined.
+        """
+        tx_hash, tx = self._submit_consume(value, urgency)
+        self._own_transactions.append(bytes(tx_hash))
+        replace = self._fee_bumper(tx, value) if self.replace_after is not None else None
+        return self.receipt_tracker.track(tx_hash, self._resync_nonce_on_failure, replace, self.replace_after)
+
+    def submit_consume(self, value, urgency=None):
+        """
+        Signs and sends a consume transaction without waiting for its receipt.
+        Only nonce assignment and sending are serialized, so several settlements
+        can be in flight at the same time.
+        """
+        return self._submit_consume(value, urgency)[0]
+
+    def _submit_consume(self, value, urgency):
+        with self.transaction_lock:
+            for attempt in range(2):
+                try:
+                    return self._send_consume_transaction(value, urgency)
+                except Exception as e:
+                    # The nonce was not used, resync so it does not become a gap for later transactions.
+                    self.nonce_manager.resync()
+                    if attempt > 0 or not is_nonce_error(e):
+                        raise
+
+    def _resync_nonce_on_failure(self, future):
+        # A transaction that was never mined may have been dropped, leaving its nonce as a gap.
+        if future.exception() is not None:
+            self.nonce_manager.resync()
+
+    def _fee_bumper(self, tx, value):
+        """
+        Returns the ReceiptTracker replace function for tx. Each call resends the
+        newest version of tx with bumped fees.
+        """
+        latest = [tx]
+
+        def replace(tx_hash):
+            replacement = dict(latest[0])
+            replacement.update(_bumped_fees(latest[0], self.fee_oracle.fee_params(Urgency.HIGH)))
+            try:
+                replacement_hash = self._sign_and_send(replacement, value)
+            except Exception as e:
+                # Mined in the meantime, or the node already holds a replacement.
+                if is_nonce_error(e):
+                    return None
+                raise
+            print(f"Replaced stuck consume transaction {Web3.to_hex(tx_hash)} with {Web3.to_hex(replacement_hash)}")
+            FEE_BUMPS.inc()
+            latest[0] = replacement
+            self._own_transactions.append(bytes(replacement_hash))
+            return replacement_hash
+        return replace
+
+    def _send_consume_transaction(self, value, urgency):
+        with tracing.span('beaglegaze.build_transaction', batch_sum=value) as build_span:
+            tx = self._consume_transaction(value, urgency)
+            build_span.set_attribute(tracing.NONCE, tx['nonce'])
+        return self._sign_and_send(tx, value), tx
+
+    def _sign_and_send(self, tx, value):
+        with tracing.span('beaglegaze.sign_transaction', batch_sum=value, nonce=tx['nonce']):
+            signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.client_account.key)
+        with tracing.span('beaglegaze.send_transaction', batch_sum=value, nonce=tx['nonce']) as send_span:
+            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            send_span.set_attribute(tracing.TX_HASH, tracing.attribute_value(tx_hash))
+        return tx_hash
+
+    def _consume_transaction(self, value, urgency=None):
+        """
+        Builds a consume transaction from the ConsumeTransactionTemplate with fees
+        from the FeeOracle. Whatever is not known locally yet (chain ID, pending
+        nonce, gas limit) is fetched in one JSON-RPC batch. Without a gas estimate,
+        which would fail for a consume the funding does not cover, the batch reads
+        getClientFunding instead and InsufficientFundingException is raised before
+        anything is sent.
+        """
+        fee_params = self.fee_oracle.fee_params(urgency)
+        address = self.client_account.address
+        template = self.consume_template
+        batch = RpcBatch(self.w3)
+        gas = None
+        client_funding = None
+        if template is None or template.gas_limit is None:
+            call = {'from': address, 'to': self.contract_address, 'data': self.contract.encode_abi('consume', args=[value])}
+            gas = batch.add('eth_estimateGas', [call], _to_int)
+        else:
+            call = {'from': address, 'to': self.contract_address, 'data': self.contract.encode_abi('getClientFunding')}
+            client_funding = batch.add('eth_call', [call, 'latest'], _to_int)
+        chain_id = batch.add('eth_chainId', [], _to_int) if template is None else None
+        pending_count = batch.add('eth_getTransactionCount', [address, 'pending'], _to_int) if not self.nonce_manager.synced else None
+        batch.execute()
+
+        if client_funding is not None and batch.result(client_funding) < value:
+            raise InsufficientFundingException(
+                f"Client funding {batch.result(client_funding)} does not cover consuming {value}, refund the smart contract."
+            )
+        if chain_id is not None:
+            template = self.consume_template = ConsumeTransactionTemplate(self.contract, batch.result(chain_id))
+        if pending_count is not None:
+            self.nonce_manager.sync(batch.result(pending_count))
+        return template.build(
+            value,
+            self.nonce_manager.next_nonce(),
+            fee_params,
+            gas=batch.result(gas) if gas is not None else None,
+        )
+
+    def _funding_from_receipt(self, receipt, value):
+        # Consumed carries the funding before deduction, so the new balance is known without an eth_call.
+        consumed_events = self.contract.events.Consumed().process_receipt(receipt, errors=DISCARD)
+        if receipt.status == 1 and consumed_events:
+            return consumed_events[-1]['args']['amount'] - value
+        return None
+
+    def _update_cached_funding(self, client_funding):
+        if self.read_cache is None:
+            return
+        if client_funding is not None:
+            self.read_cache.put('client_funding', client_funding)
+        else:
+            self.read_cache.invalidate('client_funding')
+
+    def _invalidate_cache_on_event(self, event):
+        if event['event'] == 'SubscriptionPurchased':
+            self.read_cache.invalidate('has_valid_subscription')
+        elif event['event'] == 'Consumed' and bytes(event['transactionHash']) in self._own_transactions:
+            # Already applied from the receipt in consume.
+            return
+        else:
+            self.read_cache.invalidate('client_funding')
+
+    def _log_client_funding_if_low(self, client_funding=None):
+        if client_funding is None:
+            client_funding = self.get_client_funding()
         if client_funding < self.low_funding_threshold:
             print("Client funding is low. Consider refunding to avoid interruptions.")
 
-    def get_client_funding(self):
+    def get_client_funding(self, raise_on_error=False):
+        indexed_state = self._indexed_client_state()
+        if indexed_state:
+            return indexed_state.funding
         try:
-            return self.contract.functions.getClientFunding().call({'from': self.client_account.address})
+            return self._cached_read('client_funding')
         except Exception as e:
+            if raise_on_error:
+                raise
             print(f"Failed to get client funding: {e}")
             return 0
 
-    def has_valid_subscription(self):
+    def get_gas_price(self):
+        return self.w3.eth.gas_price
+
+    def has_valid_subscription(self, raise_on_error=False):
+        indexed_state = self._indexed_client_state()
+        if indexed_state:
+            return indexed_state.subscribed
         try:
-            return self.contract.functions.hasValidSubscription().call({'from': self.client_account.address})
+            return self._cached_read('has_valid_subscription')
         except Exception as e:
+            if raise_on_error:
+                raise
             print(f"Failed to check subscription status: {e}")
             return False
+
+    def _indexed_client_state(self):
+        if self.indexer is None or not self.indexer.synced:
+            return None
+        return self.indexer.client_state(self.client_account.address)
+
+    def get_client_state(self, raise_on_error=False):
+        """
+        Returns (client funding, has valid subscription), read together in one round-trip.
+        """
+        indexed_state = self._indexed_client_state()
+        if indexed_state:
+            return indexed_state.funding, indexed_state.subscribed
+        try:
+            state = self._read_client_state()
+            return state['client_funding'], state['has_valid_subscription']
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Failed to read client state: {e}")
+            return 0, False
+
+    def _cached_read(self, key):
+        if self.read_cache is None:
+            return self._read_client_state()[key]
+        return self.read_cache.get(key, lambda: self._read_client_state()[key])
+
+    def _read_client_state(self):
+        """
+        Reads funding and subscription status with one batched eth_call pair.
+        Both values are cached, whichever of them was asked for.
+        """
+        with tracing.span('beaglegaze.read_client_state'):
+            return self._read_client_state_batch()
+
+    def _read_client_state_batch(self):
+        batch = RpcBatch(self.w3)
+        reads = {'client_funding': 'getClientFunding', 'has_valid_subscription': 'hasValidSubscription'}
+        indexes = {}
+        for key, function_name in reads.items():
+            call = {'from': self.client_account.address, 'to': self.contract_address, 'data': self.contract.encode_abi(function_name)}
+            indexes[key] = batch.add('eth_call', [call, 'latest'])
+        generations = {key: self.read_cache.generation(key) for key in reads} if self.read_cache is not None else {}
+        batch.execute()
+
+        state = {}
+        for key, function_name in reads.items():
+            outputs = self.contract.get_function_by_name(function_name).abi['outputs']
+            state[key] = self.w3.codec.decode([output['type'] for output in outputs], HexBytes(batch.result(indexes[key])))[0]
+            if self.read_cache is not None:
+                # Dropped if an event invalidated the key while the batch was in flight.
+                self.read_cache.put(key, state[key], generations[key])
+        return state
+
+    def close(self):
+        self.fee_oracle.stop()
+        if self.event_watcher:
+            self.event_watcher.stop()
+
+def _bumped_fees(tx, current_fees):
+    # Nodes only accept a replacement whose fees are at least 10% higher.
+    fees = {}
+    for field in ('gasPrice', 'maxPriorityFeePerGas', 'maxFeePerGas'):
+        if field in tx:
+            fees[field] = max(tx[field] + tx[field] // 8 + 1, current_fees.get(field, 0))
+    if 'maxFeePerGas' in fees:
+        fees['maxFeePerGas'] = max(fees['maxFeePerGas'], fees['maxPriorityFeePerGas'])
+    return fees
+
+def _to_int(value):
+    return int(value, 16)
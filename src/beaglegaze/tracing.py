@@ -0,0 +1,78 @@
+"""
+Span hooks around the settlement path: flush, settle, subscription and
+funding checks, building, signing and sending the consume transaction, and
+waiting for its receipt.
+
+Any tracer with OpenTelemetry's Tracer.start_as_current_span(name, attributes=...)
+works, for example:
+
+    from opentelemetry import trace
+    tracing.set_tracer(trace.get_tracer("beaglegaze"))
+
+Without a tracer span() returns a shared no-op span, so the hooks cost a
+function call and nothing else. Per-call registration is never traced.
+Batches handed to a SettlementPipeline are settled on its worker thread, so
+their settle spans start new traces.
+"""
+import contextvars
+import functools
+
+BATCH_SUM = 'beaglegaze.batch_sum'
+NONCE = 'beaglegaze.nonce'
+TX_HASH = 'beaglegaze.tx_hash'
+
+_tracer = None
+
+class _NoOpSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+_NO_OP_SPAN = _NoOpSpan()
+
+def set_tracer(tracer):
+    """
+    Sets the tracer for all spans, None switches tracing off.
+    """
+    global _tracer
+    _tracer = tracer
+
+def get_tracer():
+    return _tracer
+
+def span(name: str, **attributes):
+    """
+    Starts a span as the current span. Use as a context manager.
+    Keyword arguments are span attributes, prefixed with 'beaglegaze.'.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NO_OP_SPAN
+    return tracer.start_as_current_span(
+        name, attributes={f"beaglegaze.{key}": attribute_value(value) for key, value in attributes.items()}
+    )
+
+def attribute_value(value):
+    # Span attributes are limited to 64-bit integers, larger amounts are kept as strings.
+    if isinstance(value, int) and not isinstance(value, bool) and not -(1 << 63) <= value < 1 << 63:
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return value
+
+def bind_context(func):
+    """
+    Returns func bound to the current context, so spans it starts on an executor
+    thread have the caller's span as parent. Returns func itself without a tracer.
+    """
+    if _tracer is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
@@ -0,0 +1,57 @@
+import threading
+import time
+
+class TtlCache:
+    """
+    Small read-through cache whose entries expire after a fixed number of seconds.
+    Loader exceptions propagate and nothing is cached for that key. A value
+    whose key was invalidated while it was loading is returned but not cached,
+    since it may predate the change that caused the invalidation. Values loaded
+    outside get() are put() with the generation() read before loading them, for
+    the same reason.
+    """
+    def __init__(self, ttl: float):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.ttl = ttl
+        self._entries = {}
+        # Bumped by invalidate(), per key and for invalidating everything.
+        self._generations = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        generation = self._key_generation(key)
+        value = loader()
+        with self._lock:
+            if self._key_generation(key) == generation:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def put(self, key, value, generation=None):
+        """
+        Caches value, unless generation is given and key was invalidated since it was read.
+        """
+        with self._lock:
+            if generation is None or self._key_generation(key) == generation:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def generation(self, key):
+        with self._lock:
+            return self._key_generation(key)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._generation += 1
+            else:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _key_generation(self, key):
+        return self._generation, self._generations.get(key, 0)
@@ -0,0 +1,15 @@
+import enum
+
+class Urgency(enum.Enum):
+    LOW = "LOW"
+    MEDIUM = "MEDIUM"
+    HIGH = "HIGH"
+
+    @property
+    def reward_percentile(self) -> int:
+        return {Urgency.LOW: 10, Urgency.MEDIUM: 50, Urgency.HIGH: 90}[self]
+
+    @property
+    def base_fee_multiplier(self) -> float:
+        # LOW covers one full base fee increase (12.5%), the others match web3's 2x default.
+        return 1.125 if self == Urgency.LOW else 2.0
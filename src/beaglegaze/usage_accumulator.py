@@ -0,0 +1,185 @@
+import threading
+from typing import Tuple
+from .batch_ready_event import MethodUsage
+from .method_registry import method_count
+
+# pending_estimate() re-reads the other shards after this many calls of the calling thread.
+PENDING_ESTIMATE_INTERVAL = 64
+
+class _Shard:
+    __slots__ = (
+        'total', 'drained', 'calls', 'amounts', 'drained_calls', 'drained_amounts', 'owner',
+        'others', 'others_countdown', 'others_drains', 'lock',
+    )
+
+    def __init__(self, owner: threading.Thread, capacity: int):
+        self.total = 0
+        self.drained = 0
+        # Indexed by method ID. Plain lists: wei sums outgrow 64 bits, and
+        # incrementing a list slot is cheaper than boxing through array('Q').
+        self.calls = [0] * capacity
+        self.amounts = [0] * capacity
+        self.drained_calls = [0] * capacity
+        self.drained_amounts = [0] * capacity
+        self.owner = owner
+        # Pending amount of the other shards as last read by pending_estimate().
+        self.others = 0
+        self.others_countdown = 0
+        self.others_drains = -1
+        # Only held to swap calls and amounts, see grow.
+        self.lock = threading.Lock()
+
+    def grow(self, capacity: int):
+        extra = capacity - len(self.amounts)
+        if extra <= 0:
+            return
+        # Grown copies are swapped in together, so drain() never sees the lists at
+        # different lengths. Only the owner writes them, so the copies miss nothing.
+        calls = self.calls + [0] * extra
+        amounts = self.amounts + [0] * extra
+        with self.lock:
+            self.calls, self.amounts = calls, amounts
+
+class UsageAccumulator:
+    """
+    Sharded usage counter with an exactly-once drain.
+
+    Every thread adds to its own shard, so recording a call takes no lock. A
+    shard's counters only ever grow and are written by its owning thread alone;
+    drain() remembers how much of each shard it has already handed out and
+    returns the difference. Calls that land while a drain is running are
+    simply picked up by the next one, nothing is reset and nothing is lost.
+    Tasks on the same event loop share their thread's shard, which is safe
+    because an increment never spans an await.
+
+    Besides the total, each shard keeps per-method call counts and amounts in
+    lists indexed by the method ID from method_registry, preallocated when the
+    shard is created so that recording a call allocates nothing.
+
+    pending() walks every shard. pending_estimate() is the per-call variant:
+    it adds the calling thread's own pending amount to the other shards' total
+    as read at most PENDING_ESTIMATE_INTERVAL calls and no drain ago.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = ()
+        self._drains = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount: int, method_id: int = 0):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._register_shard()
+        # Write order matters to drain(): total, then amount, then call count.
+        shard.total += amount
+        try:
+            shard.amounts[method_id] += amount
+        except IndexError:
+            shard.grow(max(method_count(), method_id + 1))
+            shard.amounts[method_id] += amount
+        shard.calls[method_id] += 1
+
+    def add_usage(self, method_usage: Tuple[MethodUsage, ...]):
+        """
+        Adds drained usage back, for example a batch that could not be handed off for settlement.
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._register_shard()
+        shard.grow(max(len(shard.amounts), method_count()))
+        for usage in method_usage:
+            shard.total += usage.amount
+            shard.amounts[usage.method_id] += usage.amount
+            shard.calls[usage.method_id] += usage.calls
+
+    def remove(self, amount: int, method_id: int = 0):
+        """
+        Takes back a call the calling thread added and that did not go ahead.
+        """
+        shard = self._local.shard
+        # The reverse of add(), so drain() may see the amount without the call but never the other way round.
+        shard.calls[method_id] -= 1
+        shard.amounts[method_id] -= amount
+        shard.total -= amount
+
+    def pending(self) -> int:
+        pending = 0
+        for shard in self._shards:
+            pending += shard.total - shard.drained
+        return pending
+
+    def pending_estimate(self) -> int:
+        """
+        Pending amount including everything the calling thread added, while calls of
+        other threads may show up to PENDING_ESTIMATE_INTERVAL of their own calls late.
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            return self.pending()
+        own = shard.total - shard.drained
+        shard.others_countdown -= 1
+        if shard.others_countdown <= 0 or shard.others_drains != self._drains:
+            shard.others_drains = self._drains
+            shard.others_countdown = PENDING_ESTIMATE_INTERVAL
+            shard.others = self.pending() - own
+        return own + shard.others
+
+    def drain(self) -> Tuple[int, Tuple[MethodUsage, ...]]:
+        """
+        Returns the amount added since the previous drain and its per-method breakdown.
+        """
+        with self._lock:
+            calls_by_method = {}
+            amounts_by_method = {}
+            live_shards = []
+            for shard in self._shards:
+                # Check liveness before reading, a finished thread cannot add after that.
+                if shard.owner.is_alive():
+                    live_shards.append(shard)
+                self._drain_shard(shard, calls_by_method, amounts_by_method)
+            self._shards = tuple(live_shards)
+            self._drains += 1
+
+        method_usage = tuple(
+            MethodUsage(method_id, calls_by_method[method_id], amounts_by_method[method_id])
+            for method_id in sorted(calls_by_method)
+        )
+        return sum(amounts_by_method.values()), method_usage
+
+    def _drain_shard(self, shard: _Shard, calls_by_method: dict, amounts_by_method: dict):
+        with shard.lock:
+            calls, amounts = shard.calls, shard.amounts
+        # Calls added to lists grown after this point are picked up by the next drain.
+        size = len(amounts)
+        if len(shard.drained_amounts) < size:
+            extra = size - len(shard.drained_amounts)
+            shard.drained_calls.extend([0] * extra)
+            shard.drained_amounts.extend([0] * extra)
+
+        drained_amount = 0
+        for method_id in range(size):
+            # add() bumps the amount before the call count, so reading the count first
+            # means a call is never reported without its amount.
+            current_calls = calls[method_id]
+            current_amount = amounts[method_id]
+            new_calls = current_calls - shard.drained_calls[method_id]
+            new_amount = current_amount - shard.drained_amounts[method_id]
+            if new_calls or new_amount:
+                calls_by_method[method_id] = calls_by_method.get(method_id, 0) + new_calls
+                amounts_by_method[method_id] = amounts_by_method.get(method_id, 0) + new_amount
+                shard.drained_calls[method_id] = current_calls
+                shard.drained_amounts[method_id] = current_amount
+                drained_amount += new_amount
+        # Derived from the amounts actually drained, so a call whose amount was not
+        # written yet stays pending until the next drain.
+        shard.drained += drained_amount
+
+    def _register_shard(self) -> _Shard:
+        shard = _Shard(threading.current_thread(), max(method_count(), 16))
+        self._local.shard = shard
+        with self._lock:
+            self._shards = self._shards + (shard,)
+        return shard
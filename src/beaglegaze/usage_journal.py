@@ -0,0 +1,146 @@
+import collections
+import logging
+import os
+import struct
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_RECORD = struct.Struct('<c16sI')
+_DELTA = b'D'
+_CHECKPOINT = b'C'
+_SEGMENT_PREFIX = 'usage-'
+_SEGMENT_SUFFIX = '.journal'
+
+class UsageJournal:
+    """
+    Append-only, segment-file journal of metered usage that has not been settled yet.
+
+    record_usage() and record_settlement() only append to an in-memory queue.
+    A writer thread commits the queue every commit_interval seconds as one
+    record holding the net change, so a single write and fsync cover every
+    call made in between (group commit). Every segment starts with a
+    checkpoint of the outstanding amount. Once a segment grows past
+    segment_bytes a new one is started and the older segments are deleted.
+
+    Opening the journal replays the newest segment whose checkpoint is intact,
+    stopping at the first torn record, and exposes the result as outstanding.
+    At most the last commit_interval of usage is lost when the process dies.
+    Usage of a failed settlement stays outstanding and is settled again after
+    the next restart.
+    """
+    def __init__(self, directory: str, commit_interval: float = 0.05, segment_bytes: int = 1 << 20, fsync: bool = True):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._queue = collections.deque()
+        self._file = None
+        self._segment_number = 0
+        self._stopped = threading.Event()
+        self._commit_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.outstanding = self._replay()
+        self.recovered = self.outstanding
+        self._start_segment()
+        self._writer = threading.Thread(target=self._run, name="beaglegaze-journal", daemon=True)
+        self._writer.start()
+
+    def record_usage(self, amount: int):
+        self._queue.append(amount)
+
+    def record_settlement(self, amount: int):
+        self._queue.append(-amount)
+
+    def commit(self):
+        """
+        Writes everything queued so far to the current segment.
+        """
+        with self._commit_lock:
+            delta = 0
+            queue = self._queue
+            try:
+                while True:
+                    delta += queue.popleft()
+            except IndexError:
+                pass
+            if delta == 0:
+                return
+            self.outstanding += delta
+            self._write_record(_DELTA, delta)
+            if self._file.tell() >= self.segment_bytes:
+                self._start_segment()
+
+    def close(self):
+        self._stopped.set()
+        if self._writer is not threading.current_thread():
+            self._writer.join()
+        self.commit()
+        self._file.close()
+
+    def _run(self):
+        while not self._stopped.wait(self.commit_interval):
+            try:
+                self.commit()
+            except Exception:
+                logger.error("Failed to commit usage journal.", exc_info=True)
+
+    def _write_record(self, record_type: bytes, amount: int):
+        encoded = amount.to_bytes(16, 'little', signed=True)
+        self._file.write(_RECORD.pack(record_type, encoded, zlib.crc32(record_type + encoded)))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _start_segment(self):
+        previous = self._file
+        self._segment_number += 1
+        self._file = open(self._segment_path(self._segment_number), 'wb')
+        self._write_record(_CHECKPOINT, self.outstanding)
+        if previous:
+            previous.close()
+        # The new checkpoint is durable, everything before it can go.
+        for number in self._segment_numbers():
+            if number < self._segment_number:
+                os.remove(self._segment_path(number))
+
+    def _replay(self) -> int:
+        numbers = self._segment_numbers()
+        if numbers:
+            self._segment_number = numbers[-1]
+        for number in reversed(numbers):
+            outstanding = self._replay_segment(self._segment_path(number))
+            if outstanding is not None:
+                if outstanding:
+                    logger.info(f"Recovered {outstanding} unsettled usage from journal segment {number}")
+                return outstanding
+            logger.warning(f"Skipping journal segment {number}, its checkpoint is incomplete.")
+        return 0
+
+    def _replay_segment(self, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        outstanding = None
+        for offset in range(0, len(data) - _RECORD.size + 1, _RECORD.size):
+            record_type, amount, checksum = _RECORD.unpack_from(data, offset)
+            if zlib.crc32(record_type + amount) != checksum:
+                break
+            value = int.from_bytes(amount, 'little', signed=True)
+            if offset == 0:
+                if record_type != _CHECKPOINT:
+                    return None
+                outstanding = value
+            else:
+                outstanding += value
+        return outstanding
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                numbers.append(int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{_SEGMENT_PREFIX}{number:08d}{_SEGMENT_SUFFIX}")
@@ -0,0 +1,75 @@
+import time
+import pytest
+from beaglegaze.adaptive_batch_policy import AdaptiveBatchPolicy
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+
+GAS_PRICE = 10
+GAS_PER_SETTLEMENT = 1000
+ESTIMATED_FEE = GAS_PRICE * GAS_PER_SETTLEMENT
+
+def wait_for_gas_price(policy):
+    deadline = time.monotonic() + 5
+    while policy.gas_price is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+@pytest.fixture
+def decisions():
+    return []
+
+@pytest.fixture
+def policy(decisions):
+    policy = AdaptiveBatchPolicy(
+        gas_price_source=lambda: GAS_PRICE,
+        max_unsettled=ESTIMATED_FEE * 10,
+        gas_per_settlement=GAS_PER_SETTLEMENT,
+        on_decision=decisions.append,
+    )
+    policy.should_flush(0)
+    wait_for_gas_price(policy)
+    policy.reset()
+    return policy
+
+def test_should_defer_flush_while_batch_is_worth_less_than_fee(policy, decisions):
+    assert not policy.should_flush(ESTIMATED_FEE - 1)
+    assert decisions == []
+
+def test_should_flush_once_batch_covers_fee(policy, decisions):
+    assert policy.should_flush(ESTIMATED_FEE)
+    assert decisions[-1].reason == "fee_covered"
+    assert decisions[-1].estimated_fee == ESTIMATED_FEE
+
+def test_should_flush_before_exposure_ceiling_when_settlement_is_slow(decisions):
+    policy = AdaptiveBatchPolicy(
+        gas_price_source=lambda: 10 ** 12,
+        max_unsettled=1000,
+        on_decision=decisions.append,
+    )
+    policy.record_settlement(10.0)
+    policy.call_rate = 100.0
+    policy.average_price = 1.0
+
+    assert policy.should_flush(1)
+    assert decisions[-1].reason == "exposure_ceiling"
+    assert decisions[-1].projected_exposure >= 1000
+
+def test_should_count_batches_in_flight_towards_the_exposure_ceiling(policy, decisions):
+    async_processor = AsyncBatchProcessor(policy)
+    async_processor.accumulator.add(ESTIMATED_FEE * 10 - 1)
+    # Flushed but not settled yet.
+    async_processor._take_batch()
+
+    assert async_processor._record_call(1, 0)
+    assert decisions[-1].reason == "exposure_ceiling"
+    assert decisions[-1].batch_sum == 1
+    assert decisions[-1].projected_exposure >= ESTIMATED_FEE * 10
+
+def test_should_keep_last_gas_price_when_lookup_fails(policy):
+    def failing_source():
+        raise RuntimeError("RPC down")
+
+    policy.gas_price_source = failing_source
+    policy.gas_price_ttl = 0
+    policy.should_flush(1)
+    time.sleep(0.05)
+
+    assert policy.gas_price == GAS_PRICE
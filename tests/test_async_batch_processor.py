@@ -1,10 +1,14 @@
 import pytest
+import asyncio
+import time
 from unittest.mock import Mock, patch
 from beaglegaze.async_batch_processor import AsyncBatchProcessor
 from beaglegaze.batch_mode import BatchMode
 from beaglegaze.contract_consumer import ContractConsumer
 from beaglegaze.batch_ready_event import BatchReadyEvent
 from beaglegaze.metering_event_observer import MeteringEventObserver
+from beaglegaze.observer_notifier import ObserverNotificationError
+from beaglegaze.usage_journal import UsageJournal
 
 FIRST_CALL_AMOUNT = 50
 
@@ -37,6 +41,98 @@ async def test_should_go_into_error_state_when_observer_throws_exception(async_p
 
     assert async_processor.is_in_error_state()
 
+class RecordingObserver(MeteringEventObserver):
+    def __init__(self, delay=0.0, error=None, settles_batches=False):
+        self.delay = delay
+        self.error = error
+        self.settles_batches = settles_batches
+        self.events = []
+
+    async def handle(self, event):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.events.append(event)
+
+    def is_in_error_state(self) -> bool:
+        return self.settles_batches and self.error is not None
+
+@pytest.mark.asyncio
+async def test_should_time_out_hanging_observer_without_failing_the_caller(async_processor):
+    hanging_observer = RecordingObserver(delay=60)
+    slow_observers = [RecordingObserver(delay=0.2), RecordingObserver(delay=0.2, settles_batches=True)]
+    async_processor.add_observer(hanging_observer, timeout=0.3)
+    for observer in slow_observers:
+        async_processor.add_observer(observer)
+
+    started_at = time.monotonic()
+    await async_processor.register_call_async(FIRST_CALL_AMOUNT)
+
+    assert time.monotonic() - started_at < 1.0
+    assert len(slow_observers[1].events) == 1
+    await asyncio.sleep(0.5)
+    assert all(len(observer.events) == 1 for observer in slow_observers)
+
+@pytest.mark.asyncio
+async def test_should_not_wait_for_auxiliary_observers(async_processor, caplog):
+    auxiliary_observer = RecordingObserver(delay=1.0)
+    failing_observer = RecordingObserver(delay=0.1, error=RuntimeError("audit log unavailable"))
+    async_processor.add_observer(auxiliary_observer)
+    async_processor.add_observer(failing_observer)
+    async_processor.add_observer(RecordingObserver(settles_batches=True))
+
+    started_at = time.monotonic()
+    await async_processor.register_call_async(FIRST_CALL_AMOUNT)
+
+    assert time.monotonic() - started_at < 0.5
+    assert auxiliary_observer.events == []
+    await asyncio.sleep(0.3)
+    assert "audit log unavailable" in caplog.text
+
+@pytest.mark.asyncio
+async def test_should_record_settlement_when_only_auxiliary_observer_fails(tmp_path):
+    journal = UsageJournal(str(tmp_path))
+    async_processor = AsyncBatchProcessor(BatchMode.OFF, journal=journal)
+    async_processor.add_observer(RecordingObserver(error=RuntimeError("audit log unavailable")))
+    async_processor.add_observer(RecordingObserver(settles_batches=True))
+
+    await async_processor.register_call_async(FIRST_CALL_AMOUNT)
+    journal.close()
+
+    assert journal.outstanding == 0
+
+@pytest.mark.asyncio
+async def test_should_report_all_settlement_failures_together(async_processor):
+    failing_observers = [
+        RecordingObserver(error=RuntimeError("first"), settles_batches=True),
+        RecordingObserver(error=ValueError("second"), settles_batches=True),
+    ]
+    healthy_observer = RecordingObserver()
+    for observer in failing_observers + [healthy_observer]:
+        async_processor.add_observer(observer)
+
+    with pytest.raises(ObserverNotificationError) as e:
+        await async_processor.register_call_async(FIRST_CALL_AMOUNT)
+
+    assert [observer for observer, error in e.value.errors] == failing_observers
+    await asyncio.sleep(0.1)
+    assert len(healthy_observer.events) == 1
+
+@pytest.mark.asyncio
+async def test_should_not_block_the_event_loop_when_flushing_synchronously(async_processor):
+    settling_observer = RecordingObserver(delay=0.5, settles_batches=True)
+    async_processor.add_observer(settling_observer)
+
+    started_at = time.monotonic()
+    async_processor.register_call(FIRST_CALL_AMOUNT)
+
+    assert time.monotonic() - started_at < 0.2
+    assert settling_observer.events == []
+    assert await async_processor.wait_for_settlement_async(timeout=5)
+    assert [event.batch_sum for event in settling_observer.events] == [FIRST_CALL_AMOUNT]
+    assert async_processor.unsettled_value() == 0
+    async_processor.close()
+
 @pytest.mark.asyncio
 async def test_should_process_batch_when_batch_mode_is_random(mocker):
     async_processor = AsyncBatchProcessor(BatchMode.RANDOM)
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from beaglegaze.async_smart_contract import AsyncSmartContract
+
+CONTRACT_ADDRESS = "0x5FBdB2315678AFEcB367f02c64afa4fa5b1e7C41"
+PRIVATE_KEY = "0x" + "11" * 32
+
+@pytest.fixture
+def async_contract(mocker):
+    async_contract = AsyncSmartContract(CONTRACT_ADDRESS, "http://localhost:8545", PRIVATE_KEY, 10)
+    async_contract.w3 = mocker.Mock()
+    async_contract.w3.eth.get_transaction_count = mocker.AsyncMock(side_effect=[3, 5])
+    async_contract.w3.eth.send_raw_transaction = mocker.AsyncMock(return_value=b"\x01" * 32)
+    async_contract.contract = mocker.Mock()
+    async_contract.contract.functions.consume.return_value.build_transaction = mocker.AsyncMock(return_value={})
+    mocker.patch.object(async_contract, '_ensure_session', mocker.AsyncMock())
+    return async_contract
+
+@pytest.mark.asyncio
+async def test_should_assign_consecutive_nonces_locally(async_contract):
+    await async_contract.submit_consume(1)
+    await async_contract.submit_consume(1)
+
+    build_transaction = async_contract.contract.functions.consume.return_value.build_transaction
+    assert [c.args[0]['nonce'] for c in build_transaction.call_args_list] == [3, 4]
+    async_contract.w3.eth.get_transaction_count.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_should_resync_nonce_and_retry_once_on_nonce_error(async_contract, mocker):
+    async_contract.w3.eth.send_raw_transaction.side_effect = [ValueError("nonce too low"), b"\x02" * 32]
+
+    assert await async_contract.submit_consume(1) == b"\x02" * 32
+
+    build_transaction = async_contract.contract.functions.consume.return_value.build_transaction
+    assert [c.args[0]['nonce'] for c in build_transaction.call_args_list] == [3, 5]
+
+def test_should_share_nonces_between_event_loops(async_contract):
+    async_contract.w3.eth.get_transaction_count.side_effect = None
+    async_contract.w3.eth.get_transaction_count.return_value = 3
+
+    asyncio.run(async_contract.submit_consume(1))
+    asyncio.run(async_contract.submit_consume(1))
+
+    build_transaction = async_contract.contract.functions.consume.return_value.build_transaction
+    assert [c.args[0]['nonce'] for c in build_transaction.call_args_list] == [3, 4]
+
+@pytest.mark.asyncio
+async def test_should_close_sessions_of_closed_event_loops(mocker):
+    async_contract = AsyncSmartContract(CONTRACT_ADDRESS, "http://localhost:8545", PRIVATE_KEY, 10)
+    closed_loop = asyncio.new_event_loop()
+    closed_loop.close()
+    stale_session = mocker.Mock(close=mocker.AsyncMock())
+    async_contract._sessions[closed_loop] = stale_session
+
+    await async_contract._ensure_session()
+
+    stale_session.close.assert_awaited_once()
+    assert list(async_contract._sessions) == [asyncio.get_running_loop()]
+    await async_contract.close()
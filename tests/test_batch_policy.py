@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import (
+    AmountBatchPolicy,
+    CallCountBatchPolicy,
+    HybridBatchPolicy,
+    IntervalBatchPolicy,
+)
+from beaglegaze.contract_consumer import ContractConsumer
+
+def flushed_sums(contract_consumer):
+    return [call.args[0].batch_sum for call in contract_consumer.handle.call_args_list]
+
+@pytest.fixture
+def contract_consumer(mocker):
+    contract_consumer = mocker.Mock(spec=ContractConsumer)
+    contract_consumer.handle = mocker.AsyncMock()
+    contract_consumer.is_in_error_state.return_value = False
+    return contract_consumer
+
+@pytest.mark.asyncio
+async def test_should_flush_after_configured_number_of_calls(contract_consumer):
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(3))
+    async_processor.add_observer(contract_consumer)
+
+    for i in range(7):
+        await async_processor.register_call_async(5)
+
+    assert flushed_sums(contract_consumer) == [15, 15]
+    assert async_processor.batch_sum == 5
+
+@pytest.mark.asyncio
+async def test_should_flush_when_amount_threshold_is_crossed(contract_consumer):
+    async_processor = AsyncBatchProcessor(AmountBatchPolicy(100))
+    async_processor.add_observer(contract_consumer)
+
+    for price in (40, 40, 40, 10, 90):
+        await async_processor.register_call_async(price)
+
+    assert flushed_sums(contract_consumer) == [120, 100]
+
+@pytest.mark.asyncio
+async def test_should_flush_on_interval_without_further_calls(contract_consumer):
+    async_processor = AsyncBatchProcessor(IntervalBatchPolicy(0.05))
+    async_processor.add_observer(contract_consumer)
+
+    await async_processor.register_call_async(7)
+    await asyncio.sleep(0.3)
+    async_processor.close()
+
+    assert flushed_sums(contract_consumer) == [7]
+
+@pytest.mark.asyncio
+async def test_should_flush_on_whichever_hybrid_policy_comes_first(contract_consumer):
+    async_processor = AsyncBatchProcessor(HybridBatchPolicy(CallCountBatchPolicy(3), AmountBatchPolicy(50)))
+    async_processor.add_observer(contract_consumer)
+
+    for price in (60, 1, 1, 1):
+        await async_processor.register_call_async(price)
+
+    assert flushed_sums(contract_consumer) == [60, 3]
+
+@pytest.mark.asyncio
+async def test_should_flush_remaining_batch_on_close(contract_consumer):
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(10))
+    async_processor.add_observer(contract_consumer)
+
+    await async_processor.register_call_async(5)
+    async_processor.close()
+
+    assert flushed_sums(contract_consumer) == [5]
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import Mock, patch
 from beaglegaze.contract_consumer import ContractConsumer, IllegalStateException
 from beaglegaze.batch_ready_event import BatchReadyEvent
+from beaglegaze.urgency import Urgency
 
 BATCH_AMOUNT = 100
 SUFFICIENT_FUNDS = 100
@@ -80,3 +81,22 @@ async def test_should_remain_blocked_when_funding_is_insufficient_for_pending_ba
 
     assert contract_consumer.is_in_error_state()
     assert mock_smart_contract.consume.call_count == 1
+
+@pytest.mark.asyncio
+async def test_should_await_async_smart_contract_without_executor(mocker):
+    async_contract = mocker.Mock()
+    async_contract.has_valid_subscription = mocker.AsyncMock(return_value=False)
+    async_contract.consume = mocker.AsyncMock(return_value=True)
+    executor = mocker.Mock()
+    contract_consumer = ContractConsumer(async_contract, executor=executor)
+
+    await contract_consumer.handle(BatchReadyEvent(BATCH_AMOUNT))
+
+    async_contract.consume.assert_awaited_once_with(BATCH_AMOUNT)
+    executor.submit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_should_pass_batch_urgency_to_contract(contract_consumer, mock_smart_contract):
+    await contract_consumer.handle(BatchReadyEvent(BATCH_AMOUNT, urgency=Urgency.LOW))
+
+    mock_smart_contract.consume.assert_called_once_with(BATCH_AMOUNT, Urgency.LOW)
@@ -0,0 +1,149 @@
+import json
+import pytest
+from web3 import Web3
+from beaglegaze.contract_event_indexer import ContractEventIndexer
+
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+CLIENT_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+CONSUMED_AMOUNT = 30
+
+@pytest.fixture
+def contract():
+    with open('contracts/UsageContract_sol_UsageContract.abi', 'r') as f:
+        abi = json.load(f)
+    return Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+
+@pytest.fixture
+def w3(mocker, contract):
+    w3 = mocker.Mock()
+    w3.eth.block_number = 4999
+    w3.eth.get_logs.return_value = []
+    # consume transaction fetched after a chunk with Consumed events
+    w3.provider.make_batch_request.return_value = [consume_transaction(contract)]
+    return w3
+
+def consume_transaction(contract, amount=CONSUMED_AMOUNT, to=CONTRACT_ADDRESS):
+    return {'jsonrpc': '2.0', 'id': 0, 'result': {'to': to.lower(), 'input': contract.encode_abi('consume', args=[amount])}}
+
+def client_log(contract, event_name, amount=None, block_number=1):
+    data = amount.to_bytes(32, 'big') if amount is not None else b''
+    return {
+        'address': CONTRACT_ADDRESS,
+        'topics': [
+            Web3.to_bytes(hexstr=getattr(contract.events, event_name)().topic),
+            Web3.to_bytes(hexstr=CLIENT_ADDRESS).rjust(32, b'\0'),
+        ],
+        'data': data,
+        'blockNumber': block_number,
+        'blockHash': b'\x01' * 32,
+        'transactionHash': bytes([block_number]) * 32,
+        'transactionIndex': 0,
+        'logIndex': 0,
+    }
+
+def test_should_fetch_logs_in_chunks(w3, contract):
+    indexer = ContractEventIndexer(w3, contract, chunk_size=2000)
+
+    indexer.poll()
+
+    ranges = [(call.args[0]['fromBlock'], call.args[0]['toBlock']) for call in w3.eth.get_logs.call_args_list]
+    assert ranges == [(0, 1999), (2000, 3999), (4000, 4999)]
+    assert indexer.synced
+
+def test_should_track_funding_and_subscription_from_events(w3, contract):
+    w3.eth.get_logs.return_value = [
+        client_log(contract, 'Funded', 100, block_number=1),
+        client_log(contract, 'Consumed', 100, block_number=2),
+        client_log(contract, 'SubscriptionPurchased', block_number=3),
+    ]
+    w3.eth.block_number = 3
+    indexer = ContractEventIndexer(w3, contract)
+
+    indexer.poll()
+
+    state = indexer.client_state(CLIENT_ADDRESS)
+    assert state.funding == 70
+    assert state.subscribed
+    assert state.registered
+
+def test_should_resume_from_checkpoint_after_restart(w3, contract, tmp_path):
+    checkpoint_path = str(tmp_path / "index.json")
+    w3.eth.get_logs.return_value = [client_log(contract, 'Funded', 100)]
+    w3.eth.block_number = 10
+    ContractEventIndexer(w3, contract, checkpoint_path=checkpoint_path).poll()
+
+    w3.eth.get_logs.reset_mock()
+    w3.eth.get_logs.return_value = []
+    w3.eth.block_number = 12
+    restarted = ContractEventIndexer(w3, contract, checkpoint_path=checkpoint_path)
+    restarted.poll()
+
+    assert w3.eth.get_logs.call_args[0][0]['fromBlock'] == 11
+    assert restarted.client_state(CLIENT_ADDRESS).funding == 100
+
+def test_should_not_apply_funding_twice_when_a_chunk_is_retried(w3, contract):
+    w3.eth.get_logs.return_value = [
+        client_log(contract, 'Funded', 100, block_number=1),
+        client_log(contract, 'Consumed', 100, block_number=2),
+    ]
+    w3.eth.block_number = 2
+    w3.provider.make_batch_request.side_effect = [ConnectionError("node unavailable"), [consume_transaction(contract)]]
+    indexer = ContractEventIndexer(w3, contract)
+
+    with pytest.raises(ConnectionError):
+        indexer.poll()
+    assert indexer.client_state(CLIENT_ADDRESS) is None
+    assert indexer.next_block == 0
+    assert not indexer.synced
+
+    indexer.poll()
+
+    assert indexer.client_state(CLIENT_ADDRESS).funding == 70
+    assert indexer.next_block == 3
+
+def test_should_take_consumed_amount_from_calldata_instead_of_historical_state(w3, contract):
+    w3.eth.get_logs.return_value = [
+        client_log(contract, 'Consumed', 100, block_number=5),
+        client_log(contract, 'Funded', 50, block_number=6),
+    ]
+    w3.eth.block_number = 9
+    indexer = ContractEventIndexer(w3, contract)
+
+    indexer.poll()
+
+    (method, params), = w3.provider.make_batch_request.call_args[0][0]
+    assert method == 'eth_getTransactionByHash'
+    assert params == ['0x' + '05' * 32]
+    assert indexer.client_state(CLIENT_ADDRESS).funding == 100 - CONSUMED_AMOUNT + 50
+
+def test_should_leave_clients_consuming_through_another_contract_to_live_reads(w3, contract):
+    w3.eth.get_logs.return_value = [client_log(contract, 'Consumed', 100, block_number=5)]
+    w3.eth.block_number = 9
+    w3.provider.make_batch_request.return_value = [consume_transaction(contract, to=CLIENT_ADDRESS)]
+    indexer = ContractEventIndexer(w3, contract)
+
+    indexer.poll()
+    w3.eth.get_logs.return_value = [client_log(contract, 'Funded', 50, block_number=10)]
+    w3.eth.block_number = 10
+    indexer.poll()
+
+    assert indexer.client_state(CLIENT_ADDRESS) is None
+    assert indexer.untracked_clients == {CLIENT_ADDRESS}
+
+def test_should_only_be_synced_once_caught_up_with_the_head(w3, contract):
+    indexer = ContractEventIndexer(w3, contract, chunk_size=2000)
+    synced_after_chunk = []
+    original_commit_range = indexer._commit_range
+    def commit_range(events, to_block):
+        original_commit_range(events, to_block)
+        synced_after_chunk.append(indexer.synced)
+    indexer._commit_range = commit_range
+
+    indexer.poll()
+    assert synced_after_chunk == [False, False, True]
+
+    w3.eth.get_logs.side_effect = ConnectionError("node unavailable")
+    w3.eth.block_number = 5000
+    with pytest.raises(ConnectionError):
+        indexer.poll()
+    assert not indexer.synced
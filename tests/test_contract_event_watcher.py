@@ -0,0 +1,63 @@
+import json
+import pytest
+from web3 import Web3
+from beaglegaze.contract_event_watcher import ContractEventWatcher
+
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+CLIENT_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+
+@pytest.fixture
+def contract():
+    with open('contracts/UsageContract_sol_UsageContract.abi', 'r') as f:
+        abi = json.load(f)
+    return Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+
+@pytest.fixture
+def w3(mocker):
+    w3 = mocker.Mock()
+    w3.eth.block_number = 10
+    w3.eth.get_logs.return_value = []
+    return w3
+
+def funded_log(contract, amount):
+    return {
+        'address': CONTRACT_ADDRESS,
+        'topics': [
+            Web3.to_bytes(hexstr=contract.events.Funded().topic),
+            Web3.to_bytes(hexstr=CLIENT_ADDRESS).rjust(32, b'\0'),
+        ],
+        'data': amount.to_bytes(32, 'big'),
+        'blockNumber': 11,
+        'blockHash': b'\x01' * 32,
+        'transactionHash': b'\x02' * 32,
+        'transactionIndex': 0,
+        'logIndex': 0,
+    }
+
+def test_should_only_request_new_blocks_for_client(w3, contract):
+    watcher = ContractEventWatcher(w3, contract, ['Funded', 'Consumed'], client_address=CLIENT_ADDRESS)
+    watcher.poll()
+
+    w3.eth.block_number = 12
+    watcher.poll()
+
+    log_filter = w3.eth.get_logs.call_args[0][0]
+    assert log_filter['fromBlock'] == 11
+    assert log_filter['toBlock'] == 12
+    assert len(log_filter['topics'][0]) == 2
+    assert log_filter['topics'][1].lower().endswith(CLIENT_ADDRESS[2:].lower())
+    assert watcher.next_block == 13
+
+def test_should_dispatch_decoded_events_to_listeners(w3, contract):
+    events = []
+    watcher = ContractEventWatcher(w3, contract, ['Funded'], client_address=CLIENT_ADDRESS)
+    watcher.add_listener(events.append)
+    watcher.poll()
+
+    w3.eth.block_number = 11
+    w3.eth.get_logs.return_value = [funded_log(contract, 500)]
+    watcher.poll()
+
+    assert [event['event'] for event in events] == ['Funded']
+    assert events[0]['args']['amount'] == 500
+    assert events[0]['args']['client'] == CLIENT_ADDRESS
@@ -0,0 +1,43 @@
+import pytest
+from beaglegaze.fee_oracle import FeeOracle
+from beaglegaze.urgency import Urgency
+
+BASE_FEE = 100
+
+@pytest.fixture
+def w3(mocker):
+    w3 = mocker.Mock()
+    w3.eth.fee_history.return_value = {
+        'baseFeePerGas': [90, 95, BASE_FEE],
+        'reward': [[1, 5, 20], [3, 7, 40]],
+    }
+    return w3
+
+@pytest.fixture
+def fee_oracle(w3):
+    fee_oracle = FeeOracle(w3, poll_interval=3600)
+    yield fee_oracle
+    fee_oracle.stop()
+
+def test_should_price_by_urgency_from_cached_fee_history(fee_oracle, w3):
+    assert fee_oracle.fee_params(Urgency.HIGH) == {'maxPriorityFeePerGas': 30, 'maxFeePerGas': 30 + 2 * BASE_FEE}
+    assert fee_oracle.fee_params() == {'maxPriorityFeePerGas': 6, 'maxFeePerGas': 6 + 2 * BASE_FEE}
+    assert fee_oracle.fee_params(Urgency.LOW) == {'maxPriorityFeePerGas': 2, 'maxFeePerGas': 2 + 112}
+
+    w3.eth.fee_history.assert_called_once()
+
+def test_should_fall_back_to_legacy_gas_price(fee_oracle, w3):
+    w3.eth.fee_history.side_effect = ValueError("method not found")
+    w3.eth.gas_price = 77
+
+    assert fee_oracle.fee_params() == {'gasPrice': 77}
+
+def test_should_keep_previous_fees_when_refresh_fails(fee_oracle, w3, mocker):
+    fee_oracle.fee_params()
+    w3.eth.fee_history.side_effect = ValueError("method not found")
+    type(w3.eth).gas_price = mocker.PropertyMock(side_effect=ConnectionError("down"))
+
+    with pytest.raises(ConnectionError):
+        fee_oracle.refresh()
+
+    assert fee_oracle.fee_params()['maxPriorityFeePerGas'] == 6
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+def run_python(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+def test_should_not_import_web3_for_pay_per_call():
+    output = run_python(
+        "import sys, logging; from beaglegaze import pay_per_call, AsyncBatchProcessor, ContractConsumer; "
+        "print('web3' in sys.modules, len(logging.getLogger().handlers))"
+    )
+
+    assert output == "False 0"
+
+def test_should_load_contract_classes_on_first_access():
+    output = run_python(
+        "import sys, beaglegaze; print('web3' in sys.modules, beaglegaze.SmartContract.__name__, 'web3' in sys.modules)"
+    )
+
+    assert output == "False SmartContract True"
@@ -0,0 +1,85 @@
+import gc
+import urllib.request
+import pytest
+from beaglegaze import metrics
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.metrics import MetricsRegistry
+from beaglegaze.prometheus_exporter import PrometheusExporter, render_text
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+def test_should_render_prometheus_text(registry):
+    calls = registry.counter('calls_total', 'Calls.', ['method'])
+    calls.inc(2, ('app.get"item"',))
+    registry.gauge('unsettled', 'Unsettled value.').set_function(lambda: 7)
+    latency = registry.histogram('latency_seconds', 'Latency.', [0.1, 1])
+    latency.observe(0.1)
+    latency.observe(5)
+
+    assert render_text(registry) == (
+        '# HELP calls_total Calls.\n'
+        '# TYPE calls_total counter\n'
+        'calls_total{method="app.get\\"item\\""} 2\n'
+        '# HELP unsettled Unsettled value.\n'
+        '# TYPE unsettled gauge\n'
+        'unsettled 7\n'
+        '# HELP latency_seconds Latency.\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1.0"} 1\n'
+        'latency_seconds_bucket{le="+Inf"} 2\n'
+        'latency_seconds_sum 5.1\n'
+        'latency_seconds_count 2\n'
+    )
+
+def test_should_return_existing_metric_for_same_name(registry):
+    assert registry.counter('calls_total', 'Calls.') is registry.counter('calls_total', 'Calls.')
+    with pytest.raises(ValueError):
+        registry.gauge('calls_total', 'Calls.')
+
+def test_should_record_batch_metrics_and_flush_reason():
+    processor = AsyncBatchProcessor(CallCountBatchPolicy(3))
+    flushes = metrics.FLUSHES.value(('policy',))
+    closes = metrics.FLUSHES.value(('close',))
+    batches = metrics.BATCH_CALLS.count()
+    calls = metrics.CALLS.value(('<unattributed>',))
+
+    for _ in range(4):
+        processor.register_call(5)
+    assert processor.unsettled_value() == 5
+    processor.close()
+
+    assert metrics.FLUSHES.value(('policy',)) == flushes + 1
+    assert metrics.FLUSHES.value(('close',)) == closes + 1
+    assert metrics.BATCH_CALLS.count() == batches + 2
+    assert metrics.CALLS.value(('<unattributed>',)) == calls + 4
+    assert processor.unsettled_value() == 0
+
+def test_should_report_unsettled_value_of_every_live_processor():
+    gc.collect()
+    unsettled = metrics.UNSETTLED_VALUE.value()
+    first = AsyncBatchProcessor(CallCountBatchPolicy(100))
+    second = AsyncBatchProcessor(CallCountBatchPolicy(100))
+
+    first.register_call(5)
+    second.register_call(7)
+
+    assert metrics.UNSETTLED_VALUE.value() == unsettled + 12
+    del second
+    gc.collect()
+    assert metrics.UNSETTLED_VALUE.value() == unsettled + 5
+
+def test_should_serve_metrics_over_http(registry):
+    registry.counter('calls_total', 'Calls.').inc()
+    exporter = PrometheusExporter(port=0, address='127.0.0.1', registry=registry)
+    exporter.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        exporter.stop()
+
+    assert 'calls_total 1\n' in body
@@ -0,0 +1,65 @@
+import threading
+import pytest
+from web3.exceptions import Web3RPCError
+from beaglegaze.nonce_manager import NonceManager, is_nonce_error
+
+ADDRESS = "0x0000000000000000000000000000000000000001"
+
+@pytest.fixture
+def w3(mocker):
+    w3 = mocker.Mock()
+    w3.eth.get_transaction_count.return_value = 5
+    return w3
+
+def test_should_fetch_pending_nonce_once_and_count_locally(w3):
+    nonce_manager = NonceManager(w3, ADDRESS)
+
+    assert [nonce_manager.next_nonce() for i in range(3)] == [5, 6, 7]
+    w3.eth.get_transaction_count.assert_called_once_with(ADDRESS, 'pending')
+
+def test_should_refetch_nonce_after_resync(w3):
+    nonce_manager = NonceManager(w3, ADDRESS)
+    nonce_manager.next_nonce()
+    nonce_manager.next_nonce()
+
+    w3.eth.get_transaction_count.return_value = 6
+    nonce_manager.resync()
+
+    assert nonce_manager.next_nonce() == 6
+    assert w3.eth.get_transaction_count.call_count == 2
+
+def test_should_hand_out_unique_nonces_across_threads(w3):
+    nonce_manager = NonceManager(w3, ADDRESS)
+    nonces = []
+
+    def allocate():
+        for i in range(500):
+            nonces.append(nonce_manager.next_nonce())
+
+    threads = [threading.Thread(target=allocate) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(nonces) == list(range(5, 5 + 8 * 500))
+
+@pytest.mark.parametrize('message', [
+    "nonce too low: next nonce 7, tx nonce 5",
+    "Nonce too low. Expected nonce to be 7 but got 5.",
+    "Transaction nonce is too low. Try incrementing the nonce.",
+    "NONCE_TOO_LOW",
+    "OldNonce, Current: 7, Actual: 5",
+    "replacement transaction underpriced",
+])
+def test_should_recognize_nonce_errors_of_common_nodes(message):
+    assert is_nonce_error(ValueError({'code': -32000, 'message': message}))
+
+def test_should_read_the_message_of_rpc_errors():
+    error = Web3RPCError("{'code': -32000, 'message': 'nonce too low'}", rpc_response={'error': {'code': -32000, 'message': 'nonce too low'}})
+
+    assert is_nonce_error(error)
+
+def test_should_not_treat_other_errors_mentioning_a_nonce_as_nonce_errors():
+    assert not is_nonce_error(ValueError("execution reverted: invalid nonce signature"))
+    assert not is_nonce_error(ValueError("insufficient funds for gas * price + value"))
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.method_registry import method_name
+from beaglegaze.pay_per_call import pay_per_call, set_processor
+
+PRICE = 5
+
+class Service:
+    @pay_per_call(price=PRICE)
+    def greet(self, name):
+        return f"Hello, {name}!"
+
+    @pay_per_call(price=PRICE)
+    async def greet_async(self, name):
+        return f"Hello, {name}!"
+
+@pytest.fixture
+def mock_smart_contract(mocker):
+    mock = mocker.Mock()
+    mock.has_valid_subscription.return_value = False
+    return mock
+
+@pytest.fixture
+def async_processor():
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(1000))
+    set_processor(async_processor)
+    yield async_processor
+    set_processor(None)
+
+def test_should_keep_sync_functions_synchronous(async_processor):
+    assert not asyncio.iscoroutinefunction(Service.greet)
+    assert Service().greet("sync") == "Hello, sync!"
+    assert async_processor.batch_sum == PRICE
+
+@pytest.mark.asyncio
+async def test_should_keep_coroutine_functions_asynchronous(async_processor):
+    assert asyncio.iscoroutinefunction(Service.greet_async)
+    assert await Service().greet_async("async") == "Hello, async!"
+    assert async_processor.batch_sum == PRICE
+
+def test_should_attribute_usage_to_the_decorated_method(async_processor):
+    Service().greet("one")
+    Service().greet("two")
+
+    batch_sum, method_usage = async_processor.accumulator.drain()
+
+    assert batch_sum == 2 * PRICE
+    assert len(method_usage) == 1
+    assert method_name(method_usage[0].method_id) == f"{__name__}.Service.greet"
+    assert method_usage[0].calls == 2
+    assert method_usage[0].amount == 2 * PRICE
+
+def test_should_block_calls_once_observer_flips_into_error_state(mock_smart_contract):
+    mock_smart_contract.consume.side_effect = RuntimeError("Insufficient funds")
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(2))
+    contract_consumer = ContractConsumer(mock_smart_contract)
+    async_processor.add_observer(contract_consumer)
+    set_processor(async_processor)
+
+    Service().greet("Success")
+    with pytest.raises(RuntimeError, match="Failed to consume from contract"):
+        Service().greet("Failure")
+    assert async_processor.error_state
+
+    with pytest.raises(Exception, match="error state"):
+        Service().greet("Blocked")
+
+    contract_consumer.blocked = False
+    assert not async_processor.error_state
+    set_processor(None)
+
+def test_should_fail_without_processor():
+    set_processor(None)
+    with pytest.raises(Exception, match="AsyncBatchProcessor not set"):
+        Service().greet("nobody")
@@ -0,0 +1,122 @@
+import threading
+import pytest
+from unittest.mock import PropertyMock
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+from beaglegaze.receipt_tracker import ReceiptTracker
+
+FIRST_TX = bytes.fromhex("aa" * 32)
+SECOND_TX = bytes.fromhex("bb" * 32)
+
+def receipt_response(tx_hash, status):
+    return {'jsonrpc': '2.0', 'result': {
+        'transactionHash': '0x' + tx_hash.hex(),
+        'status': hex(status),
+        'blockNumber': '0x1',
+        'gasUsed': '0x5208',
+        'logs': [],
+    }}
+
+@pytest.fixture
+def w3(mocker):
+    w3 = mocker.Mock()
+    w3.eth.block_number = 1
+    return w3
+
+def test_should_confirm_all_pending_transactions_with_one_batch_request(w3):
+    both_tracked = threading.Event()
+
+    def block_number():
+        both_tracked.wait(5)
+        return 1
+    type(w3.eth).block_number = PropertyMock(side_effect=block_number)
+    w3.provider.make_batch_request.return_value = [
+        receipt_response(FIRST_TX, 1),
+        receipt_response(SECOND_TX, 0),
+    ]
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+
+    first = tracker.track(FIRST_TX)
+    second = tracker.track(SECOND_TX)
+    both_tracked.set()
+
+    assert first.result(timeout=5).status == 1
+    assert second.result(timeout=5).status == 0
+    requests = w3.provider.make_batch_request.call_args[0][0]
+    w3.provider.make_batch_request.assert_called_once()
+    assert requests == [
+        ('eth_getTransactionReceipt', ['0x' + FIRST_TX.hex()]),
+        ('eth_getTransactionReceipt', ['0x' + SECOND_TX.hex()]),
+    ]
+
+def test_should_keep_polling_until_transaction_is_mined(w3):
+    first_poll = threading.Event()
+    responses = iter([
+        [{'jsonrpc': '2.0', 'result': None}],
+        [receipt_response(FIRST_TX, 1)],
+    ])
+
+    def make_batch_request(requests):
+        first_poll.set()
+        return next(responses)
+    w3.provider.make_batch_request.side_effect = make_batch_request
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+    callbacks = []
+
+    future = tracker.track(FIRST_TX, callback=callbacks.append)
+    assert first_poll.wait(5)
+    w3.eth.block_number += 1
+
+    assert future.result(timeout=5).status == 1
+    assert callbacks == [future]
+    assert tracker.pending == 0
+
+def test_should_format_receipts_like_web3(w3):
+    response = receipt_response(FIRST_TX, 1)
+    response['result']['logs'] = [{
+        'address': '0x5fbdb2315678afecb367f032d93f642f64180aa3',
+        'topics': ['0x' + '22' * 32],
+        'data': '0x' + '01' * 32,
+        'logIndex': '0x3',
+        'removed': False,
+    }]
+    w3.provider.make_batch_request.return_value = [response]
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+
+    receipt = tracker.track(FIRST_TX).result(timeout=5)
+
+    assert receipt.transactionHash == HexBytes(FIRST_TX)
+    assert (receipt.blockNumber, receipt.gasUsed) == (1, 21000)
+    log = receipt.logs[0]
+    assert log.address == '0x5FbDB2315678afecb367f032d93F642f64180aa3'
+    assert log.topics == [HexBytes('0x' + '22' * 32)]
+    assert log.data == HexBytes('0x' + '01' * 32)
+    assert (log.logIndex, log.removed) == (3, False)
+
+def test_should_time_out_transactions_that_are_never_mined(w3):
+    w3.provider.make_batch_request.return_value = [{'jsonrpc': '2.0', 'result': None}]
+    tracker = ReceiptTracker(w3, poll_interval=0.01, timeout=0.05)
+
+    future = tracker.track(FIRST_TX)
+
+    with pytest.raises(TimeExhausted):
+        future.result(timeout=5)
+
+def test_should_resolve_with_the_receipt_of_a_replacement(w3):
+    w3.provider.make_batch_request.side_effect = lambda requests: [
+        receipt_response(SECOND_TX, 1) if params == ['0x' + SECOND_TX.hex()] else {'jsonrpc': '2.0', 'result': None}
+        for method, params in requests
+    ]
+    replaced = []
+
+    def replace(tx_hash):
+        replaced.append(tx_hash)
+        w3.eth.block_number += 1
+        return SECOND_TX
+    tracker = ReceiptTracker(w3, poll_interval=0.01)
+
+    future = tracker.track(FIRST_TX, replace=replace, replace_after=0.02)
+
+    assert future.result(timeout=5).transactionHash == SECOND_TX
+    assert replaced == [FIRST_TX]
+    assert tracker.pending == 0
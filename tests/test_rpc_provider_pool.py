@@ -0,0 +1,85 @@
+import threading
+import time
+import pytest
+from beaglegaze.rpc_provider_pool import RpcProviderPool
+
+RESPONSE = {'jsonrpc': '2.0', 'id': 1, 'result': '0x1'}
+
+@pytest.fixture
+def pool(mocker):
+    pool = RpcProviderPool(["http://fast", "http://slow", "http://third"], max_failures=2, cooldown=60)
+    for endpoint in pool.endpoints:
+        endpoint.provider = mocker.Mock()
+        endpoint.provider.make_request.return_value = RESPONSE
+    return pool
+
+def endpoint(pool, uri):
+    return next(e for e in pool.endpoints if e.uri == uri)
+
+def test_should_route_reads_to_fastest_endpoint(pool):
+    endpoint(pool, "http://fast").latency = 0.01
+    endpoint(pool, "http://slow").latency = 0.5
+    endpoint(pool, "http://third").latency = 0.2
+
+    assert pool.make_request('eth_blockNumber', []) == RESPONSE
+
+    endpoint(pool, "http://fast").provider.make_request.assert_called_once_with('eth_blockNumber', [])
+    endpoint(pool, "http://slow").provider.make_request.assert_not_called()
+
+def test_should_fail_over_and_cool_down_failing_endpoint(pool):
+    for e in pool.endpoints:
+        e.latency = 0.1
+    endpoint(pool, "http://fast").latency = 0.01
+    endpoint(pool, "http://fast").provider.make_request.side_effect = ConnectionError("down")
+
+    assert pool.make_request('eth_call', []) == RESPONSE
+    assert pool.make_request('eth_call', []) == RESPONSE
+
+    assert pool.ranked_endpoints()[-1].uri == "http://fast"
+    assert endpoint(pool, "http://fast").provider.make_request.call_count == 2
+
+def test_should_raise_when_every_endpoint_fails(pool):
+    for e in pool.endpoints:
+        e.provider.make_request.side_effect = ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        pool.make_request('eth_call', [])
+
+def test_should_broadcast_raw_transactions_and_return_first_success(pool):
+    stalled = threading.Event()
+    endpoint(pool, "http://fast").latency = 0.01
+    endpoint(pool, "http://slow").latency = 0.02
+    endpoint(pool, "http://third").latency = 0.5
+    endpoint(pool, "http://fast").provider.make_request.side_effect = lambda *args: stalled.wait(5) and RESPONSE
+
+    assert pool.make_request('eth_sendRawTransaction', ['0xdead']) == RESPONSE
+    stalled.set()
+
+    endpoint(pool, "http://slow").provider.make_request.assert_called_once_with('eth_sendRawTransaction', ['0xdead'])
+    endpoint(pool, "http://third").provider.make_request.assert_not_called()
+
+def test_should_share_pool_per_network():
+    uris = ["http://shared-a", "http://shared-b"]
+
+    assert RpcProviderPool.shared(uris) is RpcProviderPool.shared(list(uris))
+    assert RpcProviderPool.shared(uris) is not RpcProviderPool.shared(uris[:1])
+
+def test_should_prefer_a_successful_broadcast_over_an_error_response(pool):
+    error_response = {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'already known'}}
+    endpoint(pool, "http://fast").latency = 0.01
+    endpoint(pool, "http://slow").latency = 0.02
+    endpoint(pool, "http://third").latency = 0.5
+    endpoint(pool, "http://fast").provider.make_request.return_value = error_response
+    endpoint(pool, "http://slow").provider.make_request.side_effect = lambda *args: time.sleep(0.05) or RESPONSE
+
+    assert pool.make_request('eth_sendRawTransaction', ['0xdead']) == RESPONSE
+
+def test_should_return_error_response_when_no_endpoint_accepts_the_broadcast(pool):
+    error_response = {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'nonce too low'}}
+    endpoint(pool, "http://fast").latency = 0.01
+    endpoint(pool, "http://slow").latency = 0.02
+    endpoint(pool, "http://third").latency = 0.5
+    endpoint(pool, "http://fast").provider.make_request.return_value = error_response
+    endpoint(pool, "http://slow").provider.make_request.side_effect = ConnectionError("down")
+
+    assert pool.make_request('eth_sendRawTransaction', ['0xdead']) == error_response
@@ -0,0 +1,199 @@
+import threading
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_mode import BatchMode
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.batch_ready_event import BatchReadyEvent, MethodUsage
+from beaglegaze.settlement_pipeline import OverflowPolicy, SettlementPipeline, SettlementQueueFullError
+from beaglegaze.shadow_ledger import ShadowLedger
+from beaglegaze.usage_journal import UsageJournal
+
+BATCH_AMOUNT = 100
+
+@pytest.fixture
+def mock_smart_contract(mocker):
+    mock = mocker.Mock()
+    mock.has_valid_subscription.return_value = False
+    return mock
+
+@pytest.fixture
+def pipeline():
+    pipeline = SettlementPipeline(max_pending=4)
+    yield pipeline
+    pipeline.close(timeout=5)
+
+@pytest.mark.asyncio
+async def test_should_return_before_batch_is_settled(pipeline, mock_smart_contract):
+    release_consume = threading.Event()
+    mock_smart_contract.consume.side_effect = lambda value: release_consume.wait(5)
+    async_processor = AsyncBatchProcessor(BatchMode.OFF, pipeline)
+    async_processor.add_observer(ContractConsumer(mock_smart_contract))
+
+    await async_processor.register_call_async(BATCH_AMOUNT)
+    assert pipeline.pending == 1
+
+    release_consume.set()
+    assert await async_processor.wait_for_settlement_async(timeout=5)
+    mock_smart_contract.consume.assert_called_once_with(BATCH_AMOUNT)
+    assert pipeline.pending == 0
+
+@pytest.mark.asyncio
+async def test_should_report_background_failure_into_consumer_error_state(pipeline, mock_smart_contract):
+    mock_smart_contract.consume.side_effect = RuntimeError("Insufficient funds")
+    async_processor = AsyncBatchProcessor(BatchMode.OFF, pipeline)
+    contract_consumer = ContractConsumer(mock_smart_contract)
+    async_processor.add_observer(contract_consumer)
+
+    await async_processor.register_call_async(BATCH_AMOUNT)
+    assert await async_processor.wait_for_settlement_async(timeout=5)
+
+    assert contract_consumer.is_in_error_state()
+    assert async_processor.is_in_error_state()
+
+def test_should_time_out_when_queue_is_full(pipeline):
+    handler_started = threading.Event()
+    release_handler = threading.Event()
+
+    async def slow_handler(event):
+        handler_started.set()
+        release_handler.wait(5)
+
+    pipeline.start(slow_handler)
+    assert pipeline.submit("in progress")
+    assert handler_started.wait(5)
+    for i in range(pipeline.max_pending):
+        assert pipeline.submit(i)
+
+    assert not pipeline.submit("overflow", timeout=0.05)
+    release_handler.set()
+    assert pipeline.join(timeout=5)
+    assert pipeline.pending == 0
+
+def occupy_worker(pipeline, settled):
+    """
+    Starts pipeline with a handler that holds the first batch until the returned event is set.
+    """
+    handler_started = threading.Event()
+    release_handler = threading.Event()
+
+    async def slow_handler(event):
+        handler_started.set()
+        release_handler.wait(5)
+        settled.append(event)
+
+    pipeline.start(slow_handler)
+    assert pipeline.submit(BatchReadyEvent(1))
+    assert handler_started.wait(5)
+    return release_handler
+
+def test_should_coalesce_overflowing_batches_into_newest_one():
+    pipeline = SettlementPipeline(max_pending=1, overflow_policy=OverflowPolicy.COALESCE)
+    settled = []
+    release_handler = occupy_worker(pipeline, settled)
+
+    assert pipeline.submit(BatchReadyEvent(10, (MethodUsage(1, 2, 10),)))
+    assert pipeline.submit(BatchReadyEvent(5, (MethodUsage(1, 1, 5),)))
+    release_handler.set()
+    pipeline.close(timeout=5)
+
+    assert settled[1] == BatchReadyEvent(15, (MethodUsage(1, 3, 15),))
+    assert pipeline.stats().overflows == 1
+
+def test_should_spill_overflow_and_recover_it_after_restart(tmp_path):
+    journal = UsageJournal(str(tmp_path), commit_interval=0.01)
+    pipeline = SettlementPipeline(max_pending=1, overflow_policy=OverflowPolicy.SPILL, spill_journal=journal)
+    settled = []
+    occupy_worker(pipeline, settled)
+
+    assert pipeline.submit(BatchReadyEvent(10))
+    assert pipeline.submit(BatchReadyEvent(5))
+    assert pipeline.submit(BatchReadyEvent(7))
+    assert pipeline.stats().spilled_value == 12
+    journal.close()
+
+    restarted = SettlementPipeline(overflow_policy=OverflowPolicy.SPILL, spill_journal=UsageJournal(str(tmp_path)))
+    assert restarted.recovered == 12
+
+def reopen_with_spilled_value(tmp_path, value):
+    journal = UsageJournal(str(tmp_path), commit_interval=0.01)
+    journal.record_usage(value)
+    journal.close()
+    return UsageJournal(str(tmp_path), commit_interval=0.01)
+
+def test_should_keep_spilled_value_journaled_until_it_is_settled(tmp_path):
+    journal = reopen_with_spilled_value(tmp_path, 12)
+    pipeline = SettlementPipeline(overflow_policy=OverflowPolicy.SPILL, spill_journal=journal)
+
+    async def failing_handler(event):
+        return False
+
+    pipeline.start(failing_handler)
+    assert pipeline.take_recovered() == 12
+    assert pipeline.take_recovered() == 0
+    assert pipeline.submit(BatchReadyEvent(12), journaled=12)
+    assert pipeline.join(timeout=5)
+    journal.commit()
+
+    assert journal.outstanding == 12
+    pipeline.close(timeout=5)
+    journal.close()
+
+def test_should_settle_recovered_spill_only_with_a_settling_observer(tmp_path, mock_smart_contract):
+    journal = reopen_with_spilled_value(tmp_path, 12)
+    pipeline = SettlementPipeline(overflow_policy=OverflowPolicy.SPILL, spill_journal=journal)
+    async_processor = AsyncBatchProcessor(BatchMode.OFF, pipeline)
+
+    assert pipeline.join(timeout=5)
+    journal.commit()
+    assert journal.outstanding == 12
+    mock_smart_contract.consume.assert_not_called()
+
+    async_processor.add_observer(ContractConsumer(mock_smart_contract))
+    async_processor.close(timeout=5)
+    journal.close()
+
+    mock_smart_contract.consume.assert_called_once_with(12)
+    assert async_processor.unsettled_value() == 0
+    assert UsageJournal(str(tmp_path)).recovered == 0
+
+@pytest.mark.asyncio
+async def test_should_keep_batch_but_refuse_the_triggering_call_when_queue_fails_fast(mocker):
+    pipeline = SettlementPipeline(max_pending=1, overflow_policy=OverflowPolicy.FAIL_FAST)
+    settled = []
+    release_handler = occupy_worker(pipeline, settled)
+    smart_contract = mocker.Mock()
+    smart_contract.get_client_state.return_value = (10 * BATCH_AMOUNT, False)
+    ledger = ShadowLedger(smart_contract, reconcile_interval=60)
+    ledger.reconcile()
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(2), pipeline, ledger=ledger)
+
+    for i in range(3):
+        await async_processor.register_call_async(BATCH_AMOUNT)
+    with pytest.raises(SettlementQueueFullError):
+        await async_processor.register_call_async(BATCH_AMOUNT)
+
+    # The refused call is not billed, the one before it settles with the next flush.
+    assert async_processor.batch_sum == BATCH_AMOUNT
+    assert ledger.unsettled == BATCH_AMOUNT
+    assert ledger.estimate() == 7 * BATCH_AMOUNT
+    release_handler.set()
+    pipeline.close(timeout=5)
+
+@pytest.mark.asyncio
+async def test_should_wait_on_the_loop_for_room_in_the_queue():
+    pipeline = SettlementPipeline(max_pending=1)
+    settled = []
+    release_handler = occupy_worker(pipeline, settled)
+    assert pipeline.submit(BatchReadyEvent(2))
+
+    assert not await pipeline.submit_async(BatchReadyEvent(3), timeout=0.05)
+    threading.Timer(0.05, release_handler.set).start()
+    assert await pipeline.submit_async(BatchReadyEvent(3), timeout=5)
+    pipeline.close(timeout=5)
+
+    stats = pipeline.stats()
+    assert [event.batch_sum for event in settled] == [1, 2, 3]
+    assert stats.depth == 0
+    assert stats.submit_wait >= 0.05
+    assert stats.max_queue_wait >= 0.05
@@ -0,0 +1,79 @@
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.shadow_ledger import ShadowLedger, LedgerExhaustedAction, InsufficientFundingException
+
+FUNDING = 10
+
+@pytest.fixture
+def mock_smart_contract(mocker):
+    mock = mocker.Mock()
+    mock.get_client_state.return_value = (FUNDING, False)
+    return mock
+
+@pytest.fixture
+def ledger(mock_smart_contract):
+    ledger = ShadowLedger(mock_smart_contract, reconcile_interval=60)
+    ledger.reconcile()
+    return ledger
+
+def test_should_admit_calls_until_estimate_drops_below_zero(ledger):
+    assert ledger.reserve(6)
+    assert not ledger.reserve(6)
+    assert ledger.estimate() == 4
+
+def test_should_admit_everything_for_subscribed_clients(ledger, mock_smart_contract):
+    mock_smart_contract.get_client_state.return_value = (FUNDING, True)
+    ledger.reconcile()
+
+    assert all(ledger.reserve(FUNDING) for i in range(5))
+
+def test_should_keep_estimate_when_reconciliation_fails(ledger, mock_smart_contract):
+    mock_smart_contract.get_client_state.side_effect = RuntimeError("RPC down")
+
+    ledger.reconcile()
+
+    assert ledger.estimate() == FUNDING
+
+def test_should_account_for_settled_batches(ledger, mocker):
+    mocker.patch.object(ledger, "reconcile_in_background")
+    ledger.reserve(4)
+    ledger.begin_settlement(4)
+    assert ledger.estimate() == 6
+
+    ledger.complete_settlement(4, succeeded=True)
+
+    assert ledger.known_funding == 6
+    assert ledger.in_flight == 0
+    ledger.reconcile_in_background.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_should_refuse_call_without_rpc_when_funds_are_exhausted(ledger, mock_smart_contract, mocker):
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(100), ledger=ledger)
+    mock_smart_contract.get_client_state.reset_mock()
+
+    await async_processor.register_call_async(FUNDING)
+    with pytest.raises(InsufficientFundingException):
+        await async_processor.register_call_async(1)
+
+    assert async_processor.batch_sum == FUNDING
+    mock_smart_contract.get_client_state.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_should_force_flush_when_configured(ledger, mocker):
+    ledger.on_exhausted = LedgerExhaustedAction.FLUSH
+    mocker.patch.object(ledger, "reconcile_in_background")
+    contract_consumer = mocker.Mock(spec=ContractConsumer)
+    contract_consumer.handle = mocker.AsyncMock()
+    contract_consumer.is_in_error_state.return_value = False
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(100), ledger=ledger)
+    async_processor.add_observer(contract_consumer)
+
+    await async_processor.register_call_async(FUNDING)
+    await async_processor.register_call_async(1)
+
+    contract_consumer.handle.assert_called_once()
+    assert contract_consumer.handle.call_args[0][0].batch_sum == FUNDING + 1
+    assert ledger.unsettled == 0
+    assert ledger.in_flight == 0
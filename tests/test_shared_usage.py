@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+import pytest
+from beaglegaze.batch_ready_event import BatchReadyEvent
+from beaglegaze.shared_usage_forwarder import SharedUsageForwarder
+from beaglegaze.shared_usage_region import SharedUsageRegion
+
+@pytest.fixture
+def region_name(tmp_path):
+    name = f"beaglegaze-test-{uuid.uuid4().hex[:8]}"
+    yield name
+    region = SharedUsageRegion(name, str(tmp_path))
+    region.close()
+    region.unlink()
+
+@pytest.fixture
+def open_region(region_name, tmp_path):
+    regions = []
+    def open_region():
+        # Separate instances hold separate lock files, like separate worker processes.
+        region = SharedUsageRegion(region_name, str(tmp_path))
+        regions.append(region)
+        return region
+    yield open_region
+    for region in regions:
+        region.close()
+
+def make_observer(mocker, in_error_state=False):
+    observer = mocker.Mock()
+    observer.handle = mocker.AsyncMock()
+    observer.is_in_error_state.return_value = in_error_state
+    return observer
+
+def test_should_share_pending_usage_between_regions(open_region):
+    first, second = open_region(), open_region()
+
+    first.add(3)
+    second.add(2 ** 70)
+
+    assert first.pending() == 2 ** 70 + 3
+    assert second.drain() == 2 ** 70 + 3
+    assert first.pending() == 0
+
+def test_should_elect_a_single_leader_until_it_resigns(open_region):
+    first, second = open_region(), open_region()
+
+    assert first.try_lead()
+    assert not second.try_lead()
+    first.resign()
+    assert second.try_lead()
+
+def test_should_settle_combined_usage_of_all_workers_once(open_region, mocker):
+    observer = make_observer(mocker)
+    factory = mocker.Mock(return_value=[observer])
+    workers = [SharedUsageForwarder(open_region(), factory, flush_interval=3600) for i in range(3)]
+
+    for worker in workers:
+        asyncio.run(worker.handle(BatchReadyEvent(5)))
+    for worker in workers:
+        worker.flush()
+
+    factory.assert_called_once()
+    observer.handle.assert_called_once()
+    assert observer.handle.call_args[0][0].batch_sum == 15
+
+def test_should_publish_leader_error_state_to_all_workers(open_region, mocker):
+    leader = SharedUsageForwarder(open_region(), lambda: [make_observer(mocker, in_error_state=True)], flush_interval=3600)
+    worker = SharedUsageForwarder(open_region(), lambda: [], flush_interval=3600)
+
+    asyncio.run(worker.handle(BatchReadyEvent(5)))
+    leader.flush()
+
+    assert worker.is_in_error_state()
+
+def test_should_keep_shared_usage_until_it_is_settled(open_region, mocker):
+    observer = make_observer(mocker)
+    observer.handle.side_effect = [RuntimeError("Failed to consume from contract"), None]
+    leader = SharedUsageForwarder(open_region(), lambda: [observer], flush_interval=3600)
+    asyncio.run(leader.handle(BatchReadyEvent(5)))
+
+    with pytest.raises(RuntimeError):
+        leader.flush()
+    assert leader.region.pending() == 5
+
+    asyncio.run(leader.handle(BatchReadyEvent(2)))
+    leader.flush()
+
+    assert observer.handle.call_args[0][0].batch_sum == 7
+    assert leader.region.pending() == 0
+
+def test_should_notify_listeners_of_workers_when_the_leader_fails(open_region, mocker):
+    leader = SharedUsageForwarder(open_region(), lambda: [make_observer(mocker, in_error_state=True)], flush_interval=3600)
+    worker = SharedUsageForwarder(open_region(), lambda: [], flush_interval=3600)
+    listener = mocker.Mock()
+    worker.add_error_state_listener(listener)
+    assert leader.region.try_lead()
+
+    asyncio.run(worker.handle(BatchReadyEvent(5)))
+    leader.flush()
+    worker.flush()
+
+    listener.assert_called_once_with(True)
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.simulated_smart_contract import DEPLOYER_ADDRESS, SimulatedRevert, SimulatedSmartContract
+
+SECOND_DEVELOPER = '0x' + '00' * 19 + '03'
+
+@pytest.fixture
+def contract():
+    contract = SimulatedSmartContract(subscription_price=100)
+    contract.fund(1000)
+    return contract
+
+def add_developer(contract, developer):
+    contract.request_developer_registration(developer)
+    for voter in list(contract.developer_list):
+        contract.vote_for_developer(developer, True, voter)
+
+def test_should_consume_and_distribute_remainder_to_first_developer(contract):
+    add_developer(contract, SECOND_DEVELOPER)
+
+    assert contract.consume(101)
+
+    assert contract.get_client_funding() == 899
+    assert contract.get_developer_balance(DEPLOYER_ADDRESS) == 51
+    assert contract.get_developer_balance(SECOND_DEVELOPER) == 50
+
+def test_should_revert_consume_without_sufficient_funding(contract):
+    with pytest.raises(RuntimeError) as e:
+        contract.consume(1001)
+
+    assert isinstance(e.value.__cause__, SimulatedRevert)
+    assert str(e.value.__cause__) == "Insufficient client funding"
+    assert contract.get_client_funding() == 1000
+    assert contract.get_developer_balance(DEPLOYER_ADDRESS) == 0
+
+def test_should_register_developer_only_with_majority(contract):
+    add_developer(contract, SECOND_DEVELOPER)
+    rejected = '0x' + '00' * 19 + '04'
+    contract.request_developer_registration(rejected)
+    contract.vote_for_developer(rejected, True, DEPLOYER_ADDRESS)
+    contract.vote_for_developer(rejected, False, SECOND_DEVELOPER)
+
+    assert not contract.is_developer(rejected)
+    assert not contract.has_pending_registration_request(rejected)
+    with pytest.raises(SimulatedRevert, match="Only developers can vote"):
+        contract.vote_for_developer(SECOND_DEVELOPER, True, rejected)
+
+def test_should_grant_subscription_and_pay_out(contract):
+    with pytest.raises(SimulatedRevert, match="Insufficient payment"):
+        contract.purchase_subscription(99)
+    contract.purchase_subscription(100)
+
+    assert contract.has_valid_subscription()
+    assert contract.get_developer_balance(DEPLOYER_ADDRESS) == 100
+    assert contract.request_payout() == 1000
+    assert contract.withdraw_balance(DEPLOYER_ADDRESS) == 100
+    assert contract.balance == 0
+    with pytest.raises(SimulatedRevert, match="No funds available for payout"):
+        contract.request_payout()
+
+def test_should_fail_rpc_calls_at_failure_rate():
+    contract = SimulatedSmartContract(failure_rate=1.0)
+
+    assert contract.get_client_funding() == 0
+    with pytest.raises(ConnectionError):
+        contract.get_client_state(raise_on_error=True)
+
+def test_should_settle_batches_through_contract_consumer(contract):
+    async def run():
+        processor = AsyncBatchProcessor(CallCountBatchPolicy(10))
+        processor.add_observer(ContractConsumer(contract))
+        for _ in range(100):
+            await processor.register_call_async(1)
+
+    asyncio.run(run())
+
+    assert contract.get_client_funding() == 900
+    assert contract.nonce == 10
@@ -0,0 +1,170 @@
+import pytest
+from concurrent.futures import Future
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from beaglegaze.batch_ready_event import BatchReadyEvent
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.shadow_ledger import InsufficientFundingException
+from beaglegaze.smart_contract import SmartContract
+from beaglegaze.ttl_cache import TtlCache
+from beaglegaze.urgency import Urgency
+
+CONTRACT_ADDRESS = "0x5FBdB2315678AFEcB367f02c64afa4fa5b1e7C41"
+PRIVATE_KEY = "0x" + "11" * 32
+
+RESULTS = {
+    # getClientFunding
+    'eth_call': '0x' + (100).to_bytes(32, 'big').hex(),
+    'eth_estimateGas': '0xea60',
+    'eth_chainId': '0x7a69',
+    'eth_getTransactionCount': '0x3',
+}
+
+def uint256(value):
+    return '0x' + value.to_bytes(32, 'big').hex()
+
+@pytest.fixture
+def smart_contract(mocker):
+    smart_contract = SmartContract(CONTRACT_ADDRESS, "http://localhost:8545", PRIVATE_KEY, 10)
+    provider = mocker.Mock()
+    provider.make_batch_request.side_effect = lambda requests: [
+        {'jsonrpc': '2.0', 'id': i, 'result': RESULTS[method]} for i, (method, params) in enumerate(requests)
+    ]
+    smart_contract.w3.provider = provider
+    smart_contract.fee_oracle = mocker.Mock()
+    smart_contract.fee_oracle.fee_params.return_value = {'maxPriorityFeePerGas': 10, 'maxFeePerGas': 210}
+    return smart_contract
+
+def batched_methods(provider, call_index=0):
+    return [method for method, params in provider.make_batch_request.call_args_list[call_index][0][0]]
+
+def test_should_fetch_missing_consume_inputs_in_one_batch(smart_contract):
+    transaction = smart_contract._consume_transaction(5)
+
+    provider = smart_contract.w3.provider
+    provider.make_batch_request.assert_called_once()
+    provider.make_request.assert_not_called()
+    assert transaction == {
+        'to': CONTRACT_ADDRESS,
+        'data': smart_contract.contract.encode_abi('consume', args=[5]),
+        'value': 0,
+        'gas': 60000,
+        'nonce': 3,
+        'chainId': 31337,
+        'maxPriorityFeePerGas': 10,
+        'maxFeePerGas': 210,
+    }
+
+def test_should_only_estimate_gas_until_a_receipt_is_known(smart_contract, mocker):
+    smart_contract._consume_transaction(5)
+    assert batched_methods(smart_contract.w3.provider) == ['eth_estimateGas', 'eth_chainId', 'eth_getTransactionCount']
+
+    smart_contract.consume_template.record_receipt(mocker.Mock(status=1, gasUsed=50000))
+    transaction = smart_contract._consume_transaction(7)
+
+    assert batched_methods(smart_contract.w3.provider, 1) == ['eth_call']
+    assert transaction['gas'] == 60000
+    assert transaction['nonce'] == 4
+
+def test_should_not_send_consume_the_funding_does_not_cover(smart_contract, mocker):
+    smart_contract._consume_transaction(5)
+    smart_contract.consume_template.record_receipt(mocker.Mock(status=1, gasUsed=50000))
+    smart_contract.w3.eth.send_raw_transaction = mocker.Mock()
+
+    with pytest.raises(RuntimeError, match="Failed to consume from contract") as e:
+        smart_contract.consume(101)
+
+    assert isinstance(e.value.__cause__, InsufficientFundingException)
+    (method, params), = smart_contract.w3.provider.make_batch_request.call_args[0][0]
+    assert params[0]['data'] == smart_contract.contract.encode_abi('getClientFunding')
+    smart_contract.w3.eth.send_raw_transaction.assert_not_called()
+
+def test_should_go_back_to_estimating_after_running_out_of_gas(smart_contract, mocker):
+    smart_contract._consume_transaction(5)
+    template = smart_contract.consume_template
+    template.record_receipt(mocker.Mock(status=1, gasUsed=50000))
+
+    template.record_receipt(mocker.Mock(status=0, gasUsed=60000))
+    smart_contract._consume_transaction(5)
+
+    assert template.gas_limit is None
+    assert batched_methods(smart_contract.w3.provider, 1) == ['eth_estimateGas']
+
+def test_should_encode_large_amounts_like_web3(smart_contract):
+    smart_contract._consume_transaction(1)
+    value = 2 ** 200 + 12345
+
+    transaction = smart_contract.consume_template.build(value, 0, {})
+
+    assert transaction['data'] == smart_contract.contract.encode_abi('consume', args=[value])
+
+def test_should_read_funding_and_subscription_in_one_batch(smart_contract, mocker):
+    smart_contract.w3.provider.make_batch_request.side_effect = lambda requests: [
+        {'jsonrpc': '2.0', 'id': 0, 'result': uint256(42)},
+        {'jsonrpc': '2.0', 'id': 1, 'result': uint256(1)},
+    ]
+
+    assert smart_contract.get_client_state() == (42, True)
+    assert batched_methods(smart_contract.w3.provider) == ['eth_call', 'eth_call']
+
+def test_should_not_cache_client_state_invalidated_while_it_was_read(smart_contract):
+    smart_contract.read_cache = TtlCache(60)
+
+    def funded_during_read(requests):
+        # A Funded event is processed while the old funding is on its way back.
+        smart_contract.read_cache.invalidate('client_funding')
+        return [{'jsonrpc': '2.0', 'id': 0, 'result': uint256(42)}, {'jsonrpc': '2.0', 'id': 1, 'result': uint256(1)}]
+    smart_contract.w3.provider.make_batch_request.side_effect = funded_during_read
+
+    assert smart_contract.get_client_funding() == 42
+    assert smart_contract.has_valid_subscription()
+    assert smart_contract.w3.provider.make_batch_request.call_count == 1
+    smart_contract.get_client_funding()
+    assert smart_contract.w3.provider.make_batch_request.call_count == 2
+
+@pytest.mark.asyncio
+async def test_should_block_consumer_when_consume_transaction_reverts(smart_contract, mocker):
+    receipt = AttributeDict({'status': 0, 'gasUsed': 30000, 'transactionHash': HexBytes('0x' + 'cd' * 32), 'logs': []})
+    future = Future()
+    future.set_result(receipt)
+    mocker.patch.object(smart_contract, 'consume_future', return_value=future)
+    smart_contract.consume_template = mocker.Mock()
+    mocker.patch.object(smart_contract, 'has_valid_subscription', return_value=False)
+    contract_consumer = ContractConsumer(smart_contract)
+
+    with pytest.raises(RuntimeError, match="Failed to consume from contract"):
+        await contract_consumer.handle(BatchReadyEvent(5))
+
+    assert contract_consumer.is_in_error_state()
+
+def test_should_resync_nonce_when_transaction_is_not_mined_in_time(smart_contract, mocker):
+    smart_contract.w3.eth.send_raw_transaction = mocker.Mock(return_value=HexBytes('0x' + 'ab' * 32))
+    smart_contract.receipt_tracker.timeout = 0
+    smart_contract._consume_transaction = mocker.Mock(return_value={'nonce': 3})
+    mocker.patch.object(smart_contract.w3.eth.account, 'sign_transaction')
+    resync = mocker.patch.object(smart_contract.nonce_manager, 'resync')
+
+    future = smart_contract.consume_future(5)
+
+    with pytest.raises(TimeExhausted):
+        future.result(timeout=5)
+    resync.assert_called_once()
+
+def test_should_replace_stuck_transaction_with_bumped_fees(smart_contract, mocker):
+    sent = []
+    sign_transaction = mocker.patch.object(smart_contract.w3.eth.account, 'sign_transaction')
+    smart_contract.w3.eth.send_raw_transaction = mocker.Mock(side_effect=lambda raw: HexBytes(bytes([len(sent)]) * 32))
+    sign_transaction.side_effect = lambda tx, private_key: sent.append(tx) or mocker.Mock()
+    smart_contract.fee_oracle.fee_params.side_effect = lambda urgency=None: (
+        {'maxPriorityFeePerGas': 30, 'maxFeePerGas': 100} if urgency == Urgency.HIGH
+        else {'maxPriorityFeePerGas': 10, 'maxFeePerGas': 210}
+    )
+    tx_hash, tx = smart_contract._submit_consume(5, Urgency.LOW)
+
+    replacement_hash = smart_contract._fee_bumper(tx, 5)(tx_hash)
+
+    assert replacement_hash == HexBytes(b'\x02' * 32)
+    assert sent[1]['nonce'] == sent[0]['nonce']
+    assert sent[1]['maxPriorityFeePerGas'] == 30
+    assert sent[1]['maxFeePerGas'] == 210 + 210 // 8 + 1
@@ -0,0 +1,95 @@
+import contextlib
+import contextvars
+import pytest
+from hexbytes import HexBytes
+from beaglegaze import tracing
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_mode import BatchMode
+from beaglegaze.contract_consumer import ContractConsumer
+from beaglegaze.simulated_smart_contract import SimulatedSmartContract
+from beaglegaze.smart_contract import SmartContract
+
+CONTRACT_ADDRESS = "0x5FBdB2315678AFEcB367f02c64afa4fa5b1e7C41"
+PRIVATE_KEY = "0x" + "11" * 32
+TX_HASH = HexBytes('0x' + 'ab' * 32)
+
+class RecordingSpan:
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+class RecordingTracer:
+    """
+    Implements the part of OpenTelemetry's Tracer the hooks use.
+    """
+    def __init__(self):
+        self.spans = []
+        self._current = contextvars.ContextVar('current_span', default=None)
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = RecordingSpan(name, attributes, self._current.get())
+        self.spans.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    def span(self, name):
+        return next(span for span in self.spans if span.name == name)
+
+@pytest.fixture
+def smart_contract(mocker):
+    smart_contract = SmartContract(CONTRACT_ADDRESS, "http://localhost:8545", PRIVATE_KEY, 10)
+    smart_contract.w3.provider = mocker.Mock()
+    smart_contract.w3.provider.make_batch_request.return_value = [
+        {'jsonrpc': '2.0', 'id': 0, 'result': '0xea60'},
+        {'jsonrpc': '2.0', 'id': 1, 'result': '0x7a69'},
+        {'jsonrpc': '2.0', 'id': 2, 'result': '0x3'},
+    ]
+    smart_contract.fee_oracle = mocker.Mock()
+    smart_contract.fee_oracle.fee_params.return_value = {'maxPriorityFeePerGas': 10, 'maxFeePerGas': 210}
+    mocker.patch.object(smart_contract.w3.eth, 'send_raw_transaction', return_value=TX_HASH)
+    return smart_contract
+
+@pytest.fixture
+def tracer():
+    tracer = RecordingTracer()
+    tracing.set_tracer(tracer)
+    yield tracer
+    tracing.set_tracer(None)
+
+def test_should_return_shared_no_op_span_without_tracer():
+    assert tracing.span('beaglegaze.flush', batch_sum=1) is tracing.span('beaglegaze.settle')
+    assert tracing.bind_context(len) is len
+
+@pytest.mark.asyncio
+async def test_should_nest_consumer_spans_under_settlement(tracer):
+    contract = SimulatedSmartContract()
+    contract.fund(1 << 70)
+    processor = AsyncBatchProcessor(BatchMode.OFF)
+    processor.add_observer(ContractConsumer(contract))
+
+    await processor.register_call_async(1 << 64)
+
+    assert [span.name for span in tracer.spans] == [
+        'beaglegaze.flush', 'beaglegaze.settle', 'beaglegaze.consume_batch', 'beaglegaze.check_subscription',
+    ]
+    assert tracer.span('beaglegaze.flush').attributes == {tracing.BATCH_SUM: str(1 << 64)}
+    assert tracer.span('beaglegaze.check_subscription').parent is tracer.span('beaglegaze.consume_batch')
+
+def test_should_tag_transaction_spans_with_nonce_and_hash(tracer, smart_contract):
+    smart_contract.submit_consume(5)
+
+    assert [span.name for span in tracer.spans] == [
+        'beaglegaze.build_transaction', 'beaglegaze.sign_transaction', 'beaglegaze.send_transaction',
+    ]
+    assert tracer.span('beaglegaze.build_transaction').attributes == {tracing.BATCH_SUM: 5, tracing.NONCE: 3}
+    assert tracer.span('beaglegaze.send_transaction').attributes == {
+        tracing.BATCH_SUM: 5, tracing.NONCE: 3, tracing.TX_HASH: '0x' + 'ab' * 32,
+    }
@@ -0,0 +1,59 @@
+import time
+import pytest
+from beaglegaze.ttl_cache import TtlCache
+
+def test_should_call_loader_only_once_within_ttl(mocker):
+    cache = TtlCache(60)
+    loader = mocker.Mock(return_value=100)
+
+    assert cache.get("client_funding", loader) == 100
+    assert cache.get("client_funding", loader) == 100
+    loader.assert_called_once()
+
+def test_should_reload_after_expiry(mocker):
+    cache = TtlCache(0.01)
+    loader = mocker.Mock(side_effect=[100, 50])
+
+    cache.get("client_funding", loader)
+    time.sleep(0.02)
+
+    assert cache.get("client_funding", loader) == 50
+
+def test_should_reload_after_invalidation(mocker):
+    cache = TtlCache(60)
+    loader = mocker.Mock(side_effect=[True, False])
+
+    cache.get("has_valid_subscription", loader)
+    cache.invalidate("has_valid_subscription")
+
+    assert cache.get("has_valid_subscription", loader) is False
+
+def test_should_not_cache_loader_failures(mocker):
+    cache = TtlCache(60)
+    loader = mocker.Mock(side_effect=[RuntimeError("RPC down"), 100])
+
+    with pytest.raises(RuntimeError):
+        cache.get("client_funding", loader)
+
+    assert cache.get("client_funding", loader) == 100
+
+@pytest.mark.parametrize('key', ["client_funding", None])
+def test_should_not_cache_value_loaded_across_an_invalidation(key):
+    cache = TtlCache(60)
+
+    def stale_loader():
+        # The funding changes and is invalidated while the old value is on its way back.
+        cache.invalidate(key)
+        return 100
+
+    assert cache.get("client_funding", stale_loader) == 100
+    assert cache.get("client_funding", lambda: 70) == 70
+
+def test_should_not_put_value_read_across_an_invalidation():
+    cache = TtlCache(60)
+    generation = cache.generation("client_funding")
+    cache.invalidate("client_funding")
+
+    cache.put("client_funding", 100, generation)
+
+    assert cache.get("client_funding", lambda: 70) == 70
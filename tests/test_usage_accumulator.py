@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.metering_event_observer import MeteringEventObserver
+from beaglegaze.batch_ready_event import MethodUsage
+from beaglegaze.method_registry import UNATTRIBUTED_METHOD_ID, register_method, method_name
+from beaglegaze.usage_accumulator import PENDING_ESTIMATE_INTERVAL, UsageAccumulator
+
+THREADS = 8
+CALLS_PER_THREAD = 5000
+PRICE = 3
+
+class RecordingObserver(MeteringEventObserver):
+    settles_batches = True
+
+    def __init__(self):
+        self.settled = 0
+        self.lock = threading.Lock()
+
+    async def handle(self, event):
+        with self.lock:
+            self.settled += event.batch_sum
+
+    def is_in_error_state(self) -> bool:
+        return False
+
+def run_threads(target):
+    threads = [threading.Thread(target=target) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_should_drain_every_unit_exactly_once_under_concurrent_adds():
+    accumulator = UsageAccumulator()
+    drained = []
+    adding = threading.Event()
+    adding.set()
+
+    def drain_continuously():
+        while adding.is_set():
+            drained.append(accumulator.drain()[0])
+
+    drainer = threading.Thread(target=drain_continuously)
+    drainer.start()
+    run_threads(lambda: [accumulator.add(PRICE) for i in range(CALLS_PER_THREAD)])
+    adding.clear()
+    drainer.join()
+    drained.append(accumulator.drain()[0])
+
+    assert sum(drained) == THREADS * CALLS_PER_THREAD * PRICE
+    assert accumulator.pending() == 0
+
+def test_should_drain_exactly_once_while_shards_grow():
+    accumulator = UsageAccumulator()
+    drained = []
+    adding = threading.Event()
+    adding.set()
+
+    def drain_continuously():
+        while adding.is_set():
+            drained.append(accumulator.drain()[0])
+
+    def add_to_new_methods():
+        # Each new method ID past the shard's capacity makes it grow.
+        for i in range(20):
+            method_id = register_method(f"tests.growing{i}")
+            for j in range(50):
+                accumulator.add(PRICE, method_id)
+
+    drainer = threading.Thread(target=drain_continuously)
+    drainer.start()
+    run_threads(add_to_new_methods)
+    adding.clear()
+    drainer.join()
+    drained.append(accumulator.drain()[0])
+
+    assert sum(drained) == THREADS * 20 * 50 * PRICE
+
+def test_should_report_pending_usage_across_threads():
+    accumulator = UsageAccumulator()
+
+    run_threads(lambda: accumulator.add(PRICE))
+    accumulator.add(PRICE)
+
+    assert accumulator.pending() == (THREADS + 1) * PRICE
+    assert accumulator.drain()[0] == (THREADS + 1) * PRICE
+    assert accumulator.drain() == (0, ())
+
+def test_should_break_down_drained_usage_by_method():
+    accumulator = UsageAccumulator()
+    first_method = register_method("tests.first")
+    second_method = register_method("tests.second")
+
+    run_threads(lambda: [accumulator.add(PRICE, first_method), accumulator.add(2 * PRICE, second_method)])
+    accumulator.add(PRICE)
+
+    batch_sum, method_usage = accumulator.drain()
+
+    assert batch_sum == THREADS * 3 * PRICE + PRICE
+    assert method_usage == (
+        MethodUsage(UNATTRIBUTED_METHOD_ID, 1, PRICE),
+        MethodUsage(first_method, THREADS, THREADS * PRICE),
+        MethodUsage(second_method, THREADS, THREADS * 2 * PRICE),
+    )
+    assert method_name(second_method) == "tests.second"
+
+def test_should_settle_exactly_the_registered_total_under_multithreaded_load():
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(7))
+    observer = RecordingObserver()
+    async_processor.add_observer(observer)
+
+    async def register_calls():
+        for i in range(CALLS_PER_THREAD):
+            await async_processor.register_call_async(PRICE)
+
+    run_threads(lambda: asyncio.run(register_calls()))
+    async_processor.close()
+
+    assert observer.settled == THREADS * CALLS_PER_THREAD * PRICE
+    assert async_processor.batch_sum == 0
+
+def test_should_estimate_pending_with_own_calls_exact_and_other_threads_bounded():
+    accumulator = UsageAccumulator()
+
+    def other_thread():
+        for i in range(PENDING_ESTIMATE_INTERVAL * 4):
+            accumulator.add(PRICE)
+
+    accumulator.add(PRICE)
+    assert accumulator.pending_estimate() == PRICE
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join()
+
+    accumulator.add(PRICE)
+    others = PENDING_ESTIMATE_INTERVAL * 4 * PRICE
+    assert 2 * PRICE <= accumulator.pending_estimate() <= 2 * PRICE + others
+    for i in range(PENDING_ESTIMATE_INTERVAL):
+        accumulator.add(PRICE)
+        estimate = accumulator.pending_estimate()
+    assert estimate == accumulator.pending() == others + (PENDING_ESTIMATE_INTERVAL + 2) * PRICE
+
+    accumulator.drain()
+    accumulator.add(PRICE)
+    assert accumulator.pending_estimate() == PRICE
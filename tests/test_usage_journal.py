@@ -0,0 +1,94 @@
+import os
+import threading
+import pytest
+from beaglegaze.async_batch_processor import AsyncBatchProcessor
+from beaglegaze.batch_policy import CallCountBatchPolicy
+from beaglegaze.shadow_ledger import ShadowLedger
+from beaglegaze.usage_journal import UsageJournal
+
+PRICE = 7
+
+@pytest.fixture
+def journal_directory(tmp_path):
+    return str(tmp_path / "journal")
+
+def open_journal(directory, **kwargs):
+    # A long commit interval keeps the writer thread out of the way, tests commit explicitly.
+    return UsageJournal(directory, commit_interval=60, fsync=False, **kwargs)
+
+def segment_files(directory):
+    return sorted(os.listdir(directory))
+
+def test_should_recover_unsettled_usage_after_crash(journal_directory):
+    journal = open_journal(journal_directory)
+    for i in range(3):
+        journal.record_usage(PRICE)
+    journal.record_settlement(PRICE)
+    journal.commit()
+
+    recovered = open_journal(journal_directory)
+
+    assert recovered.recovered == 2 * PRICE
+    assert recovered.outstanding == 2 * PRICE
+
+def test_should_ignore_torn_record_at_segment_end(journal_directory):
+    journal = open_journal(journal_directory)
+    journal.record_usage(PRICE)
+    journal.commit()
+    journal.record_usage(PRICE)
+    journal.commit()
+    with open(os.path.join(journal_directory, segment_files(journal_directory)[-1]), 'r+b') as f:
+        f.truncate(os.path.getsize(f.name) - 3)
+
+    assert open_journal(journal_directory).recovered == PRICE
+
+def test_should_rotate_segments_and_keep_outstanding(journal_directory):
+    journal = open_journal(journal_directory, segment_bytes=64)
+    for i in range(10):
+        journal.record_usage(PRICE)
+        journal.commit()
+
+    assert len(segment_files(journal_directory)) == 1
+    assert open_journal(journal_directory).recovered == 10 * PRICE
+
+def test_should_settle_recovered_usage_at_startup(journal_directory, mocker):
+    journal = open_journal(journal_directory)
+    journal.record_usage(PRICE)
+    journal.commit()
+
+    journal = open_journal(journal_directory)
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(1000), journal=journal)
+    settled = threading.Event()
+    observer = mocker.Mock(settles_batches=True)
+    observer.handle = mocker.AsyncMock(side_effect=lambda event: settled.set())
+    observer.is_in_error_state.return_value = False
+    async_processor.add_observer(observer)
+
+    assert settled.wait(5)
+    async_processor.close()
+
+    observer.handle.assert_called_once()
+    assert observer.handle.call_args[0][0].batch_sum == PRICE
+    assert open_journal(journal_directory).recovered == 0
+
+def test_should_count_recovered_usage_in_the_ledger_estimate(journal_directory, mocker):
+    journal = open_journal(journal_directory)
+    journal.record_usage(PRICE)
+    journal.commit()
+    smart_contract = mocker.Mock()
+    smart_contract.get_client_state.return_value = (10 * PRICE, False)
+    ledger = ShadowLedger(smart_contract, reconcile_interval=60)
+    ledger.reconcile()
+    mocker.patch.object(ledger, "reconcile_in_background")
+
+    async_processor = AsyncBatchProcessor(CallCountBatchPolicy(1000), ledger=ledger, journal=open_journal(journal_directory))
+    assert ledger.estimate() == 9 * PRICE
+
+    event, journaled = async_processor._take_batch()
+    assert event.batch_sum == PRICE
+    assert ledger.estimate() == 9 * PRICE
+    assert ledger.unsettled == 0
+
+    ledger.complete_settlement(event.batch_sum, succeeded=True)
+    assert ledger.estimate() == 9 * PRICE
+    async_processor.close()